@@ -0,0 +1,161 @@
+"""
+Grade the pathological submissions students and bots send: deep nesting, elements with thousands of attributes,
+millions of siblings, huge text nodes and storms of unclosed tags. Every case builds its ``State`` and runs every
+check of :mod:`htmlwhat.checks` on it, in a process of its own with a time and a memory limit, and the script exits
+with an error if a case exceeds them or a check crashes.
+
+Run it with ``python benchmarks/bench_adversarial.py``, or ``python benchmarks/bench_adversarial.py deep_nesting``
+for some of the cases.
+"""
+
+import inspect
+import json
+import resource
+import subprocess
+import sys
+import time
+
+from protowhat.failure import InstructorError
+
+from htmlwhat import checks
+from htmlwhat.Exercise import Exercise
+
+TIME_LIMIT = 120
+MEMORY_LIMIT = 3 * 1024 ** 3
+
+SOLUTION = """<!DOCTYPE html>
+<html>
+<head><title>Page</title><style>p { color: red; margin: 0 auto; }</style></head>
+<body><div id="main" class="box wide" style="color: red"><p>Text <b>bold</b></p><br><p>More</p></div></body>
+</html>"""
+
+# one SCT per check, the ones of protowhat included
+CHECKS = {
+    "check_html": "Ex().check_html()",
+    "check_head": "Ex().check_head().check_tag('title').has_equal_text()",
+    "check_body": "Ex().check_body()",
+    "check_tag": "Ex().check_body().check_tag('div').check_tag('p', 1)",
+    "check_each_tag": "Ex().check_body().check_tag('div').check_each_tag('p', has_equal_text())",
+    "check_css_pattern": "Ex().check_css_pattern('div > p b')",
+    "check_path": "Ex().check_path('html > body > div > p:nth-of-type(2)')",
+    "check_doctype": "Ex().check_doctype()",
+    "check_not": "Ex().check_not(has_tag('marquee'), msg='Don\\'t use marquee.')",
+    "check_or": "Ex().check_or(has_tag('main'), check_body().check_tag('div').has_equal_attr())",
+    "check_correct": "Ex().check_correct(check_body().has_equal_structure(), check_body().check_tag('div'))",
+    "multi": "Ex().check_body().multi(has_tag('p'), has_tag('b', within='p'))",
+    "fail": "Ex().check_body().check_tag('div').fail()",
+    "success_msg": "Ex().success_msg('Well done!')",
+    "has_code": "Ex().has_code('bold')\nEx().has_code(r'<b>\\s*bold\\s*</b>', fixed=False)",
+    "has_equal_text": "Ex().check_body().has_equal_text(min_ratio=0.8, normalize_whitespace=True)",
+    "has_equal_attr": "Ex().check_body().check_tag('div').has_equal_attr()",
+    "has_equal_attrs_deep": "Ex().check_body().has_equal_attrs_deep()",
+    "has_equal_style": "Ex().check_body().check_tag('div').has_equal_style()\nEx().has_equal_style(selector='p')",
+    "has_equal_structure": "Ex().check_body().has_equal_structure()",
+    "has_tag": "Ex().has_tag('b', within='p')",
+    "has_tag_count": "Ex().has_tag_count('p', max_count=100)\nEx().has_tag_count('div', within='body')",
+}
+
+
+def deep_nesting(scale: float) -> str:
+    depth = int(50_000 * scale)
+    return f"<html><body>{'<div>' * depth}<p>Text <b>bold</b></p>{'</div>' * depth}</body></html>"
+
+
+def many_attributes(scale: float) -> str:
+    attributes = " ".join(f'data-a{index}="{index}"' for index in range(int(10_000 * scale)))
+    style = "; ".join(f"--p{index}: {index}px" for index in range(int(10_000 * scale)))
+    return f'<html><body><div id="main" {attributes} style="{style}"><p>Text <b>bold</b></p></div></body></html>'
+
+
+def many_siblings(scale: float) -> str:
+    return f"<html><body><div>{'<p>Text</p>' * int(1_000_000 * scale)}</div></body></html>"
+
+
+def huge_text(scale: float) -> str:
+    words = "lorem ipsum dolor sit amet " * int(1_000_000 * scale)
+    return f"<html><body><div><p>{words}<b>bold</b></p></div></body></html>"
+
+
+def unclosed_storm(scale: float) -> str:
+    count = int(20_000 * scale)
+    # unclosed tags, empty elements ended twice and end tags of nothing that is open
+    return (
+        f"<html><body>{'<div><p><b><i><span><a><li>' * count}{'<br></br><img>' * count}"
+        f"{'</table></td>' * count}<p>Text <b>bold</b></p></body></html>"
+    )
+
+
+CASES = {
+    "deep_nesting": deep_nesting,
+    "many_attributes": many_attributes,
+    "many_siblings": many_siblings,
+    "huge_text": huge_text,
+    "unclosed_storm": unclosed_storm,
+}
+
+
+def run_case(name: str, scale: float) -> dict:
+    """Grade the case in this process, the time of every check is counted without the parsing of the code."""
+    code = CASES[name](scale)
+    exercises = {check: Exercise(sct, SOLUTION) for check, sct in CHECKS.items()}
+
+    start = time.perf_counter()
+    state = exercises["check_body"].state(code)
+    result = {"case": name, "size": len(code), "state": time.perf_counter() - start, "checks": {}, "errors": []}
+
+    for check, exercise in exercises.items():
+        start = time.perf_counter()
+        try:
+            exercise.run(exercise.state(code, student_ast=state.student_ast))
+        except InstructorError as e:
+            result["errors"].append(f"{check}: {e}")
+        except Exception as e:
+            result["errors"].append(f"{check}: {type(e).__name__}: {e}")
+        result["checks"][check] = time.perf_counter() - start
+
+    result["memory"] = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss * 1024
+    return result
+
+
+def run_limited(name: str, scale: float) -> dict:
+    """Run :func:`run_case` in a process of its own, within the time and memory limits."""
+    command = [sys.executable, __file__, "--child", name, str(scale)]
+    start = time.perf_counter()
+    try:
+        process = subprocess.run(command, capture_output=True, text=True, timeout=TIME_LIMIT)
+    except subprocess.TimeoutExpired:
+        return {"case": name, "errors": [f"exceeded {TIME_LIMIT}s"]}
+    if process.returncode:
+        return {"case": name, "errors": [process.stderr.strip().splitlines()[-1] if process.stderr else "crashed"]}
+    result = json.loads(process.stdout)
+    result["total"] = time.perf_counter() - start
+    return result
+
+
+def main(argv):
+    if argv[:1] == ["--child"]:
+        resource.setrlimit(resource.RLIMIT_AS, (MEMORY_LIMIT, MEMORY_LIMIT))
+        print(json.dumps(run_case(argv[1], float(argv[2]))))
+        return 0
+
+    public = {name for name, value in vars(checks).items() if inspect.isfunction(value)}
+    assert public <= set(CHECKS), f"No SCT for {', '.join(sorted(public - set(CHECKS)))}"
+
+    failed = False
+    for name in argv or CASES:
+        result = run_limited(name, 1.0)
+        if "state" in result:
+            slowest = max(result["checks"], key=result["checks"].get)
+            print(
+                f"{name:>16} {result['size'] / 1e6:>6.1f}M chars  state {result['state']:>6.2f}s  "
+                f"checks {sum(result['checks'].values()):>6.2f}s (slowest {slowest} "
+                f"{result['checks'][slowest]:.2f}s)  memory {result['memory'] / 1024 ** 2:>5.0f}MB"
+            )
+        for error in result["errors"]:
+            failed = True
+            print(f"{name:>16} ERROR {error}")
+    return 1 if failed else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main(sys.argv[1:]))
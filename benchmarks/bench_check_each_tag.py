@@ -0,0 +1,41 @@
+"""
+Time ``check_each_tag()`` against the ``multi(check_tag(name, index) ...)`` it replaces, for growing numbers of
+sibling tags. ``check_tag()`` looks up the siblings again for every index, so the SCT is quadratic in their number,
+while ``check_each_tag()`` looks them up once.
+
+Run it with ``python benchmarks/bench_check_each_tag.py``.
+"""
+
+import time
+
+from htmlwhat.Exercise import Exercise
+
+EACH_TAG = "Ex().check_body().check_tag('ul').check_each_tag('li', has_equal_text())"
+CHECK_TAG = "Ex().check_body().check_tag('ul').multi(check_tag('li', index).has_equal_text() for index in range({}))"
+
+
+def document(size: int) -> str:
+    return "<body><ul>" + "".join(f"<li>item {index}</li>" for index in range(size)) + "</ul></body>"
+
+
+def best_time(exercise: Exercise, code: str, repeat: int = 3) -> float:
+    times = []
+    for _ in range(repeat):
+        start = time.perf_counter()
+        result = exercise.grade(code)
+        times.append(time.perf_counter() - start)
+        assert result["correct"], result
+    return min(times)
+
+
+def main():
+    print(f"{'siblings':>8} {'check_each_tag':>15} {'per tag':>10} {'check_tag':>12} {'per tag':>10}")
+    for size in (100, 200, 400, 800, 1600, 3200):
+        code = document(size)
+        each = best_time(Exercise(EACH_TAG, code), code)
+        single = best_time(Exercise(CHECK_TAG.format(size), code), code)
+        print(f"{size:>8} {each:>14.4f}s {each / size * 1e6:>8.1f}us {single:>11.4f}s {single / size * 1e6:>8.1f}us")
+
+
+if __name__ == "__main__":
+    main()
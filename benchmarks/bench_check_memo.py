@@ -0,0 +1,56 @@
+"""
+Time an SCT whose ``check_or()``, ``check_correct()`` and ``multi()`` branches repeat the same navigation, with the
+memo of the grading run and without it. The navigation prefixes, like ``check_body().check_tag('section', index)``,
+only run once per run with the memo, their later calls rebuild the child state from the stored outcome.
+
+Run it with ``python benchmarks/bench_check_memo.py``.
+"""
+
+import time
+
+from htmlwhat.Exercise import Exercise
+
+BRANCHES = """
+for index in range({size}):
+    Ex().check_or(
+        check_body().check_tag('section', index).check_tag('h2').has_equal_text(),
+        check_body().check_tag('section', index).check_tag('h2').has_equal_attr(),
+    )
+    Ex().check_correct(
+        check_body().check_tag('section', index).check_tag('p').has_equal_text(),
+        check_body().check_tag('section', index).check_tag('p'),
+    )
+    Ex().check_body().check_tag('section', index).multi(has_equal_attr(), check_tag('h2'), check_tag('p'))
+"""
+
+
+def document(size: int) -> str:
+    sections = "".join(
+        f'<section id="s{index}"><h2 class="title">Part {index}</h2><p>Text {index}</p></section>'
+        for index in range(size)
+    )
+    return f"<body>{sections}</body>"
+
+
+def best_time(exercise: Exercise, code: str, memo: bool, repeat: int = 3) -> float:
+    times = []
+    for _ in range(repeat):
+        start = time.perf_counter()
+        state = exercise.state(code) if memo else exercise.state(code, check_memo=None)
+        result = exercise.run(state)
+        times.append(time.perf_counter() - start)
+        assert result["correct"], result
+    return min(times)
+
+
+def main():
+    print(f"{'sections':>8} {'memo':>10} {'no memo':>10} {'speedup':>8}")
+    for size in (10, 20, 40, 80, 160):
+        code = document(size)
+        exercise = Exercise(BRANCHES.format(size=size), code)
+        memo, no_memo = best_time(exercise, code, True), best_time(exercise, code, False)
+        print(f"{size:>8} {memo:>9.4f}s {no_memo:>9.4f}s {no_memo / memo:>7.2f}x")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,60 @@
+"""
+Time the tolerant comparison of ``has_equal_text(max_distance=...)`` against ``difflib.SequenceMatcher.ratio()``
+on growing paragraphs: one with typos near its start, middle and end, so skipping the common prefix and suffix
+doesn't help, and an unrelated one of the same length, which is rejected early. The last column allows a
+similarity ratio of ``0.9``, a threshold of one edit every ten characters.
+
+Run it with ``python benchmarks/bench_edit_distance.py``.
+"""
+
+import difflib
+import random
+import time
+
+from htmlwhat.edit_distance import bounded_distance, within_tolerance
+
+WORDS = "the quick brown fox jumps over a lazy dog while five boxing wizards jump quickly".split()
+
+
+def paragraph(size: int, seed: int) -> str:
+    rng = random.Random(seed)
+    words = []
+    while sum(map(len, words)) + len(words) < size:
+        words.append(rng.choice(WORDS))
+    return " ".join(words)[:size]
+
+
+def with_typos(text: str) -> str:
+    chars = list(text)
+    for position in (len(chars) // 10, len(chars) // 2, len(chars) - len(chars) // 10):
+        chars[position] = "#"
+    return "".join(chars)
+
+
+def best_time(function, repeat: int = 3) -> float:
+    times = []
+    for _ in range(repeat):
+        start = time.perf_counter()
+        function()
+        times.append(time.perf_counter() - start)
+    return min(times)
+
+
+def main():
+    print(f"{'chars':>6} {'typos':>10} {'difflib':>10} {'unrelated':>10} {'difflib':>10} {'ratio 0.9':>10}")
+    for size in (1000, 2000, 4000, 8000, 16000):
+        solution = paragraph(size, 0)
+        typos, unrelated = with_typos(solution), paragraph(size, 1)
+        assert bounded_distance(solution, typos, 5) == 3 and bounded_distance(solution, unrelated, 5) is None
+        row = [
+            best_time(lambda: bounded_distance(solution, typos, 5)),
+            best_time(lambda: difflib.SequenceMatcher(None, solution, typos).ratio()),
+            best_time(lambda: bounded_distance(solution, unrelated, 5)),
+            best_time(lambda: difflib.SequenceMatcher(None, solution, unrelated).ratio()),
+            best_time(lambda: within_tolerance(solution, typos, min_ratio=0.9)),
+        ]
+        print(f"{size:>6} " + " ".join(f"{seconds * 1000:>8.2f}ms" for seconds in row))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,44 @@
+"""
+Time ``has_equal_attrs_deep()`` against the ``check_each_tag(..., has_equal_attr())`` SCT it replaces, on forms
+with growing numbers of attributed inputs. The solution's attribute tables are built for the first submission
+only, the timed runs reuse them.
+
+Run it with ``python benchmarks/bench_has_equal_attrs_deep.py``.
+"""
+
+import time
+
+from htmlwhat.Exercise import Exercise
+
+DEEP = "Ex().check_body().check_tag('form').has_equal_attrs_deep()"
+PER_TAG = "Ex().check_body().check_tag('form').check_each_tag('input', has_equal_attr())"
+
+
+def document(size: int) -> str:
+    inputs = "".join(
+        f'<input type="text" name="field{index}" class="field wide" required="">' for index in range(size)
+    )
+    return f'<body><form action="/submit" method="post">{inputs}</form></body>'
+
+
+def best_time(exercise: Exercise, code: str, repeat: int = 3) -> float:
+    times = []
+    for _ in range(repeat):
+        start = time.perf_counter()
+        result = exercise.grade(code)
+        times.append(time.perf_counter() - start)
+        assert result["correct"], result
+    return min(times)
+
+
+def main():
+    print(f"{'inputs':>8} {'deep':>10} {'per tag':>10} {'check_each_tag':>15} {'per tag':>10}")
+    for size in (100, 200, 400, 800, 1600):
+        code = document(size)
+        deep = best_time(Exercise(DEEP, code), code)
+        each = best_time(Exercise(PER_TAG, code), code)
+        print(f"{size:>8} {deep:>9.4f}s {deep / size * 1e6:>8.1f}us {each:>14.4f}s {each / size * 1e6:>8.1f}us")
+
+
+if __name__ == "__main__":
+    main()
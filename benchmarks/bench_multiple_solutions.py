@@ -0,0 +1,64 @@
+"""
+Grade submissions of an exercise with several accepted solutions, most of them matching the last solution of the
+list: by calling ``test_exercise()`` once per solution until one passes, by passing the list of solutions to
+``test_exercise()``, which parses the student's code once, and with an ``Exercise``, which also parses the
+solutions once and tries the most often matched one first.
+
+Run it with ``python benchmarks/bench_multiple_solutions.py``.
+"""
+
+import random
+import time
+
+from htmlwhat import test_exercise
+from htmlwhat.Exercise import Exercise
+
+SCT = """
+Ex().check_head().check_tag('title').has_equal_text()
+Ex().check_body().check_tag('main').check_tag('ul').check_each_tag('li', has_equal_text())
+"""
+
+SOLUTIONS = 5
+SUBMISSIONS = 200
+
+
+def document(answer: int, size: int = 60) -> str:
+    items = "".join(f"<li>Answer {answer} item {index}</li>" for index in range(size))
+    return f"<html><head><title>Page</title></head><body><main><ul>{items}</ul></main></body></html>"
+
+
+def one_call_per_solution(code: str, solutions: list) -> dict:
+    for solution in solutions:
+        payload = test_exercise(SCT, code, solution)
+        if payload["correct"]:
+            return payload
+    return test_exercise(SCT, code, solutions[0])
+
+
+def main():
+    random.seed(0)
+    solutions = [document(answer) for answer in range(SOLUTIONS)]
+    # most students give the last answer, some a wrong one
+    submissions = [
+        document(random.choices([SOLUTIONS - 1, 0, SOLUTIONS], weights=[8, 1, 1])[0]) for _ in range(SUBMISSIONS)
+    ]
+    exercise = Exercise(SCT, solutions)
+    graders = {
+        "test_exercise per solution": lambda code: one_call_per_solution(code, solutions),
+        "test_exercise with the list": lambda code: test_exercise(SCT, code, solutions),
+        "Exercise with the list": exercise.grade,
+    }
+
+    outcomes = None
+    for name, grade in graders.items():
+        start = time.perf_counter()
+        results = [grade(code) for code in submissions]
+        seconds = time.perf_counter() - start
+        assert outcomes is None or results == outcomes, name
+        outcomes = results
+        print(f"{name:>28} {seconds / SUBMISSIONS * 1000:>7.2f}ms per submission")
+    print(f"{sum(outcome['correct'] for outcome in outcomes)} of {SUBMISSIONS} correct")
+
+
+if __name__ == "__main__":
+    main()
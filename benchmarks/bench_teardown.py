@@ -0,0 +1,90 @@
+"""
+Grade a stream of submissions with the student trees torn down or left to the garbage collector, under the default
+collection thresholds and tuned ones, and report the collections of every generation, the time the collector
+paused grading and the percentiles of the latencies.
+
+Run it with ``python benchmarks/bench_teardown.py``.
+"""
+
+import gc
+import time
+
+from htmlwhat.Exercise import Exercise
+from htmlwhat.loadtest import percentile
+from htmlwhat.memory import GCTuning, tuned
+
+SCT = """
+Ex().check_head().check_tag('title').has_equal_text()
+for index in range(20):
+    Ex().check_body().check_tag('section', index).multi(has_equal_attr(), check_tag('h2').has_equal_text())
+"""
+
+CALLS = 1000
+
+
+def document(size: int, variant: int = 0) -> str:
+    sections = "".join(
+        f'<section id="s{index}"><h2 class="title">Part {index}</h2>'
+        f'<p>Text {index} <a href="#s{index + variant}">next</a></p><ul><li>one</li><li>two</li></ul></section>'
+        for index in range(size)
+    )
+    return f"<html><head><title>Page</title></head><body>{sections}</body></html>"
+
+
+class Pauses:
+    """Time spent in collections, by the ``gc.callbacks`` hook."""
+
+    def __init__(self):
+        self.seconds = 0.0
+        self.started = None
+
+    def __call__(self, phase, info):
+        if phase == "start":
+            self.started = time.perf_counter()
+        elif self.started is not None:
+            self.seconds += time.perf_counter() - self.started
+            self.started = None
+
+
+def run(teardown: bool, tuning: GCTuning) -> dict:
+    exercise = Exercise(SCT, document(40), teardown=teardown)
+    submissions = [document(40, variant % 3) for variant in range(CALLS)]
+    gc.collect()
+    pauses = Pauses()
+    latencies = []
+    with tuned(tuning):
+        before = [generation["collections"] for generation in gc.get_stats()]
+        gc.callbacks.append(pauses)
+        try:
+            for code in submissions:
+                start = time.perf_counter()
+                exercise.grade(code)
+                latencies.append(time.perf_counter() - start)
+        finally:
+            gc.callbacks.remove(pauses)
+        after = [generation["collections"] for generation in gc.get_stats()]
+    latencies.sort()
+    return {
+        "collections": [end - begin for begin, end in zip(before, after)],
+        "pauses": pauses.seconds,
+        "p50": percentile(latencies, 50),
+        "p99": percentile(latencies, 99),
+        "max": latencies[-1],
+    }
+
+
+def main():
+    tunings = {"default": None, "tuned": GCTuning((50000, 20, 20), freeze=True)}
+    print(f"{'teardown':>8} {'gc':>8} {'collections':>14} {'pauses':>9} {'p50':>9} {'p99':>9} {'max':>9}")
+    for name, tuning in tunings.items():
+        for teardown in (False, True):
+            result = run(teardown, tuning)
+            collections = "/".join(str(count) for count in result["collections"])
+            print(
+                f"{str(teardown):>8} {name:>8} {collections:>14} {result['pauses'] * 1000:>7.1f}ms "
+                f"{result['p50'] * 1000:>7.2f}ms {result['p99'] * 1000:>7.2f}ms {result['max'] * 1000:>7.2f}ms"
+            )
+
+
+if __name__ == "__main__":
+    main()
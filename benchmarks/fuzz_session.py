@@ -0,0 +1,92 @@
+"""
+Differential test of :class:`htmlwhat.Session.Session`: apply random edits to a document, grade every version with a
+session and with a fresh :func:`htmlwhat.test_exercise`, and report the versions on which they differ. The script
+exits with an error if there is any.
+
+Run it with ``python benchmarks/fuzz_session.py``, or ``python benchmarks/fuzz_session.py 500 7`` for the number of
+edits per SCT and the seed.
+"""
+
+import random
+import sys
+
+from htmlwhat import test_exercise
+from htmlwhat.Session import Session
+
+SOLUTION = """<!DOCTYPE html>
+<html>
+<head><title>Title</title><style>p { color: red; }</style></head>
+<body class="a b">
+<div id="x"><p>Hello <b>world</b></p><p>Second</p></div>
+<ul><li>one</li><li>two</li><li>three</li></ul>
+<pre>  pre
+ text</pre>
+<textarea>area <b>not bold</b></textarea>
+<script>if (a < b) { c = "</p>"; }</script>
+</body>
+</html>"""
+
+SCTS = [
+    "Ex().check_body().check_tag('div').check_tag('p', index=1).has_equal_text()",
+    "Ex().check_body().check_tag('ul').check_tag('li', index=2).has_equal_text()",
+    "Ex().check_body().has_equal_attr()",
+    "Ex().check_body().check_tag('div').has_equal_attr()",
+    "Ex().check_body().check_tag('div').check_tag('p').has_equal_text()",
+    "Ex().check_body().check_tag('pre').has_equal_text()",
+    "Ex().check_body().check_tag('textarea').has_equal_text()",
+    "Ex().check_body().has_equal_text()",
+    "Ex().check_body().has_equal_structure()",
+    "Ex().has_code('three')",
+    "Ex().has_tag_count('p', max_count=3)",
+    "Ex().check_css_pattern('div p + p')",
+]
+
+PIECES = [
+    "<", ">", "</p>", "<p>", "x", " ", "\n", '"', "'", "=", "<b>", "</b>", "</div>", "<li>", "</li>", "<br>",
+    "<!--", "-->", "<pre>", "</pre>", "<script>", "</script>", "<textarea>", "</textarea>", '<p class="',
+]
+
+
+def outcome(grade, code):
+    try:
+        return grade(code)
+    except Exception as e:
+        return type(e).__name__, str(e)
+
+
+def fuzz(sct: str, edits: int, rng: random.Random) -> list:
+    """Versions of the code on which the session and :func:`htmlwhat.test_exercise` differ."""
+    session = Session(sct, SOLUTION)
+    code = SOLUTION
+    mismatches = []
+    for _ in range(edits):
+        roll = rng.random()
+        position = rng.randrange(len(code) + 1)
+        if roll < 0.5:
+            code = code[:position] + rng.choice(PIECES) + code[position:]
+        elif roll < 0.9:
+            code = code[:position] + code[position + rng.randint(1, 3):]
+        else:
+            code = SOLUTION
+        graded = outcome(session.grade, code)
+        expected = outcome(lambda code: test_exercise(sct, code, SOLUTION), code)
+        if graded != expected:
+            mismatches.append((code, graded, expected))
+    return mismatches
+
+
+def main(argv):
+    edits = int(argv[0]) if argv else 300
+    rng = random.Random(int(argv[1]) if len(argv) > 1 else 0)
+    failed = False
+    for sct in SCTS:
+        mismatches = fuzz(sct, edits, rng)
+        print(f"{len(mismatches):>4} mismatches  {sct}")
+        for code, graded, expected in mismatches[:3]:
+            failed = True
+            print(f"      code     {code!r}\n      session  {graded}\n      expected {expected}")
+    return 1 if failed else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main(sys.argv[1:]))
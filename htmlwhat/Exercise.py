@@ -0,0 +1,172 @@
+from typing import Callable, List, Tuple, Union
+from htmlwhat.State import State, HtmlDispatcher
+from htmlwhat.Reporter import Reporter
+from htmlwhat.safe_regex import check_sct_patterns
+from htmlwhat.stream import StreamSummary, stream_specs
+from htmlwhat.budget import Budget
+from htmlwhat.memo import CheckMemo
+from htmlwhat.memory import teardown_tree
+from htmlwhat.solutions import SOLUTION_LISTS, MatchOrder, first_match, solution_list
+from htmlwhat.test_exercise import count_outcome, evaluate_sct, run_sct, run_with_budget
+from htmlwhat.utils import check_str
+from htmlwhat.source import read_code
+from htmlwhat import recording
+
+
+class Exercise:
+    """
+    An exercise prepared for grading many submissions: the SCT is compiled and the solution code is parsed once.
+    If the SCT only uses counting checks, the submissions are streamed instead of parsed, see :mod:`htmlwhat.stream`.
+
+    With several accepted solutions, every solution is parsed once and a submission is tried against them, the most
+    often matched first, until one passes, see :mod:`htmlwhat.solutions`.
+
+    :param sct: The SCT (Submission Correctness Test) code to evaluate the student's code against.
+    :type sct: str
+
+    :param solution_code: The correct solution code, see :func:`htmlwhat.source.read_code`, or a list of accepted
+        solutions.
+    :type solution_code: str | bytes | os.PathLike | List[str | bytes | os.PathLike]
+
+    :param budget: Default limits of grading a submission, see :class:`htmlwhat.budget.Budget`.
+    :type budget: htmlwhat.budget.Budget, optional
+
+    :param solution_ast: The parsed solution code, e.g. loaded from an artifact of :mod:`htmlwhat.serialize`, or the
+        list of the parsed solutions.
+    :type solution_ast: htmlwhat.State.BeautifulSoupNode | List[htmlwhat.State.BeautifulSoupNode], optional
+
+    :param teardown: Whether :meth:`grade` breaks down the student's tree when it finishes, so it is freed without
+        the cyclic garbage collector, see :mod:`htmlwhat.memory`.
+    :type teardown: bool, optional
+
+    :example:
+        >>> from htmlwhat.Exercise import Exercise
+        >>> exercise = Exercise("Ex().check_body().check_tag('h1')", "<body><h1>Title</h1></body>")
+        >>> exercise.grade("<body><h1>Hello</h1></body>")
+        {'correct': True, 'message': 'Great work!'}
+    """
+
+    def __init__(
+        self, sct: str, solution_code: Union[str, List[str]], budget: Budget = None, solution_ast=None,
+        teardown: bool = False,
+    ):
+        check_str(sct, "arg: sct")
+
+        self.sct_source = sct
+        self.sct = compile(sct, "<sct>", "exec")
+        check_sct_patterns(sct)
+        self.stream_specs = stream_specs(sct)
+        self.dispatcher = HtmlDispatcher()
+        self.solution_codes = solution_list(solution_code)
+        if solution_ast is None:
+            self.solution_asts = [self.dispatcher.parse(code) for code in self.solution_codes]
+        else:
+            self.solution_asts = list(solution_ast) if isinstance(solution_ast, SOLUTION_LISTS) else [solution_ast]
+        if len(self.solution_asts) != len(self.solution_codes):
+            raise ValueError("Expected as many parsed solutions as solution codes.")
+        # the first solution, its feedback is given when no solution matches
+        self.solution_code, self.solution_ast = self.solution_codes[0], self.solution_asts[0]
+        self.match_order = MatchOrder(len(self.solution_codes))
+        self.budget = budget
+        self.teardown = teardown
+
+    @property
+    def solution(self) -> Union[str, List[str]]:
+        """The solution code, or the list of the accepted solutions."""
+        return self.solution_codes if len(self.solution_codes) > 1 else self.solution_code
+
+    def state(self, student_code: str, solution: int = 0, **kwargs) -> State:
+        """
+        Build the root state for ``student_code`` and the ``solution``-th accepted solution, reusing the parsed
+        solution. Checks repeated during the run, e.g. in the branches of ``check_or()``, reuse their outcome from a
+        :class:`htmlwhat.memo.CheckMemo` of the run.
+        """
+        kwargs.setdefault("reporter", Reporter())
+        kwargs.setdefault("check_memo", CheckMemo())
+        if self.stream_specs is not None and "student_ast" not in kwargs:
+            student_code = read_code(student_code, "arg: student_code")
+            kwargs["student_ast"] = StreamSummary.of(student_code, self.stream_specs)
+        return State(
+            student_code,
+            self.solution_codes[solution],
+            solution_ast=self.solution_asts[solution],
+            ast_dispatcher=self.dispatcher,
+            **kwargs
+        )
+
+    def run(self, state: State) -> dict:
+        """Run the SCT of the exercise against ``state``."""
+        return run_sct(self.sct, state)
+
+    def run_solutions(
+        self, student_code: str, reporter: Callable[[], Reporter] = Reporter, states: dict = None, **kwargs
+    ) -> Tuple[dict, list, State]:
+        """
+        Run the SCT against the accepted solutions, the most often matched first, until it passes. The student's code
+        is parsed for the first solution tried only. The outcome isn't counted in the metrics, see
+        :func:`htmlwhat.test_exercise.count_outcome`.
+
+        :param reporter: Builds the reporter of every run.
+        :param states: Filled with the root state of every run by solution index, even if a run raises.
+        :param kwargs: Passed to :meth:`state`, e.g. an already parsed ``student_ast``.
+
+        :return: The payload, the feedback of the failures and the root state of the passing run, or of the run
+            against the first solution if none passed.
+        """
+        # counting checks don't depend on the solution
+        order = self.match_order.order() if self.stream_specs is None else [0]
+        states = {} if states is None else states
+
+        def attempt(index: int):
+            nonlocal student_code
+            state = self.state(student_code, index, reporter=reporter(), **kwargs)
+            student_code = state.student_code
+            kwargs.setdefault("student_ast", state.student_ast)
+            states[index] = state
+            return evaluate_sct(self.sct, state)
+
+        index, (payload, failures) = first_match(order, attempt)
+        if payload["correct"]:
+            self.match_order.matched(index)
+        return payload, failures, states[index]
+
+    def grade(self, student_code: str, collect_all: bool = False, budget: Budget = None) -> dict:
+        """
+        Grade the student's code, same as :func:`htmlwhat.test_exercise` with the SCT and solution of the exercise.
+
+        :param student_code: The code written by the student, see :func:`htmlwhat.source.read_code`.
+        :type student_code: str | bytes | os.PathLike
+
+        :param collect_all: Whether to report every failure instead of the first one.
+        :type collect_all: bool, optional
+
+        :param budget: Limits of grading the submission, instead of the ones of the exercise.
+        :type budget: htmlwhat.budget.Budget, optional
+
+        :return: Test result, a dictionary with the keys ``'correct'`` and ``'message'``.
+        :rtype: dict
+
+        :raises InstructorError: If anything wrong in the solution code.
+        """
+        reporter = Reporter(collect=collect_all)
+        budget = budget or self.budget
+
+        def run():
+            states = {}
+            try:
+                payload, failures, _ = self.run_solutions(
+                    student_code, lambda: Reporter(collect=collect_all), states=states
+                )
+                count_outcome(payload, failures)
+                return payload
+            finally:
+                # also when a failure, an exceeded limit or an instructor error escapes, every run shares the tree
+                if self.teardown and states:
+                    teardown_tree(next(iter(states.values())).student_ast)
+
+        def grade():
+            if budget is None:
+                return run()
+            return run_with_budget(budget, reporter, student_code, run)
+
+        return recording.recorded(self.sct_source, self.solution, student_code, collect_all, grade)
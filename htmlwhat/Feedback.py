@@ -1,10 +1,27 @@
 from protowhat.Feedback import Feedback as BaseFeedback
 from protowhat.Feedback import FeedbackComponent
 from jinja2 import Template
-from typing import List
+from typing import Dict, List
+from htmlwhat.positions import get_position
 
 
 class Feedback(BaseFeedback):
+    # name of the failing check, unknown for failures raised outside of the checks, e.g. by fail()
+    check = None
+    # positions are counted from 1 already
+    ast_highlight_offset = {}
+
+    @classmethod
+    def get_highlight_position(cls, highlight) -> Dict[str, int]:
+        # not hasattr(), which finds a child tag named get_position on any tag
+        return get_position(highlight)
+
+    def get_highlight(self) -> Dict[str, int]:
+        if self.full_code_position is not None and self.get_highlight_position(self.highlight) == self.full_code_position:
+            # highlighting the whole code tells nothing, e.g. after has_code()
+            return {}
+        return super().get_highlight()
+
     def get_message(self) -> str:
         msgs = [*filter(lambda x: x is not None, self.context_components)]
         
@@ -23,4 +40,8 @@ class Feedback(BaseFeedback):
         if not msgs:
             return ""
         return " with in `" + " > ".join([msg.kwargs.get("index", "") + msg.kwargs.get("tag") for msg in msgs]) + "`"
-    
\ No newline at end of file
+
+    def get_location(self) -> str:
+        """Path of the tags the failing check was inspecting, e.g. ``html > body > 2nd li``."""
+        msgs = [*filter(lambda x: x is not None, self.context_components)]
+        return " > ".join(msg.kwargs.get("index", "") + msg.kwargs.get("tag", "") for msg in msgs)
@@ -1,10 +1,64 @@
+from contextlib import contextmanager
 from protowhat.Reporter import Reporter as BaseReporter
 from htmlwhat.Feedback import Feedback
+from htmlwhat.budget import BudgetExceeded
 
 
 class Reporter(BaseReporter):
+    """
+    Reporter of htmlwhat.
+
+    With ``collect=True`` failing checks don't raise ``TestFail``, their feedback is collected instead and
+    the final payload lists every failure of the SCT.
+    """
+
+    def __init__(self, runner=None, errors=None, collect=False):
+        super().__init__(runner, errors)
+        self.collect = collect
+        self.collected = [[]]
+
     def build_failed_payload(self, feedback: Feedback):
         return {
             "correct": False,
             "message": Reporter.to_html(feedback.get_message()),
-        }
\ No newline at end of file
+            **feedback.get_highlight(),
+        }
+
+    def build_budget_payload(self, error: BudgetExceeded):
+        """Payload of a grading run that went over a limit of its :class:`htmlwhat.budget.Budget`."""
+        return {
+            "correct": False,
+            "message": Reporter.to_html(str(error)),
+            "budget_exceeded": {"limit": error.limit, "maximum": error.maximum, "value": error.value},
+        }
+
+    def record(self, *feedbacks: Feedback):
+        self.collected[-1].extend(feedbacks)
+
+    @contextmanager
+    def collecting(self):
+        """Collect the failures of a block apart, e.g. to decide between the branches of ``check_or()``."""
+        failures = []
+        self.collected.append(failures)
+        try:
+            yield failures
+        finally:
+            self.collected.pop()
+
+    def build_collected_payload(self):
+        failures = self.collected[0]
+        if not failures:
+            return self.build_final_payload()
+
+        return {
+            **self.build_failed_payload(failures[0]),
+            "failures": [
+                {
+                    "message": Reporter.to_html(feedback.get_message()),
+                    "path": feedback.get_location(),
+                    "check": feedback.check,
+                    **feedback.get_highlight(),
+                }
+                for feedback in failures
+            ],
+        }
@@ -0,0 +1,159 @@
+from typing import List, Union
+from bs4.element import Tag
+from htmlwhat.Exercise import Exercise
+from htmlwhat.memo import CheckMemo
+from htmlwhat.source import read_code_parts
+from htmlwhat.test_exercise import count_outcome
+
+
+# reparsing inside these tags would change how their strings are built
+CONTEXT_SENSITIVE_TAGS = {"pre", "textarea", "template", "script", "style", "rt", "rp"}
+
+
+def common_prefix(a: str, b: str) -> int:
+    """Length of the common prefix of ``a`` and ``b``, found by comparing slices."""
+    lo, hi = 0, min(len(a), len(b))
+    while lo < hi:
+        mid = (lo + hi + 1) // 2
+        if a[lo:mid] == b[lo:mid]:
+            lo = mid
+        else:
+            hi = mid - 1
+    return lo
+
+
+def common_suffix(a: str, b: str, limit: int) -> int:
+    """Length of the common suffix of ``a`` and ``b``, at most ``limit``."""
+    lo, hi = 0, limit
+    while lo < hi:
+        mid = (lo + hi + 1) // 2
+        if a[len(a) - mid:len(a) - lo] == b[len(b) - mid:len(b) - lo]:
+            lo = mid
+        else:
+            hi = mid - 1
+    return lo
+
+
+class Session:
+    """
+    Grade successive versions of a student's code against one exercise, e.g. while the student is typing.
+
+    The solution and the SCT are prepared once, as an :class:`htmlwhat.Exercise.Exercise`. For every new version only the smallest tag enclosing the
+    edited part of the code is parsed again and spliced into the previous tree, the rest of the nodes are
+    reused. Checks that passed on a node whose subtree did not change are not run again, their outcome is
+    taken from a :class:`htmlwhat.memo.CheckMemo`. The result is always the same as the one of
+    :func:`htmlwhat.test_exercise`.
+
+    :param sct: The SCT (Submission Correctness Test) code to evaluate the student's code against.
+    :type sct: str
+
+    :param solution_code: The correct solution code, or a list of accepted solutions.
+    :type solution_code: str | List[str]
+
+    :example:
+        >>> from htmlwhat.Session import Session
+        >>> session = Session("Ex().check_body().check_tag('p').has_equal_text()", "<body><p>Hello</p></body>")
+        >>> session.grade("<body><p>Hel</p></body>")['correct']
+        False
+        >>> session.grade("<body><p>Hello</p></body>")['correct']
+        True
+    """
+
+    def __init__(self, sct: str, solution_code: Union[str, List[str]]):
+        self.exercise = Exercise(sct, solution_code)
+        self.dispatcher = self.exercise.dispatcher
+        self.student_code = None
+        self.student_ast = None
+        self.memo = CheckMemo()
+        self.full_parses = 0
+        self.partial_parses = 0
+
+    def grade(self, student_code: str) -> dict:
+        """
+        Grade a new version of the student's code.
+
+        :param student_code: The code written by the student, see :func:`htmlwhat.source.read_code`.
+        :type student_code: str | bytes | os.PathLike
+
+        :return: Test result, a dictionary with the keys ``'correct'`` and ``'message'``.
+        :rtype: dict
+        """
+        prefix, student_code = read_code_parts(student_code, "arg: student_code")
+
+        if self.student_ast is None or not self.update(student_code):
+            self.memo.clear()
+            self.student_ast = self.dispatcher.parse(student_code)
+            self.full_parses += 1
+        self.student_code = student_code
+        # the whitespace stripped from the start can change without the code
+        self.student_ast.stripped_prefix = prefix
+        self.student_ast.caches.pop("lines", None)
+
+        payload, failures, _ = self.exercise.run_solutions(
+            student_code, student_ast=self.student_ast, check_memo=self.memo
+        )
+        count_outcome(payload, failures)
+        return payload
+
+    def update(self, code: str) -> bool:
+        """Splice the changes of ``code`` into the previous tree, return ``False`` if a full parse is needed."""
+        previous = self.student_code
+        if code == previous:
+            return True
+
+        if not self.student_ast.balanced:
+            # unterminated markup of the previous code could swallow the edit, or be ended by it
+            return False
+
+        start = common_prefix(previous, code)
+        end = len(previous) - common_suffix(previous, code, min(len(previous), len(code)) - start)
+        delta = len(code) - len(previous)
+
+        node = self.enclosing_tag(start, end)
+        if node is None:
+            return False
+
+        fragment = self.dispatcher.parse(code[node.start_offset:node.end_offset + delta])
+        replacement = fragment.contents[0] if len(fragment.contents) == 1 else None
+        if not fragment.balanced or not isinstance(replacement, Tag) or replacement.name != node.name:
+            return False
+
+        for removed in (node, *node.descendants):
+            self.memo.forget(removed)
+        for parent in node.parents:
+            self.memo.forget(parent)
+            parent.end_offset += delta
+
+        base = node.start_offset
+        node.replace_with(replacement)
+        for tag in (replacement, *replacement.find_all(True)):
+            tag.start_offset += base
+            tag.end_offset += base
+
+        following = replacement._last_descendant().next_element
+        while following is not None:
+            if isinstance(following, Tag):
+                following.start_offset += delta
+                following.end_offset += delta
+            following = following.next_element
+
+        self.student_ast.source = code
+        self.student_ast.caches.clear()
+        self.partial_parses += 1
+        return True
+
+    def enclosing_tag(self, start: int, end: int):
+        """
+        Deepest tag that strictly contains the edited range ``[start, end)`` of the previous code, but no tag of
+        :data:`CONTEXT_SENSITIVE_TAGS` or inside one, which are never parsed on their own.
+        """
+        node = None
+        while True:
+            for child in (node or self.student_ast).children:
+                if isinstance(child, Tag) and child.start_offset < start and end < child.end_offset:
+                    if child.name in CONTEXT_SENSITIVE_TAGS:
+                        return node
+                    node = child
+                    break
+            else:
+                return node
@@ -1,24 +1,164 @@
+from copy import copy
 from bs4 import BeautifulSoup
+from bs4.builder import HTMLParserTreeBuilder, ParserRejectedMarkup
+from bs4.builder._htmlparser import BeautifulSoupHTMLParser
 from protowhat.State import State as BaseState
+from protowhat.Feedback import FeedbackComponent
 from htmlwhat.Reporter import Reporter
 from protowhat.selectors import DispatcherInterface
 from htmlwhat.Feedback import Feedback
-from htmlwhat.utils import check_str
+from htmlwhat.utils import current_check
+from htmlwhat.source import read_code, read_code_parts
+from htmlwhat.positions import get_position
+from htmlwhat.budget import current_budget
+from htmlwhat import metrics
+
+
+class ClosedEmptyElements(dict):
+    """
+    Multiset of the names of the empty elements closed right after their start tag, with the methods of the list
+    Beautiful Soup keeps them in. Looking an end tag up in that list is linear, so a storm of ``<br>`` and stray end
+    tags took quadratic time.
+    """
+
+    def append(self, name):
+        self[name] = self.get(name, 0) + 1
+
+    def remove(self, name):
+        if self[name] == 1:
+            del self[name]
+        else:
+            self[name] -= 1
+
+
+class HtmlParser(BeautifulSoupHTMLParser):
+    """``html.parser`` based parser that records where every tag starts and ends in the source."""
+
+    position = 0
+    consumed = 0
+    startend = False
+
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        self.already_closed_empty_element = ClosedEmptyElements()
+
+    def updatepos(self, i, j):
+        # start of the next token, as an absolute offset in the fed markup
+        self.position = self.consumed + j
+        return super().updatepos(i, j)
+
+    def goahead(self, end):
+        size = len(self.rawdata)
+        super().goahead(end)
+        self.consumed += size - len(self.rawdata)
+
+    def handle_startendtag(self, name, attrs):
+        self.startend = True
+        super().handle_startendtag(name, attrs)
+        self.startend = False
+
+    def handle_starttag(self, name, attrs, handle_empty_element=True):
+        start = self.position
+        end = start + len(self.get_starttag_text() or "")
+        self.soup.opening = (start, end)
+        # empty elements are closed right after their start tag
+        self.soup.closing = (name, end, end)
+        super().handle_starttag(name, attrs, handle_empty_element)
+
+    def handle_endtag(self, name, check_already_closed=True):
+        if check_already_closed and not self.startend:
+            start = self.position
+            end = self.rawdata.find(">", start - self.consumed + 1) + 1 + self.consumed
+            self.soup.closing = (name, start, end)
+            if not self.soup.open_tag_counter.get(name) and name not in self.already_closed_empty_element:
+                # stray end tag, it would close an outer tag if parsed in context
+                self.soup.balanced = False
+        super().handle_endtag(name, check_already_closed)
+
+    def close(self):
+        if self.rawdata:
+            # something was left incomplete at the end of the markup
+            self.soup.balanced = False
+        super().close()
+        end = self.consumed + len(self.rawdata)
+        self.soup.closing = (None, end, end)
+
+
+class HtmlTreeBuilder(HTMLParserTreeBuilder):
+    """Tree builder feeding the markup through :class:`HtmlParser`."""
+
+    def feed(self, markup):
+        args, kwargs = self.parser_args
+        parser = HtmlParser(*args, **kwargs)
+        parser.soup = self.soup
+        self.soup.source = markup
+        try:
+            parser.feed(markup)
+            parser.close()
+        except AssertionError as e:
+            raise ParserRejectedMarkup(e)
+        parser.already_closed_empty_element = []
 
 
 class BeautifulSoupNode(BeautifulSoup):
-    """Treated as a node in the AST."""
+    """
+    Treated as a node in the AST.
+
+    When parsed with :class:`HtmlTreeBuilder` every tag gets a ``start_offset`` and an ``end_offset``
+    into the parsed code, kept as ``source``, and ``balanced`` tells whether every tag was closed by its own end tag.
+    """
+
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        if self.closing is not None:
+            self.start_offset, self.end_offset = 0, self.closing[2]
+
+    def reset(self):
+        self.opening = None
+        self.closing = None
+        self.balanced = True
+        self.source = None
+        # the whitespace stripped from the start of the code, see htmlwhat.positions
+        self.stripped_prefix = ""
+        # per document data derived from the tree, cleared when the tree is edited
+        self.caches = {}
+        super().reset()
+
+    def handle_starttag(self, *args, **kwargs):
+        budget = current_budget.get()
+        if budget is not None:
+            budget.check_node(len(self.tagStack))
+        tag = super().handle_starttag(*args, **kwargs)
+        if tag is not None and self.opening is not None:
+            tag.start_offset = self.opening[0]
+        return tag
+
+    def popTag(self):
+        if self.closing is not None:
+            tag = self.currentTag
+            name, start, end = self.closing
+            if tag.name == name:
+                tag.end_offset = end
+            else:
+                # implicitly closed by an outer end tag or by the end of the code
+                tag.end_offset = start
+                self.balanced = False
+        return super().popTag()
 
     def get_position(self):
-        return None
+        return get_position(self)
 
 
 class HtmlDispatcher(DispatcherInterface):
     """Dispatcher for HTML AST."""
 
+    class ParseError(Exception):
+        """Caught by ``State.parse()`` of protowhat, ``html.parser`` recovers from any markup so it isn't raised."""
+
     def parse(self, code) -> BeautifulSoupNode:
         """function that parse the data and return the AST node."""
-        return BeautifulSoupNode(code, 'html.parser')
+        with metrics.timed("parse_seconds"):
+            return BeautifulSoupNode(code, builder=HtmlTreeBuilder)
 
     def describe(self, node) -> str:
         """function that returns the name of the node."""
@@ -41,9 +181,11 @@ class State(BaseState):
         solution_ast=None,
         student_ast=None,
         ast_dispatcher=None,
+        check_memo=None,
     ):
         args = locals().copy()
         self.debug = False
+        self.failed = False
 
         for k, v in args.items():
             if k != "self":
@@ -52,16 +194,42 @@ class State(BaseState):
         if ast_dispatcher is None:
             self.ast_dispatcher = self.get_dispatcher()
 
-        if check_str(self.solution_code, "arg: solution_code") and self.solution_ast is None:
-            self.solution_code = self.solution_code.strip()
+        # codes are only stripped when they are parsed here
+        self.solution_code = read_code(self.solution_code, "arg: solution_code", strip=self.solution_ast is None)
+        if self.solution_ast is None:
             self.solution_ast = self.parse(self.solution_code)
-        if check_str(self.student_code, "arg: student_code") and self.student_ast is None:
-            self.student_code = self.student_code.strip()
+        if self.student_ast is None:
+            prefix, self.student_code = read_code_parts(self.student_code, "arg: student_code")
             self.student_ast = self.parse(self.student_code)
+            self.student_ast.stripped_prefix = prefix
+        else:
+            self.student_code = read_code(self.student_code, "arg: student_code", strip=False)
 
     def get_dispatcher(self):
         return HtmlDispatcher()
 
+    @property
+    def collecting(self) -> bool:
+        return getattr(self.reporter, "collect", False)
+
+    def report(self, feedback: str, kwargs=None, append=True):
+        """
+        Fail the check. Raises ``TestFail``, unless the reporter collects failures: then the failure is
+        recorded and a failed copy of the state is returned, on which the remaining checks of the chain are skipped.
+        """
+        if self.debug or not self.collecting:
+            return super().report(feedback, kwargs, append)
+        if not self.failed:
+            failure = self.get_feedback(FeedbackComponent(feedback, kwargs, append))
+            failure.check = current_check.get()
+            self.reporter.record(failure)
+        return self.as_failed()
+
+    def as_failed(self):
+        failed = copy(self)
+        failed.failed = True
+        return failed
+
     def get_ast_path(self):
         # print([_.solution_ast.name for _ in self.state_history])
         # return self.ast_dispatcher.get_path(self.solution_ast)
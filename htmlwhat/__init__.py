@@ -1,3 +1,4 @@
 __version__ = "1.0.2"
 
 from htmlwhat.test_exercise import test_exercise
+from htmlwhat.Session import Session
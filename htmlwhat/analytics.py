@@ -0,0 +1,265 @@
+"""
+Run the SCT of an exercise over a whole corpus of submissions and get the outcome as columns, e.g. to find out
+which checks fail most often.
+
+.. code-block:: python
+
+    >>> from htmlwhat.analytics import analyze
+    >>> results = analyze(sct, solution_code, submissions, workers=8)
+    >>> results.failure_counts()
+    {('has_equal_text', 'head > title'): 5123, ('check_tag', 'body > ul'): 880}
+    >>> results.to_csv("cohort.csv")
+"""
+
+import csv
+import os
+from array import array
+from collections import deque
+from concurrent.futures import ProcessPoolExecutor
+from typing import Iterable, List, Tuple, Union
+
+from htmlwhat import memory
+from htmlwhat.Exercise import Exercise
+from htmlwhat.failure import InstructorError
+from htmlwhat.memory import GCTuning, teardown_tree
+from htmlwhat.Reporter import Reporter
+from htmlwhat.source import read_code_parts
+from htmlwhat.test_exercise import count_outcome
+
+
+FEATURES = ("tags", "attributes", "depth")
+
+
+def document_features(document) -> Tuple[int, int, int]:
+    """Number of tags, number of attributes and maximum depth of a parsed document."""
+    depths = {id(document): 0}
+    tags = attributes = depth = 0
+    for tag in document.find_all(True):
+        tag_depth = depths[id(tag)] = depths[id(tag.parent)] + 1
+        tags += 1
+        attributes += len(tag.attrs)
+        depth = max(depth, tag_depth)
+    return tags, attributes, depth
+
+
+class CohortReporter(Reporter):
+    """Collecting reporter whose payload lists the failed check nodes, without rendering any message."""
+
+    def __init__(self):
+        super().__init__(collect=True)
+
+    def build_failed_payload(self, feedback):
+        # raised outside of the checks, e.g. by fail()
+        return {"correct": False, "failures": [(feedback.check or "", feedback.get_location())]}
+
+    def build_collected_payload(self):
+        failures = [(feedback.check or "", feedback.get_location()) for feedback in self.collected[0]]
+        return {"correct": not failures, "failures": failures}
+
+
+def grade_submission(exercise: Exercise, student_code: str):
+    """
+    Grade one submission collecting every failure, return its row: correctness, failed check nodes, features and
+    error. A submission that can't be graded, e.g. that isn't code, gets a failed row with its error, an
+    ``InstructorError`` is raised.
+    """
+    student_ast = None
+    try:
+        # the features need the tree, even for SCTs that could be streamed
+        prefix, student_code = read_code_parts(student_code, "arg: student_code")
+        student_ast = exercise.dispatcher.parse(student_code)
+        student_ast.stripped_prefix = prefix
+        payload, failures, _ = exercise.run_solutions(student_code, CohortReporter, student_ast=student_ast)
+        count_outcome(payload, failures)
+        return payload["correct"], payload["failures"], document_features(student_ast), ""
+    except InstructorError:
+        raise
+    except Exception as e:
+        return False, [], (0,) * len(FEATURES), f"{type(e).__name__}: {e}"
+    finally:
+        if exercise.teardown:
+            teardown_tree(student_ast)
+
+
+_worker_exercise = None
+
+
+def _init_worker(sct: str, solution_code: str, teardown: bool, gc_tuning: GCTuning):
+    global _worker_exercise
+    _worker_exercise = Exercise(sct, solution_code, teardown=teardown)
+    memory.apply(gc_tuning)
+
+
+def _grade_chunk(chunk: List[str]):
+    return [grade_submission(_worker_exercise, student_code) for student_code in chunk]
+
+
+def _chunks(submissions: Iterable[str], size: int):
+    chunk = []
+    for student_code in submissions:
+        chunk.append(student_code)
+        if len(chunk) == size:
+            yield chunk
+            chunk = []
+    if chunk:
+        yield chunk
+
+
+class CohortResults:
+    """
+    Outcome of an SCT over a corpus, one row per submission.
+
+    - ``correct``: whether the submission passed.
+    - ``failure_path``: where the first failure was found, e.g. ``body > ul > 2nd li``, empty if it passed.
+    - ``nodes``: the check nodes that failed for at least one submission, as ``(check, path)`` pairs.
+    - ``failed``: for every submission, the indices in ``nodes`` of the check nodes that failed. A check node that
+      isn't listed either passed or wasn't reached because an earlier check of its chain failed.
+    - ``tags``, ``attributes``, ``depth``: features of the parsed submission.
+    - ``error``: the error of a submission that couldn't be graded, which then failed, empty for the others.
+    """
+
+    def __init__(self):
+        self.correct = array("b")
+        self.failure_path: List[str] = []
+        self.nodes: List[Tuple[str, str]] = []
+        self.node_index = {}
+        self.failed: List[Tuple[int, ...]] = []
+        self.tags = array("l")
+        self.attributes = array("l")
+        self.depth = array("l")
+        self.error: List[str] = []
+
+    def __len__(self):
+        return len(self.correct)
+
+    def add(self, correct: bool, failures, features, error: str = ""):
+        self.correct.append(correct)
+        self.error.append(error)
+        self.failure_path.append(failures[0][1] if failures else "")
+        failed = []
+        for node in dict.fromkeys(failures):
+            if node not in self.node_index:
+                self.node_index[node] = len(self.nodes)
+                self.nodes.append(node)
+            failed.append(self.node_index[node])
+        self.failed.append(tuple(failed))
+        for column, value in zip((self.tags, self.attributes, self.depth), features):
+            column.append(value)
+
+    def failure_counts(self) -> dict:
+        """Number of submissions failing every check node, most frequent first."""
+        counts = [0] * len(self.nodes)
+        for failed in self.failed:
+            for node in failed:
+                counts[node] += 1
+        return dict(sorted(zip(self.nodes, counts), key=lambda item: -item[1]))
+
+    def failure_matrix(self):
+        """Boolean NumPy matrix of the failed check nodes, a row per submission and a column per node."""
+        import numpy as np
+
+        matrix = np.zeros((len(self), len(self.nodes)), dtype=bool)
+        for row, failed in enumerate(self.failed):
+            matrix[row, list(failed)] = True
+        return matrix
+
+    def to_numpy(self) -> dict:
+        """The columns as NumPy arrays, NumPy is only needed for this method."""
+        import numpy as np
+
+        return {
+            "correct": np.frombuffer(self.correct, dtype=np.int8).astype(bool),
+            "failure_path": np.array(self.failure_path, dtype=object),
+            "failed": self.failure_matrix(),
+            **{feature: np.array(getattr(self, feature), dtype=np.int64) for feature in FEATURES},
+            "error": np.array(self.error, dtype=object),
+        }
+
+    def to_csv(self, file):
+        """
+        Write the results as CSV, to a path or an open text file: a row per submission with its correctness,
+        first failure path, features and error, followed by a ``0``/``1`` column per check node.
+        """
+        if isinstance(file, (str, os.PathLike)):
+            with open(file, "w", newline="", encoding="utf-8") as f:
+                return self.to_csv(f)
+
+        writer = csv.writer(file)
+        writer.writerow([
+            "correct", "failure_path", *FEATURES, "error", *(f"{check}@{path}" for check, path in self.nodes)
+        ])
+        width = len(self.nodes)
+        for row in range(len(self)):
+            flags = [0] * width
+            for node in self.failed[row]:
+                flags[node] = 1
+            writer.writerow([
+                int(self.correct[row]), self.failure_path[row],
+                self.tags[row], self.attributes[row], self.depth[row], self.error[row], *flags,
+            ])
+
+
+def analyze(
+    sct: str,
+    solution_code: Union[str, List[str]],
+    submissions: Iterable[str],
+    workers: int = 1,
+    chunksize: int = 64,
+    teardown: bool = False,
+    gc_tuning: GCTuning = None,
+) -> CohortResults:
+    """
+    Run ``sct`` over every submission of ``submissions``, collecting every failure of each.
+
+    The exercise is prepared once, per worker process when ``workers`` is more than one. Submissions are read as
+    they are sent to the workers, in chunks of ``chunksize`` with at most two chunks per worker in flight, and the
+    results keep the order of ``submissions``. A submission that can't be graded fails with its ``error``, the
+    others are still graded.
+
+    :param sct: The SCT (Submission Correctness Test) code.
+    :type sct: str
+
+    :param solution_code: The correct solution code, or a list of accepted solutions.
+    :type solution_code: str | List[str]
+
+    :param submissions: The student codes.
+    :type submissions: Iterable[str]
+
+    :param workers: Number of worker processes, ``None`` for one per CPU. With ``1`` the corpus is graded in this process.
+    :type workers: int, optional
+
+    :param chunksize: Number of submissions sent to a worker at once.
+    :type chunksize: int, optional
+
+    :param teardown: Whether to break down every student tree once graded, see :mod:`htmlwhat.memory`.
+    :type teardown: bool, optional
+
+    :param gc_tuning: Settings of the garbage collector while grading, applied once the exercise is prepared.
+        ``None`` keeps the settings of the interpreter.
+    :type gc_tuning: htmlwhat.memory.GCTuning, optional
+
+    :rtype: CohortResults
+
+    :raises InstructorError: If anything wrong in the solution code.
+    """
+    results = CohortResults()
+    if workers == 1:
+        exercise = Exercise(sct, solution_code, teardown=teardown)
+        with memory.tuned(gc_tuning):
+            for student_code in submissions:
+                results.add(*grade_submission(exercise, student_code))
+        return results
+
+    initargs = (sct, solution_code, teardown, gc_tuning)
+    in_flight = 2 * (workers or os.cpu_count() or 1)
+    with ProcessPoolExecutor(workers, initializer=_init_worker, initargs=initargs) as executor:
+        pending = deque()
+        for chunk in _chunks(submissions, chunksize):
+            pending.append(executor.submit(_grade_chunk, chunk))
+            while len(pending) >= in_flight:
+                for row in pending.popleft().result():
+                    results.add(*row)
+        while pending:
+            for row in pending.popleft().result():
+                results.add(*row)
+    return results
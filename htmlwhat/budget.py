@@ -0,0 +1,151 @@
+import signal
+import threading
+import time
+import warnings
+from contextlib import contextmanager
+from contextvars import ContextVar
+from copy import copy
+
+from htmlwhat.source import code_size
+
+
+# the budget of the submission being graded, checked while parsing and running checks
+current_budget = ContextVar("current_budget", default=None)
+
+
+class BudgetExceeded(Exception):
+    """Grading a submission went over one of the limits of its :class:`Budget`."""
+
+    MESSAGES = {
+        "max_input_size": "Your code is too long to be checked, it has more than {maximum} characters.",
+        "max_nodes": "Your code has too many tags to be checked, more than {maximum}.",
+        "max_depth": "Your code nests tags too deeply to be checked, more than {maximum} levels.",
+        "wall_time": "Checking your code took too long.",
+        "cpu_time": "Checking your code took too long.",
+    }
+
+    def __init__(self, limit: str, maximum, value=None):
+        self.limit = limit
+        self.maximum = maximum
+        self.value = value
+        super().__init__(self.MESSAGES[limit].format(maximum=maximum))
+
+
+class BudgetTimerWarning(UserWarning):
+    """The wall-clock deadline of a :class:`Budget` is only checked between the steps of the grading."""
+
+
+class Budget:
+    """
+    Limits of grading one submission.
+
+    The size of the student code is checked before it is parsed, the number of tags and their depth while it
+    is parsed, and the deadlines while it is parsed and before every check. In the main thread a timer also
+    interrupts the grading at the wall-clock deadline, whatever it is doing. In any other thread, e.g. the worker
+    threads of the grading service, the limit is cooperative, not preemptive: the deadlines are only checked at
+    those points, so a single long step, such as serializing or getting the text of a large tag or matching a CSS
+    selector, runs to its end past ``wall_time``. The timer isn't armed either when another one is already set in
+    the process, a :class:`BudgetTimerWarning` is then issued. A grading run over a limit returns a payload with a
+    ``'budget_exceeded'`` key, see :meth:`htmlwhat.Reporter.Reporter.build_budget_payload`.
+
+    A budget can be shared by all gradings, every run gets its own counters.
+
+    :param wall_time: Maximum number of seconds of grading.
+    :type wall_time: float, optional
+
+    :param cpu_time: Maximum number of CPU seconds of grading, used by the grading thread.
+    :type cpu_time: float, optional
+
+    :param max_input_size: Maximum number of characters of the student code, or of bytes if it is given as bytes.
+    :type max_input_size: int, optional
+
+    :param max_nodes: Maximum number of tags in the student code.
+    :type max_nodes: int, optional
+
+    :param max_depth: Maximum nesting depth of the tags in the student code.
+    :type max_depth: int, optional
+
+    :example:
+        >>> from htmlwhat import test_exercise
+        >>> from htmlwhat.budget import Budget
+        >>> test_exercise("Ex().check_body()", "<div>" * 5000, "<body></body>", budget=Budget(max_depth=1000))
+        {'correct': False, 'message': 'Your code nests tags too deeply to be checked, more than 1000 levels.',
+         'budget_exceeded': {'limit': 'max_depth', 'maximum': 1000, 'value': 1001}}
+    """
+
+    # deadlines are checked every that many tags while parsing
+    check_every = 256
+
+    def __init__(
+        self,
+        wall_time: float = None,
+        cpu_time: float = None,
+        max_input_size: int = None,
+        max_nodes: int = None,
+        max_depth: int = None,
+    ):
+        self.wall_time = wall_time
+        self.cpu_time = cpu_time
+        self.max_input_size = max_input_size
+        self.max_nodes = max_nodes
+        self.max_depth = max_depth
+        self.nodes = 0
+        self.wall_deadline = None
+        self.cpu_deadline = None
+
+    @contextmanager
+    def active(self):
+        """Start a run of the budget, it applies to everything graded inside the block."""
+        run = copy(self)
+        run.nodes = 0
+        run.wall_deadline = time.monotonic() + self.wall_time if self.wall_time is not None else None
+        run.cpu_deadline = time.thread_time() + self.cpu_time if self.cpu_time is not None else None
+
+        token = current_budget.set(run)
+        timer = self.wall_time is not None and threading.current_thread() is threading.main_thread()
+        if timer and hasattr(signal, "setitimer") and signal.getitimer(signal.ITIMER_REAL)[0]:
+            warnings.warn(
+                "A timer is already set, the wall-clock deadline of the budget is only checked between the steps of "
+                "the grading.",
+                BudgetTimerWarning,
+                stacklevel=3,
+            )
+            timer = False
+        if timer and hasattr(signal, "setitimer"):
+            def expire(signum, frame):
+                raise BudgetExceeded("wall_time", self.wall_time)
+
+            previous_handler = signal.signal(signal.SIGALRM, expire)
+            signal.setitimer(signal.ITIMER_REAL, self.wall_time)
+        else:
+            timer = False
+        try:
+            yield run
+        finally:
+            if timer:
+                signal.setitimer(signal.ITIMER_REAL, 0)
+                signal.signal(signal.SIGALRM, signal.SIG_DFL if previous_handler is None else previous_handler)
+            current_budget.reset(token)
+
+    def check_input(self, code):
+        """Check the size of ``code`` before it is read, see :func:`htmlwhat.source.code_size`."""
+        if self.max_input_size is not None:
+            size = code_size(code)
+            if size > self.max_input_size:
+                raise BudgetExceeded("max_input_size", self.max_input_size, size)
+
+    def check_node(self, depth: int):
+        """Count a parsed tag at ``depth``."""
+        self.nodes += 1
+        if self.max_nodes is not None and self.nodes > self.max_nodes:
+            raise BudgetExceeded("max_nodes", self.max_nodes, self.nodes)
+        if self.max_depth is not None and depth > self.max_depth:
+            raise BudgetExceeded("max_depth", self.max_depth, depth)
+        if not self.nodes % self.check_every:
+            self.check_time()
+
+    def check_time(self):
+        if self.wall_deadline is not None and time.monotonic() > self.wall_deadline:
+            raise BudgetExceeded("wall_time", self.wall_time)
+        if self.cpu_deadline is not None and time.thread_time() > self.cpu_deadline:
+            raise BudgetExceeded("cpu_time", self.cpu_time)
@@ -1,5 +1,6 @@
-from protowhat.checks.check_logic import multi, check_not, check_or, check_correct, fail
+from protowhat.checks.check_logic import multi, fail
+from htmlwhat.checks.check_logic import check_not, check_or, check_correct
 from protowhat.checks.check_simple import success_msg
-from htmlwhat.checks.check_func import check_body, check_head, check_html, check_tag
-from htmlwhat.checks.has_func import has_code, has_equal_attr, has_equal_text
+from htmlwhat.checks.check_func import check_body, check_head, check_html, check_tag, check_each_tag, check_css_pattern, check_path
+from htmlwhat.checks.has_func import has_code, has_equal_attr, has_equal_attrs_deep, has_equal_text, has_equal_style, has_equal_structure, has_tag, has_tag_count
 from htmlwhat.checks.check_doc import check_doctype 
@@ -1,8 +1,10 @@
 from protowhat.failure import InstructorError
 from bs4.element import Doctype
 from protowhat.Feedback import FeedbackComponent
+from htmlwhat.utils import state_check
 
 
+@state_check
 def check_doctype(
         state, 
         missing_msg="Are you sure you defined `<{{tag}}>`?", 
@@ -67,7 +69,7 @@ def check_doctype(
             "`check_doctype()` couldn't find `<!DOCTYPE>` tag in solution."
         )
     if not isinstance(student_, Doctype):
-        state.report(missing_msg, append=append, kwargs=kwargs)
+        return state.report(missing_msg, append=append, kwargs=kwargs)
 
     return state.to_child(append_message=expand_msg, **{
         "solution_ast": solution_,
@@ -1,13 +1,16 @@
 from protowhat.failure import InstructorError
 from bs4.element import Tag
-from htmlwhat.utils import number_to_position, check_str
+from htmlwhat.utils import number_to_position, check_str, state_check
+from htmlwhat.css import compile_selector, split_selector, unmatched_part
 from protowhat.Feedback import FeedbackComponent
+from protowhat.checks.check_logic import multi
 
 
 EXPND_MSG = "Inspect the `<{{tag}}>` tag"
 MISSING_MSG = "Are you sure you included `<{{tag}}>` tag?"
 
 
+@state_check
 def check_html(state, missing_msg=MISSING_MSG, expand_msg=EXPND_MSG, append=False, **kwargs):
     """
     Check whether the student code contain the ``<html>`` tag or not.
@@ -61,7 +64,7 @@ def check_html(state, missing_msg=MISSING_MSG, expand_msg=EXPND_MSG, append=Fals
         )
 
     if not isinstance(state.student_ast.html, Tag):
-        state.report(missing_msg, append=append, kwargs=kwargs)
+        return state.report(missing_msg, append=append, kwargs=kwargs)
 
     return state.to_child(append_message=expand_msg, **{
         "solution_ast": state.solution_ast.html,
@@ -69,6 +72,7 @@ def check_html(state, missing_msg=MISSING_MSG, expand_msg=EXPND_MSG, append=Fals
     })
 
 
+@state_check
 def check_head(state, missing_msg=MISSING_MSG, expand_msg=EXPND_MSG, append=False, **kwargs):
     """
     Check whether the student code contains the ``<head>`` tag or not.
@@ -122,7 +126,7 @@ def check_head(state, missing_msg=MISSING_MSG, expand_msg=EXPND_MSG, append=Fals
         )
 
     if not isinstance(state.student_ast.head, Tag):
-        state.report(missing_msg, append=append, kwargs=kwargs)
+        return state.report(missing_msg, append=append, kwargs=kwargs)
 
     return state.to_child(append_message=expand_msg, **{
         "solution_ast": state.solution_ast.head,
@@ -130,6 +134,7 @@ def check_head(state, missing_msg=MISSING_MSG, expand_msg=EXPND_MSG, append=Fals
     })
 
 
+@state_check
 def check_body(state, missing_msg=MISSING_MSG, expand_msg=EXPND_MSG, append=False, **kwargs):
     """
     Check whether the student code contains the ``<body>`` tag or not.
@@ -183,7 +188,7 @@ def check_body(state, missing_msg=MISSING_MSG, expand_msg=EXPND_MSG, append=Fals
         )
 
     if not isinstance(state.student_ast.body, Tag):
-        state.report(missing_msg, append=append, kwargs=kwargs)
+        return state.report(missing_msg, append=append, kwargs=kwargs)
 
     return state.to_child(append_message=expand_msg, **{
         "solution_ast": state.solution_ast.body,
@@ -191,6 +196,7 @@ def check_body(state, missing_msg=MISSING_MSG, expand_msg=EXPND_MSG, append=Fals
     })
 
 
+@state_check
 def check_tag(
         state, 
         name: str, 
@@ -288,7 +294,7 @@ def check_tag(
     })
 
     if len(student_tags) <= index:
-        state.report(missing_msg, append=append, kwargs=kwargs)
+        return state.report(missing_msg, append=append, kwargs=kwargs)
 
     expand_msg = FeedbackComponent(expand_msg, kwargs=kwargs)
 
@@ -298,4 +304,289 @@ def check_tag(
     })
 
 
-# TODO: create check_path, check_css_pattern, remaining
+@state_check(memoize=False)
+def check_each_tag(
+        state,
+        name: str,
+        *tests,
+        missing_msg="Did you include the {{index}}`{{tag}}` tag properly?",
+        expand_msg="Check the {{index}}`{{tag}}` tag",
+        append=True,
+        **kwargs
+    ):
+    """
+    Run the same tests on every ``name`` tag of the solution code and the student tag at the same index, **among the
+    direct children of the current state or tag**. The children are looked up once in both trees, so
+
+    .. code-block:: python
+
+        Ex().check_body().check_tag("ol").check_each_tag("li", has_equal_text(), has_equal_attr())
+
+    gives the same feedback as
+
+    .. code-block:: python
+
+        Ex().check_body().check_tag("ol").multi(
+            check_tag("li", index).multi(has_equal_text(), has_equal_attr()) for index in range(6)
+        )
+
+    without knowing in advance that the solution has 6 ``li`` tags, and it stays linear in the number of tags.
+
+    :param state: State instance describing student and solution code. Can be omitted if used with ``Ex()``.
+    :type state: object
+
+    :param name: The name of the tags to check, for example ``"li"``.
+    :type name: str
+
+    :param tests: One or more SCT chains to run on every pair of tags.
+
+    :param missing_msg: Message to display if the student code has fewer tags than the solution code, once for every missing tag.
+    :type missing_msg: str, optional
+
+    :param expand_msg: If specified, this overrides any messages that are prepended by previous SCT chains.
+    :type expand_msg: str, optional
+
+    :param append: Whether to append the message into the message chain. Only work if this test failed, it does not break the chain if future test fails. Basically, only the feedback of this function will be provided on fail.
+    :type append: bool, optional
+
+    :param kwargs: Additional keyword arguments to pass into ``missing_msg`` or ``expand_msg`` jinja template.
+
+    :return: The same State object, like ``multi()``.
+    :rtype: State
+
+    :raises InstructorError: If the given tag is not found in solution code.
+    :raises TestFail: If a tag is missing in student code or a test fails on one of them.
+
+    :example:
+        >>> from htmlwhat.State import State
+        >>> from htmlwhat.checks import check_each_tag, check_tag, check_body
+        >>> from htmlwhat.sct_syntax import F
+        >>> student_code = "<body><ul><li>one</li><li>two</li><li>4</li></ul></body>"
+        >>> solution_code = "<body><ul><li>one</li><li>two</li><li>three</li></ul></body>"
+        >>> state = State(student_code=student_code, solution_code=solution_code)
+        >>> check_each_tag(check_tag(check_body(state), "ul"), "li", F().has_equal_text())
+        Traceback (most recent call last): ...
+        protowhat.failure.TestFail: Check the 3rd `li` tag with in `body > ul`. Expected text not found.
+    """
+
+    tag = name.lower() if check_str(name, _for="arg: name") else None
+
+    solution_tags = state.solution_ast.find_all(tag, recursive=False)
+    student_tags = state.student_ast.find_all(tag, recursive=False)
+
+    if not solution_tags:
+        raise InstructorError.from_message(
+            f"`check_each_tag()` couldn't find `<{tag}>` tag in `<{state.solution_ast.name}>`"
+        )
+
+    for index, solution_tag in enumerate(solution_tags):
+        tag_kwargs = {
+            **kwargs,
+            "tag": tag,
+            "index": (number_to_position(index+1)+" ") if len(solution_tags) > 1 else ""
+        }
+
+        if index >= len(student_tags):
+            state.report(missing_msg, append=append, kwargs=tag_kwargs)
+            continue
+
+        child = state.to_child(append_message=FeedbackComponent(expand_msg, kwargs=tag_kwargs), **{
+            "solution_ast": solution_tag,
+            "student_ast": student_tags[index]
+        })
+        multi(child, *tests)
+
+    return state
+
+
+@state_check(memoize=False)
+def check_css_pattern(
+        state,
+        pattern: str,
+        index=0,
+        missing_msg=(
+            "Did you include {{index}}`{{pattern}}`? {% if count %}Found only {{count}} of them.{% else %}"
+            "Couldn't find `{{part}}`{% if matched %} in `{{matched}}`{% endif %}.{% endif %}"
+        ),
+        expand_msg="Check the {{index}}`{{tag}}` tag",
+        append=True,
+        **kwargs
+    ):
+    """
+    Check the presence of the tags matching a CSS selector in the student code. Unlike :func:`check_tag`,
+    **it searches all the descendants of the current state or tag**, in a single pass over the tree.
+
+    The selector is compiled once and reused for every submission, any selector supported by
+    `soupsieve <https://facelessuser.github.io/soupsieve/>`_ can be used. If the student code has no matching tag,
+    the feedback tells which part of the selector couldn't be matched, if it has fewer of them than ``index + 1``,
+    how many it has. The selector can look at the ancestors and siblings of the current tag, so the outcome of this
+    check is never reused by a :class:`htmlwhat.Session.Session`.
+
+    :param state: State instance describing student and solution code. Can be omitted if used with ``Ex()``.
+    :type state: object
+
+    :param pattern: The CSS selector, for example ``"form .field > input[type=email]"``.
+    :type pattern: str
+
+    :param index: The index of the matching tag to check, in document order (0-based indexing). Default is 0.
+    :type index: int, optional
+
+    :param missing_msg: Message to display if no matching tag is found in student code.
+    :type missing_msg: str, optional
+
+    :param expand_msg: If specified, this overrides any messages that are prepended by previous SCT chains.
+    :type expand_msg: str, optional
+
+    :param append: Whether to append the message into the message chain. Only work if this test failed, it does not break the chain if future test fails. Basically, only the feedback of this function will be provided on fail.
+    :type append: bool, optional
+
+    :param kwargs: Additional keyword arguments to pass into ``missing_msg`` or ``expand_msg`` jinja template.
+
+    :return: The child State object with appropriate messages and ASTs.
+    :rtype: State
+
+    :raises InstructorError: If no tag matching the selector is found in solution code.
+    :raises TestFail: If no tag matching the selector is found in student code.
+
+    :example:
+        >>> from htmlwhat.State import State
+        >>> from htmlwhat.checks import check_css_pattern, check_body
+        >>> student_code = \"\"\"
+        ... <body>
+        ...    <form>
+        ...        <div class="field"><input type="text"></div>
+        ...    </form>
+        ... </body>
+        ... \"\"\"
+        >>> solution_code = \"\"\"
+        ... <body>
+        ...    <form>
+        ...        <div class="field"><input type="email"></div>
+        ...    </form>
+        ... </body>
+        ... \"\"\"
+        >>> state = State(student_code=student_code, solution_code=solution_code)
+        >>> check_css_pattern(check_body(state), "form .field > input[type=email]")
+        Traceback (most recent call last): ...
+        protowhat.failure.TestFail: Inspect the `<body>` tag. Did you include `form .field > input[type=email]`? Couldn't find `input[type=email]` in `form .field`.
+    """
+
+    selector = compile_selector(pattern) if check_str(pattern, _for="arg: pattern") else None
+
+    solution_tags = selector.select(state.solution_ast, limit=index + 2)
+    if len(solution_tags) <= index:
+        raise InstructorError.from_message(
+            f"`check_css_pattern()` couldn't find `{pattern}` in `<{state.solution_ast.name}>` at index {index}"
+        )
+
+    kwargs.update({
+        "pattern": pattern,
+        "tag": solution_tags[index].name,
+        "index": (number_to_position(index+1)+" ") if len(solution_tags) > 1 else ""
+    })
+
+    student_tags = selector.select(state.student_ast, limit=index + 1)
+    if len(student_tags) <= index:
+        if student_tags:
+            kwargs["count"] = len(student_tags)
+        else:
+            kwargs["matched"], kwargs["part"] = unmatched_part(state.student_ast, pattern)
+        return state.report(missing_msg, append=append, kwargs=kwargs)
+
+    expand_msg = FeedbackComponent(expand_msg, kwargs=kwargs)
+
+    return state.to_child(append_message=expand_msg, **{
+        "solution_ast": solution_tags[index],
+        "student_ast": student_tags[index]
+    })
+
+
+@state_check
+def check_path(
+        state,
+        path: str,
+        missing_msg="Did you include the `{{tag}}` tag properly?",
+        expand_msg="Check the `{{tag}}` tag",
+        append=True,
+        **kwargs
+    ):
+    """
+    Check a path of nested tags in the student code, for example ``"div > ul > li:nth-of-type(2)"``.
+    Every step of the path is a CSS compound selector matched against **the direct children** of the tag found by the
+    previous step, so
+
+    .. code-block:: python
+
+        Ex().check_body().check_path("div > ul > li:nth-of-type(2)")
+
+    gives the same feedback as
+
+    .. code-block:: python
+
+        Ex().check_body().check_tag("div").check_tag("ul").check_tag("li", 1)
+
+    but the path is compiled once and both trees are walked down a single time.
+
+    :param state: State instance describing student and solution code. Can be omitted if used with ``Ex()``.
+    :type state: object
+
+    :param path: The steps of the path, separated by ``>``. The first child matching a step is taken.
+    :type path: str
+
+    :param missing_msg: Message to display if a step of the path is missing in student code.
+    :type missing_msg: str, optional
+
+    :param expand_msg: If specified, this overrides any messages that are prepended by previous SCT chains.
+    :type expand_msg: str, optional
+
+    :param append: Whether to append the message into the message chain. Only work if this test failed, it does not break the chain if future test fails. Basically, only the feedback of this function will be provided on fail.
+    :type append: bool, optional
+
+    :param kwargs: Additional keyword arguments to pass into ``missing_msg`` or ``expand_msg`` jinja template.
+
+    :return: The child State object of the last step, with appropriate messages and ASTs.
+    :rtype: State
+
+    :raises InstructorError: If the path is empty, uses other combinators than ``>`` or a step is not found in
+        solution code.
+    :raises TestFail: If a step of the path is not found in student code.
+
+    :example:
+        >>> from htmlwhat.State import State
+        >>> from htmlwhat.checks import check_path, check_body
+        >>> student_code = "<body><div><ul><li>1</li></ul></div></body>"
+        >>> solution_code = "<body><div><ul><li>1</li><li>2</li></ul></div></body>"
+        >>> state = State(student_code=student_code, solution_code=solution_code)
+        >>> check_path(check_body(state), "div > ul > li:nth-of-type(2)")
+        Traceback (most recent call last): ...
+        protowhat.failure.TestFail: Check the `ul` tag with in `body > div`. Did you include the `li:nth-of-type(2)` tag properly?
+    """
+
+    steps = split_selector(path) if check_str(path, _for="arg: path") else ()
+    if not steps:
+        raise InstructorError.from_message("`check_path()` needs a path of at least one step, got an empty one")
+    if any(combinator not in ("", ">") for combinator, _ in steps):
+        raise InstructorError.from_message(
+            f"`check_path()` only supports the child combinator `>`, got `{path}`"
+        )
+
+    for _, step in steps:
+        selector = compile_selector(step)
+
+        solution_tag = next(filter(selector.match, state.solution_ast.find_all(True, recursive=False)), None)
+        if solution_tag is None:
+            raise InstructorError.from_message(
+                f"`check_path()` couldn't find `{step}` in `<{state.solution_ast.name}>`"
+            )
+
+        step_kwargs = {**kwargs, "tag": step, "path": path}
+        student_tag = next(filter(selector.match, state.student_ast.find_all(True, recursive=False)), None)
+        if student_tag is None:
+            return state.report(missing_msg, append=append, kwargs=step_kwargs)
+
+        state = state.to_child(append_message=FeedbackComponent(expand_msg, kwargs=step_kwargs), **{
+            "solution_ast": solution_tag,
+            "student_ast": student_tag
+        })
+
+    return state
@@ -0,0 +1,82 @@
+from protowhat.checks import check_logic
+from protowhat.checks.check_logic import multi, iter_tests
+from protowhat.utils import legacy_signature
+
+
+# The logic functions of protowhat decide between branches by catching ``TestFail``.
+# When the reporter collects failures instead of raising them, the branches are run
+# with their own collection of failures and the decision is made on that.
+
+
+@legacy_signature(incorrect_msg="msg")
+def check_not(state, *tests, msg):
+    """
+    Run multiple subtests that should fail. If all subtests fail, returns original state (for chaining).
+
+    Same as ``check_not()`` of protowhat, also when failures are collected.
+    """
+    if not state.collecting:
+        return check_logic.check_not(state, *tests, msg=msg)
+    if state.failed:
+        return state
+
+    for test in iter_tests(tests):
+        with state.reporter.collecting() as failures:
+            test(state)
+        if failures:
+            continue
+        return state.report(msg)
+
+    return state
+
+
+def check_or(state, *tests):
+    """
+    Test whether at least one SCT passes.
+
+    Same as ``check_or()`` of protowhat, also when failures are collected: then the failures of the first branch are
+    reported if no branch passes.
+    """
+    if not state.collecting:
+        return check_logic.check_or(state, *tests)
+    if state.failed:
+        return state
+
+    first_failures = None
+    for test in iter_tests(tests):
+        with state.reporter.collecting() as failures:
+            multi(state, test)
+        if not failures:
+            return state
+        if first_failures is None:
+            first_failures = failures
+
+    state.reporter.record(*first_failures)
+    return state.as_failed()
+
+
+def check_correct(state, check, diagnose):
+    """
+    Allows feedback from a diagnostic SCT, only if a check SCT fails.
+
+    Same as ``check_correct()`` of protowhat, also when failures are collected.
+    """
+    if not state.collecting:
+        return check_logic.check_correct(state, check, diagnose)
+    if state.failed:
+        return state
+
+    with state.reporter.collecting() as failures:
+        multi(state, check)
+
+    if failures or getattr(state, "force_diagnose", False):
+        with state.reporter.collecting() as diagnosed:
+            multi(state, diagnose)
+        if diagnosed:
+            failures = diagnosed
+
+    if failures:
+        state.reporter.record(*failures)
+        return state.as_failed()
+
+    return state
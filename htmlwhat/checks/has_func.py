@@ -1,14 +1,38 @@
 from typing import Union, List, Tuple
 from protowhat.failure import InstructorError
-import re
-
-
+from protowhat.Feedback import FeedbackComponent
+from htmlwhat.css import StyleIndex
+from htmlwhat.edit_distance import normalize_text, within_tolerance
+from htmlwhat.structure import (
+    AttributeTables, StructureHashes, first_attribute_difference, first_difference, normalize_attrs, child_tags,
+)
+from htmlwhat.safe_regex import DEFAULT_BUDGET, RegexTimeout, safe_search
+from htmlwhat.stream import StreamSummary
+from htmlwhat.utils import state_check, number_to_position, check_str, document_of
+from htmlwhat import metrics
+
+
+def decoded_code(node) -> str:
+    """The code of ``node`` decoded from the tree, kept in the caches of its document for the next calls."""
+    document = document_of(node)
+    decoded = document.caches.setdefault("decoded", {})
+    registry = metrics.active()
+    if registry is not None:
+        registry.cache_lookup("decoded_code", id(node) in decoded)
+    if id(node) not in decoded:
+        decoded[id(node)] = node.decode()
+    return decoded[id(node)]
+
+
+@state_check
 def has_code(
     state,
     text: str,
     incorrect_msg: str = "Didn't find {{text}} in your code.",
     fixed: bool = True,
     append=True,
+    budget: float = DEFAULT_BUDGET,
+    timeout_msg: str = "Your code took too long to check for {{text}}.",
     **kwargs
 ):
     """
@@ -31,12 +55,20 @@ def has_code(
     :param append: Whether to append the message to the existing report. If ``False``, only the message of this function will display.
     :type append: bool, optional
 
+    :param budget: Maximum number of seconds the search of a regex ``text`` may take. Patterns that can take
+                   exponential time, like ``(a+)+``, are reported with a warning when the SCT is loaded, see :mod:`htmlwhat.safe_regex`.
+    :type budget: float, optional
+
+    :param timeout_msg: The message to display if the search of a regex ``text`` takes longer than ``budget``.
+    :type timeout_msg: str, optional
+
     :param kwargs: Additional keyword arguments to pass into ``missing_msg`` or ``expand_msg`` jinja template.
 
     :return: The same State object with updatted messages. And hence recommended to use at the end of the chain.
     :rtype: State
 
-    :raises TestFail: If the given ``text`` is not found in student code.  (aka feedback)
+    :raises InstructorError: If a regex ``text`` is not a valid regular expression.
+    :raises TestFail: If the given ``text`` is not found in student code, or the search ran out of ``budget``.  (aka feedback)
 
     :example:
         >>> from htmlwhat.State import State
@@ -55,21 +87,29 @@ def has_code(
         Traceback (most recent call last): ...
         protowhat.failure.TestFail: Didn't find the pattern `.*\d{3}-\d{2}-\d{4}.*` in your code.
     """
-    student_code = state.student_ast.decode()
-    res = text in student_code if fixed else re.search(text, student_code)
-
+    student_code = decoded_code(state.student_ast)
     kwargs["text"] = f"`{text}`" if fixed else f"the pattern `{text}`"
 
+    try:
+        res = text in student_code if fixed else safe_search(text, student_code, budget)
+    except RegexTimeout:
+        return state.report(timeout_msg, append=append, kwargs=kwargs)
+
     if not res:
-        state.report(incorrect_msg, append=append, kwargs=kwargs)
+        return state.report(incorrect_msg, append=append, kwargs=kwargs)
     return state
 
 
+@state_check
 def has_equal_text(
     state,
     incorrect_msg: str = "Expected text not found.",
     show_text: bool = False,
     append: bool = True,
+    max_distance: int = 0,
+    min_ratio: float = None,
+    normalize_unicode: bool = False,
+    normalize_whitespace: bool = False,
     **kwargs
 ):
     """
@@ -90,12 +130,26 @@ def has_equal_text(
     :param append: Whether to append the message to the existing report. If ``False``, only the message of this function will display.
     :type append: bool, optional
 
+    :param max_distance: Number of characters the student text may have inserted, deleted or substituted (the Levenshtein distance), e.g. ``1`` for a single typo.
+    :type max_distance: int, optional
+
+    :param min_ratio: Minimum similarity of the texts, from ``0`` to ``1``: one minus the distance divided by the length of the longer text. If ``max_distance`` is given too, both must hold. Long texts are compared within a bounded amount of work: when comparing them fully would take more than :data:`htmlwhat.edit_distance.MAX_WORK` steps, e.g. two texts of more than about 14,000 characters, they are rejected if they are more than 316 edits apart (``isqrt(MAX_WORK)``), even if ``max_distance`` or ``min_ratio`` allows more.
+    :type min_ratio: float, optional
+
+    :param normalize_unicode: Whether to compare the texts in the NFKC normal form, so e.g. a composed ``é`` equals ``e`` followed by a combining accent.
+    :type normalize_unicode: bool, optional
+
+    :param normalize_whitespace: Whether to collapse every run of whitespace into a single space before comparing.
+    :type normalize_whitespace: bool, optional
+
     :param kwargs: Additional keyword arguments to pass into ``missing_msg`` or ``expand_msg`` jinja template.
 
     :return: The same State object with updatted messages. And hence recommended to use at the end of the chain.
     :rtype: State
 
-    :raises TestFail: If the student text is not strictly equal to the solution text.  (aka feedback)
+    :raises TestFail: If the student text is not equal to the solution text, or further from it than allowed.  (aka feedback)
+    :raises TypeError: If ``max_distance`` isn't an integer or ``min_ratio`` isn't a number.
+    :raises ValueError: If ``max_distance`` is negative or ``min_ratio`` isn't between ``0`` and ``1``.
 
     :example:
         >>> from htmlwhat.State import State
@@ -122,12 +176,29 @@ def has_equal_text(
         >>> has_equal_text(title_state, show_text=True)
         Traceback (most recent call last): ...
         protowhat.failure.TestFail: Check the `title` tag with in `head`. Expected text `412-52-2222` but found `412-52-2524`
+
+        Two differing characters are tolerated with ``max_distance``,
+
+        >>> has_equal_text(title_state, max_distance=2)
+        <htmlwhat.State.State object at ...>
     """
+    if not isinstance(max_distance, int):
+        raise TypeError("max_distance should be an integer.")
+    if max_distance < 0:
+        raise ValueError("max_distance should not be negative.")
+    if min_ratio is not None and not isinstance(min_ratio, (int, float)):
+        raise TypeError("min_ratio should be a number or None.")
+    if min_ratio is not None and not 0 <= min_ratio <= 1:
+        raise ValueError("min_ratio should be between 0 and 1.")
+
     kwargs["stu"] = student_text = state.student_ast.get_text(separator=" ", strip=True)
     kwargs["sol"] = solution_text = state.solution_ast.get_text(separator=" ", strip=True)
+    if normalize_unicode or normalize_whitespace:
+        student_text = normalize_text(student_text, normalize_unicode, normalize_whitespace)
+        solution_text = normalize_text(solution_text, normalize_unicode, normalize_whitespace)
 
-    if student_text != solution_text:
-        state.report(
+    if not within_tolerance(solution_text, student_text, max_distance, min_ratio):
+        return state.report(
             "Expected text `{{sol}}` but found `{{stu}}`." if show_text else incorrect_msg,
             append=append, kwargs=kwargs
         )
@@ -135,6 +206,7 @@ def has_equal_text(
     return state
 
 
+@state_check
 def has_equal_attr(
     state,
     attrs: Union[List[str], Tuple[str]] = None,
@@ -242,7 +314,7 @@ def has_equal_attr(
         if stu_attr_val is None:
             # for not found attributes
             kwargs["attr"] = attr
-            state.report(missing_msg, append=append, kwargs=kwargs)
+            return state.report(missing_msg, append=append, kwargs=kwargs)
 
         elif check_values and stu_attr_val != sol_attr_val:
             # for incorrect attribute values
@@ -252,8 +324,491 @@ def has_equal_attr(
             kwargs["attr"] = attr
             kwargs["sol"] = " ".join(sol_attr_val) if sol_attr_is_list else sol_attr_val
             kwargs["stu"] = " ".join(stu_attr_val) if sol_attr_is_list else stu_attr_val
-            state.report(incorrect_msg, append=append, kwargs=kwargs)
+            return state.report(incorrect_msg, append=append, kwargs=kwargs)
+
+    return state
+
+
+@state_check
+def has_equal_attrs_deep(
+    state,
+    missing_msg: str = "Expected attribute `{{attr}}` not found.",
+    incorrect_msg: str = 'Expected attribute `{{attr}}` to be `"{{sol}}"`, but found `"{{stu}}"`.',
+    missing_tag_msg: str = "Did you include the {{index}}`{{tag}}` tag?",
+    check_values: bool = True,
+    expand_msg: str = "Check the {{index}}`{{tag}}` tag",
+    append: bool = True,
+    **kwargs
+):
+    """
+    Check whether every tag in the whole subtree of the student tag has the attributes of its solution tag, like
+    :func:`has_equal_attr` checks for a single tag. Tags are paired like :func:`check_tag` pairs them: the ``n``-th
+    ``li`` tag inside a tag with the ``n``-th ``li`` tag inside its pair. Tags of the solution without attributes
+    in their subtree are skipped, the student code can have more tags and more attributes than the solution.
+
+    The attributes of every tag of a document are normalized once per document, so the solution's are reused for
+    every submission of an :class:`htmlwhat.Exercise.Exercise`, and both subtrees are compared in one pass. The
+    feedback tells the path to the first tag that differs, in document order.
+
+    :param state: State instance describing student and solution code. Can be omitted if used with ``Ex()``.
+    :type state: object
+
+    :param missing_msg: Message to display if any attribute is missing in student code.
+    :type missing_msg: str, optional
+
+    :param incorrect_msg: Message to display if any attribute with the incorrect value is found.
+    :type incorrect_msg: str, optional
+
+    :param missing_tag_msg: Message to display if a tag of the solution with attributes in its subtree is missing in student code.
+    :type missing_tag_msg: str, optional
+
+    :param check_values: Whether to check the attribute values for equality. If ``False``, only the presence of attributes will be checked.
+    :type check_values: bool, optional
+
+    :param expand_msg: Message prepended for every tag on the path to the difference.
+    :type expand_msg: str, optional
+
+    :param append: Whether to append the message to the existing report. If ``False``, only the message of this function will display.
+    :type append: bool, optional
+
+    :param kwargs: Additional keyword arguments to pass into the jinja templates.
+
+    :return: The same State object with updatted messages. And hence recommended to use at the end of the chain.
+    :rtype: State
+
+    :raises TestFail: If a tag or an attribute is missing in the student code or an attribute has an incorrect value. (aka feedback)
+
+    :example:
+        >>> from htmlwhat.State import State
+        >>> from htmlwhat.checks import check_tag, has_equal_attrs_deep
+        >>> student_code = \"\"\"
+        ... <form action="/signup">
+        ...    <input type="text" name="user">
+        ...    <input type="text" name="password">
+        ... </form>
+        ... \"\"\"
+        >>> solution_code = \"\"\"
+        ... <form action="/signup">
+        ...    <input type="text" name="user">
+        ...    <input type="password" name="password">
+        ... </form>
+        ... \"\"\"
+        >>> state = State(student_code=student_code, solution_code=solution_code)
+        >>> has_equal_attrs_deep(check_tag(state, "form"))
+        Traceback (most recent call last): ...
+        protowhat.failure.TestFail: Check the 2nd `input` tag with in `form`. Expected attribute `type` to be `"password"`, but found `"text"`.
+    """
+    student_tables = AttributeTables.of(state.student_ast)
+    solution_tables = AttributeTables.of(state.solution_ast)
+
+    difference = first_attribute_difference(
+        state.student_ast, state.solution_ast, student_tables, solution_tables, check_values
+    )
+    if difference is None:
+        return state
+
+    def index_label(tag):
+        siblings = solution_tables.siblings(tag)
+        return (number_to_position(solution_tables.position[id(tag)] + 1) + " ") if len(siblings) > 1 else ""
+
+    path, student, solution, attr = difference
+    child = state
+    for stu_tag, sol_tag in path:
+        child = child.to_child(
+            append_message=FeedbackComponent(
+                expand_msg, kwargs={**kwargs, "tag": sol_tag.name, "index": index_label(sol_tag)}
+            ),
+            student_ast=stu_tag,
+            solution_ast=sol_tag,
+        )
+
+    if student is None:
+        kwargs["tag"], kwargs["index"] = solution.name, index_label(solution)
+        msg = missing_tag_msg
+    else:
+        kwargs["attr"] = attr
+        msg = missing_msg
+        if attr in student.attrs:
+            sol_value, stu_value = solution[attr], student[attr]
+            kwargs["sol"] = " ".join(sol_value) if isinstance(sol_value, list) else sol_value
+            kwargs["stu"] = " ".join(stu_value) if isinstance(stu_value, list) else stu_value
+            msg = incorrect_msg
+
+    child.report(msg, append=append, kwargs=kwargs)
+    return state.as_failed()
+
+
+@state_check(memoize=False)
+def has_equal_style(
+    state,
+    properties: Union[List[str], Tuple[str]] = None,
+    selector: str = None,
+    missing_rule_msg: str = "Did you define the style rule for `{{selector}}`?",
+    missing_msg: str = "Expected style property `{{prop}}` not found.",
+    incorrect_msg: str = "Expected style property `{{prop}}` to be `{{sol}}`, but found `{{stu}}`.",
+    append: bool = True,
+    **kwargs
+):
+    """
+    Check whether the student code have the same style declarations as the solution code.
+
+    Without ``selector``, the declarations of the ``style`` attribute of the current tag are compared. With ``selector``,
+    the declarations of the rule for that selector in the ``<style>`` tags of the document are compared.
+    Property names, whitespace and the case of keyword values are normalized, so ``color:RED`` equals ``color: red``.
+
+    The styles of a document are parsed once, the first time they are checked, and shared by all checks on that
+    document. When grading through an :class:`htmlwhat.Exercise.Exercise`, the styles of the solution are
+    only parsed for the first submission.
+
+    :param state: State instance describing student and solution code. Can be omitted if used with ``Ex()``.
+    :type state: object
+
+    :param properties: The list or tuple of properties of the solution to check. If ``None``, all properties in the solution code will be checked.
+    :type properties: List[str] | Tuple[str] | None, optional
+
+    :param selector: The selector of a rule in the ``<style>`` tags, e.g. ``"nav > a:hover"``. Rules inside ``@media`` or other
+                     grouping rules are prefixed with it, e.g. ``"@media (max-width: 600px) h1"``.
+    :type selector: str, optional
+
+    :param missing_rule_msg: Message to display if the student code has no rule for ``selector``.
+    :type missing_rule_msg: str, optional
+
+    :param missing_msg: Message to display if any property is missing in student code.
+    :type missing_msg: str, optional
+
+    :param incorrect_msg: Message to display if any property with the incorrect value is found.
+    :type incorrect_msg: str, optional
+
+    :param append: Whether to append the message to the existing report. If ``False``, only the message of this function will display.
+    :type append: bool, optional
+
+    :param kwargs: Additional keyword arguments to pass into ``missing_rule_msg``, ``missing_msg`` or ``incorrect_msg`` jinja template.
+
+    :return: The same State object with updatted messages. And hence recommended to use at the end of the chain.
+    :rtype: State
+
+    :raises InstructorError: If the rule for ``selector`` or a property specified in ``properties`` is missing in the solution code.
+    :raises TestFail: If the rule or a property is missing in the student code or a property has an incorrect value. (aka feedback)
+
+    :example:
+        >>> from htmlwhat.State import State
+        >>> from htmlwhat.checks import check_body, check_tag, has_equal_style
+        >>> student_code = \"\"\"
+        ... <html>
+        ...    <head><style> h1 { color: red; } </style></head>
+        ...    <body><p style="margin:0 auto;COLOR:Blue">Hello</p></body>
+        ... </html>
+        ... \"\"\"
+        >>> solution_code = \"\"\"
+        ... <html>
+        ...    <head><style> h1 { color: green; } </style></head>
+        ...    <body><p style="color: blue; margin: 0 auto">Hello</p></body>
+        ... </html>
+        ... \"\"\"
+        >>> state = State(student_code=student_code, solution_code=solution_code)
+        >>> p_state = has_equal_style(check_tag(check_body(state), "p"))
+        >>> has_equal_style(state, selector="h1")
+        Traceback (most recent call last): ...
+        protowhat.failure.TestFail: Expected style property `color` to be `green`, but found `red`.
+    """
+    if properties is not None and not isinstance(properties, (list, tuple)):
+        raise TypeError("properties should be a list, tuple or None.")
+
+    student_styles = StyleIndex.of(state.student_ast)
+    solution_styles = StyleIndex.of(state.solution_ast)
+
+    if selector is None:
+        stu_decls = student_styles.element(state.student_ast)
+        sol_decls = solution_styles.element(state.solution_ast)
+        where = f"the `style` attribute of `<{state.solution_ast.name}>`"
+    else:
+        kwargs["selector"] = selector
+        sol_decls = solution_styles.rule(selector)
+        if sol_decls is None:
+            raise InstructorError.from_message(
+                f"`has_equal_style()` couldn't find a style rule for `{selector}` in the solution."
+            )
+        stu_decls = student_styles.rule(selector)
+        if stu_decls is None:
+            return state.report(missing_rule_msg, append=append, kwargs=kwargs)
+        where = f"the style rule for `{selector}`"
+
+    if properties is None:
+        properties = sol_decls.keys()
+    else:
+        properties = [prop.lower() for prop in properties]
+        for prop in properties:
+            if prop not in sol_decls:
+                raise InstructorError.from_message(
+                    f"`has_equal_style()` couldn't find property `{prop}` in {where}."
+                )
+
+    for prop in properties:
+        stu_value = stu_decls.get(prop)
+        sol_value = sol_decls[prop]
+        kwargs["prop"] = prop
+
+        if stu_value is None:
+            return state.report(missing_msg, append=append, kwargs=kwargs)
+
+        elif stu_value != sol_value:
+            kwargs["sol"] = sol_value
+            kwargs["stu"] = stu_value
+            return state.report(incorrect_msg, append=append, kwargs=kwargs)
+
+    return state
+
+
+@state_check
+def has_equal_structure(
+    state,
+    check_attrs: bool = True,
+    missing_msg: str = "Did you include the `<{{sol}}>` tag?",
+    unexpected_msg: str = "Didn't expect the `<{{stu}}>` tag.",
+    incorrect_msg: str = "Expected a `<{{sol}}>` tag, but found `<{{stu}}>`.",
+    attrs_msg: str = "Expected the attributes of `<{{sol}}>` to be `{{sol_attrs}}`, but found `{{stu_attrs}}`.",
+    expand_msg: str = "Check the {{index}}`{{tag}}` tag",
+    append: bool = True,
+    **kwargs
+):
+    """
+    Check whether the whole subtree of the student tag has the same structure as the solution: the same tags, in the
+    same order, with the same attributes. The text is not compared, use :func:`has_equal_text` for that.
+
+    Every subtree of a document gets a BLAKE2 digest of its tag name, its attributes and the digests of its child
+    tags, built once per document. Equal subtrees are then recognized at once, and the first difference is found by
+    only descending into the child tags whose digests don't match. The feedback tells the path to that difference,
+    like :func:`check_tag` does.
+
+    :param state: State instance describing student and solution code. Can be omitted if used with ``Ex()``.
+    :type state: object
+
+    :param check_attrs: Whether to compare attributes as well. Attributes like ``class`` holding a list of values compare as sets.
+    :type check_attrs: bool, optional
+
+    :param missing_msg: Message to display if a tag of the solution is missing in student code.
+    :type missing_msg: str, optional
+
+    :param unexpected_msg: Message to display if the student code has a tag more than the solution.
+    :type unexpected_msg: str, optional
+
+    :param incorrect_msg: Message to display if the student code has another tag than the solution.
+    :type incorrect_msg: str, optional
+
+    :param attrs_msg: Message to display if a tag of the student code has other attributes than in the solution.
+    :type attrs_msg: str, optional
+
+    :param expand_msg: Message prepended for every tag on the path to the difference.
+    :type expand_msg: str, optional
+
+    :param append: Whether to append the message to the existing report. If ``False``, only the message of this function will display.
+    :type append: bool, optional
+
+    :param kwargs: Additional keyword arguments to pass into the jinja templates.
+
+    :return: The same State object with updatted messages. And hence recommended to use at the end of the chain.
+    :rtype: State
+
+    :raises TestFail: If the structure of the student code differs from the solution. (aka feedback)
+
+    :example:
+        >>> from htmlwhat.State import State
+        >>> from htmlwhat.checks import check_body, has_equal_structure
+        >>> student_code = \"\"\"
+        ... <body>
+        ...    <ul><li>One</li><li><a href="#">Two</a></li></ul>
+        ... </body>
+        ... \"\"\"
+        >>> solution_code = \"\"\"
+        ... <body>
+        ...    <ul><li>One</li><li><a href="#two">Two</a></li></ul>
+        ... </body>
+        ... \"\"\"
+        >>> state = State(student_code=student_code, solution_code=solution_code)
+        >>> has_equal_structure(check_body(state))
+        Traceback (most recent call last): ...
+        protowhat.failure.TestFail: Check the `a` tag with in `body > ul > 2nd li`. Expected the attributes of `<a>` to be `href="#two"`, but found `href="#"`.
+    """
+    student_hashes = StructureHashes.of(state.student_ast, check_attrs)
+    solution_hashes = StructureHashes.of(state.solution_ast, check_attrs)
+
+    difference = first_difference(state.student_ast, state.solution_ast, student_hashes, solution_hashes)
+    if difference is None:
+        return state
+
+    path, student, solution = difference
+    child = state
+    for stu_tag, sol_tag in path:
+        siblings = [tag for tag in child_tags(sol_tag.parent) if tag.name == sol_tag.name]
+        child_kwargs = {
+            **kwargs,
+            "tag": sol_tag.name,
+            "index": (number_to_position(siblings.index(sol_tag) + 1) + " ") if len(siblings) > 1 else "",
+        }
+        child = child.to_child(
+            append_message=FeedbackComponent(expand_msg, kwargs=child_kwargs),
+            student_ast=stu_tag,
+            solution_ast=sol_tag,
+        )
+
+    if solution is None:
+        kwargs["stu"] = student.name
+        msg = unexpected_msg
+    elif student is None:
+        kwargs["sol"] = solution.name
+        msg = missing_msg
+    else:
+        kwargs["stu"], kwargs["sol"] = student.name, solution.name
+        kwargs["stu_attrs"], kwargs["sol_attrs"] = (
+            " ".join(f'{name}="{value}"' for name, value in normalize_attrs(tag)) for tag in (student, solution)
+        )
+        msg = incorrect_msg if student.name != solution.name else attrs_msg
+
+    child.report(msg, append=append, kwargs=kwargs)
+    return state.as_failed()
+
+
+def count_tags(node, name: str, attr: str = None, within: str = None) -> int:
+    """Number of ``name`` tags below ``node``, with the attribute ``attr`` and inside a ``within`` tag if given."""
+    check_str(name, "arg: name")
+    spec = (name.lower(), attr and attr.lower(), within and within.lower())
+    if isinstance(node, StreamSummary):
+        return node.counts[spec]
+
+    name, attr, within = spec
+    if within is None:
+        return sum(1 for tag in node.find_all(name) if attr is None or tag.has_attr(attr))
+
+    # whether every tag is inside a ``within`` tag, from the answer for its parent: looking up the parents of every
+    # tag took quadratic time in deeply nested code
+    inside = {id(node): node.find_parent(within) is not None}
+    count = 0
+    for tag in node.find_all(True):
+        parent = tag.parent
+        inside[id(tag)] = is_inside = parent.name == within or inside[id(parent)]
+        if tag.name == name and is_inside and (attr is None or tag.has_attr(attr)):
+            count += 1
+    return count
+
+
+@state_check
+def has_tag(
+    state,
+    name: str,
+    attr: str = None,
+    within: str = None,
+    missing_msg: str = "Did you include a `<{{tag}}>` tag{% if attr %} with the `{{attr}}` attribute{% endif %}"
+                       "{% if within %} inside a `<{{within}}>` tag{% endif %}?",
+    append: bool = True,
+    **kwargs
+):
+    """
+    Check whether the student code contains a tag, anywhere below the current tag. Unlike :func:`check_tag`,
+    this function is solution independent and doesn't only look at the direct children.
+
+    When an SCT only uses :func:`has_tag` and :func:`has_tag_count` on ``Ex()``, the student code is not parsed
+    into a tree at all: the tags are counted while streaming through the code, which is much faster for large
+    submissions. The outcome is the same.
+
+    :param state: State instance describing student and solution code. Can be omitted if used with ``Ex()``.
+    :type state: object
+
+    :param name: The name of the tag, e.g. ``"img"``.
+    :type name: str
+
+    :param attr: If given, only count the tags that have this attribute, whatever its value.
+    :type attr: str, optional
+
+    :param within: If given, only count the tags inside a tag of this name, e.g. ``"body"``.
+    :type within: str, optional
+
+    :param missing_msg: Message to display if the tag is not found in student code.
+    :type missing_msg: str, optional
+
+    :param append: Whether to append the message to the existing report. If ``False``, only the message of this function will display.
+    :type append: bool, optional
+
+    :param kwargs: Additional keyword arguments to pass into ``missing_msg`` jinja template.
+
+    :return: The same State object with updatted messages. And hence recommended to use at the end of the chain.
+    :rtype: State
+
+    :raises TestFail: If the tag is not found in student code. (aka feedback)
+
+    :example:
+        >>> from htmlwhat import test_exercise
+        >>> test_exercise('Ex().has_tag("img", attr="alt")', '<body><img src="cat.png"></body>', '')
+        {'correct': False, 'message': 'Did you include a <code>&lt;img&gt;</code> tag with the <code>alt</code> attribute?'}
+    """
+    kwargs.update({"tag": name, "attr": attr, "within": within})
+
+    if not count_tags(state.student_ast, name, attr, within):
+        return state.report(missing_msg, append=append, kwargs=kwargs)
+    return state
+
+
+@state_check
+def has_tag_count(
+    state,
+    name: str,
+    min_count: int = 1,
+    max_count: int = None,
+    attr: str = None,
+    within: str = None,
+    incorrect_msg: str = "Expected {% if max_count is none %}at least {{min_count}}{% elif min_count == max_count %}"
+                         "{{min_count}}{% else %}between {{min_count}} and {{max_count}}{% endif %} `<{{tag}}>` tags"
+                         "{% if attr %} with the `{{attr}}` attribute{% endif %}{% if within %} inside a `<{{within}}>` tag"
+                         "{% endif %}, but found {{count}}.",
+    append: bool = True,
+    **kwargs
+):
+    """
+    Check how many times a tag occurs in the student code, anywhere below the current tag.
+    This function is solution independent, like :func:`has_tag`, and is streamed the same way.
+
+    :param state: State instance describing student and solution code. Can be omitted if used with ``Ex()``.
+    :type state: object
+
+    :param name: The name of the tag, e.g. ``"li"``.
+    :type name: str
+
+    :param min_count: The minimum number of tags.
+    :type min_count: int, optional
+
+    :param max_count: The maximum number of tags, if any.
+    :type max_count: int, optional
+
+    :param attr: If given, only count the tags that have this attribute, whatever its value.
+    :type attr: str, optional
+
+    :param within: If given, only count the tags inside a tag of this name, e.g. ``"body"``.
+    :type within: str, optional
+
+    :param incorrect_msg: Message to display if the student code has too few or too many tags.
+    :type incorrect_msg: str, optional
+
+    :param append: Whether to append the message to the existing report. If ``False``, only the message of this function will display.
+    :type append: bool, optional
+
+    :param kwargs: Additional keyword arguments to pass into ``incorrect_msg`` jinja template.
+
+    :return: The same State object with updatted messages. And hence recommended to use at the end of the chain.
+    :rtype: State
+
+    :raises TestFail: If the number of tags is not within ``min_count`` and ``max_count``. (aka feedback)
+
+    :example:
+        >>> from htmlwhat import test_exercise
+        >>> test_exercise('Ex().has_tag_count("li", 3, within="body")', '<body><ul><li>a</li><li>b</li></ul></body>', '')
+        {'correct': False, 'message': 'Expected at least 3 <code>&lt;li&gt;</code> tags inside a <code>&lt;body&gt;</code> tag, but found 2.'}
+    """
+    count = count_tags(state.student_ast, name, attr, within)
+    kwargs.update({
+        "tag": name, "attr": attr, "within": within, "min_count": min_count, "max_count": max_count, "count": count
+    })
 
+    if count < min_count or (max_count is not None and count > max_count):
+        return state.report(incorrect_msg, append=append, kwargs=kwargs)
     return state
 
-# TODO: create has_equal_js, has_equal_style, remaining 
+# TODO: create has_equal_js, remaining 
@@ -0,0 +1,216 @@
+from functools import lru_cache
+from typing import Dict, List, Optional, Tuple
+import re
+import soupsieve
+from htmlwhat.utils import document_of
+from htmlwhat import metrics
+
+
+COMBINATORS = ">+~"
+
+
+@lru_cache(maxsize=1024)
+def compile_selector(pattern: str) -> soupsieve.SoupSieve:
+    """Compile a CSS selector once, the compiled form is shared by every submission."""
+    return soupsieve.compile(pattern)
+
+
+@lru_cache(maxsize=1024)
+def split_selector(pattern: str) -> Tuple[Tuple[str, str], ...]:
+    """
+    Split a CSS selector into its compound selectors, each with the combinator that precedes it.
+
+    >>> split_selector("div.card > ul li:not(.done)")
+    (('', 'div.card'), ('>', 'ul'), (' ', 'li:not(.done)'))
+
+    Selector lists (``a, b``) are not split.
+    """
+    parts: List[Tuple[str, str]] = []
+    combinator, current = "", []
+    depth, quote = 0, None
+
+    def flush():
+        nonlocal combinator, current
+        if current:
+            parts.append((combinator, "".join(current)))
+            combinator, current = " ", []
+
+    for char in pattern.strip():
+        if quote:
+            current.append(char)
+            if char == quote:
+                quote = None
+        elif char in "\"'":
+            quote = char
+            current.append(char)
+        elif char in "([":
+            depth += 1
+            current.append(char)
+        elif char in ")]":
+            depth -= 1
+            current.append(char)
+        elif depth:
+            current.append(char)
+        elif char == ",":
+            return (("", pattern.strip()),)
+        elif char in COMBINATORS:
+            flush()
+            combinator = char
+        elif char.isspace():
+            flush()
+        else:
+            current.append(char)
+    flush()
+
+    return tuple(parts)
+
+
+def join_selector(parts) -> str:
+    return "".join(
+        (part if not index else (" " + part if combinator == " " else f" {combinator} {part}"))
+        for index, (combinator, part) in enumerate(parts)
+    )
+
+
+def unmatched_part(node, pattern: str) -> Tuple[str, str]:
+    """
+    Find where ``pattern`` stops matching below ``node``.
+
+    :return: The longest prefix of the selector that still matches and the compound selector that does not.
+    """
+    parts = split_selector(pattern)
+    for end in range(1, len(parts) + 1):
+        if compile_selector(join_selector(parts[:end])).select_one(node) is None:
+            return join_selector(parts[:end - 1]), parts[end - 1][1]
+    return pattern, ""
+
+
+STRUCTURE_RE = re.compile(r'"(?:\\.|[^"\\])*"|\'(?:\\.|[^\'\\])*\'|[{};]')
+DECLARATION_RE = re.compile(
+    r'([-\w]+)\s*:\s*((?:"(?:\\.|[^"\\])*"|\'(?:\\.|[^\'\\])*\'|\([^)]*\)|[^;"\'(])*)'
+)
+COMMENT_RE = re.compile(r"/\*.*?\*/", re.DOTALL)
+GROUPING_RULES = ("@media", "@supports", "@container", "@layer", "@document")
+
+
+def normalize_value(value: str) -> str:
+    """Normalize a property value, so ``#FFF`` equals ``#fff`` and ``1px  solid`` equals ``1px solid``."""
+    value = " ".join(value.split())
+    value = re.sub(r"\s*,\s*", ",", value)
+    value = re.sub(r"\s*!\s*important$", " !important", value, flags=re.IGNORECASE)
+    if "'" not in value and '"' not in value and "url(" not in value.lower():
+        value = value.lower()
+    return value
+
+
+def normalize_selector(selector: str) -> List[str]:
+    """Normalize a selector list into its selectors, e.g. ``"h1,h2  >p"`` gives ``["h1", "h2 > p"]``."""
+    selectors = []
+    for part in split_selector_list(selector):
+        selectors.append(join_selector(split_selector(part)))
+    return [selector for selector in selectors if selector]
+
+
+def split_selector_list(selector: str) -> List[str]:
+    parts, depth, start, quote = [], 0, 0, None
+    for index, char in enumerate(selector):
+        if quote:
+            quote = None if char == quote else quote
+        elif char in "\"'":
+            quote = char
+        elif char in "([":
+            depth += 1
+        elif char in ")]":
+            depth -= 1
+        elif char == "," and not depth:
+            parts.append(selector[start:index])
+            start = index + 1
+    parts.append(selector[start:])
+    return [part.strip() for part in parts if part.strip()]
+
+
+def parse_declarations(text: str) -> Dict[str, str]:
+    """Parse the declarations of a rule or of a ``style`` attribute, later declarations win."""
+    return {
+        prop.lower(): normalize_value(value)
+        for prop, value in DECLARATION_RE.findall(COMMENT_RE.sub("", text))
+        if value.strip()
+    }
+
+
+def parse_stylesheet(text: str) -> Dict[str, Dict[str, str]]:
+    """
+    Parse the content of a ``<style>`` tag into its declarations, keyed by normalized selector.
+
+    Rules nested in grouping at-rules are keyed with the at-rule, e.g. ``"@media (max-width: 600px) h1"``.
+    """
+    rules: Dict[str, Dict[str, str]] = {}
+    text = COMMENT_RE.sub("", text)
+    groups: List[str] = []
+    selectors = None
+    start = 0
+
+    for match in STRUCTURE_RE.finditer(text):
+        token = match.group()
+        if token not in "{};":
+            continue
+        chunk = text[start:match.start()].strip()
+        start = match.end()
+
+        if token == "{":
+            if selectors is not None:
+                # nested rule, skip it as a whole
+                groups.append(None)
+            elif chunk.lower().startswith(GROUPING_RULES):
+                groups.append(" ".join(chunk.split()))
+            elif chunk.startswith("@"):
+                groups.append(None)
+            else:
+                prefix = " ".join(group for group in groups if group)
+                selectors = [f"{prefix} {selector}" if prefix else selector for selector in normalize_selector(chunk)]
+                declarations_start = start
+        elif token == "}":
+            if selectors is not None:
+                declarations = parse_declarations(text[declarations_start:match.start()])
+                for selector in selectors:
+                    rules.setdefault(selector, {}).update(declarations)
+                selectors = None
+            elif groups:
+                groups.pop()
+    return rules
+
+
+class StyleIndex:
+    """
+    The styles of a document, parsed once: the declarations of the ``<style>`` tags keyed by selector in ``rules``,
+    and the declarations of the ``style`` attributes keyed by element in ``inline``.
+    """
+
+    def __init__(self, document):
+        self.rules: Dict[str, Dict[str, str]] = {}
+        self.inline: Dict[int, Dict[str, str]] = {}
+
+        for tag in document.find_all(lambda tag: tag.name == "style" or tag.has_attr("style")):
+            if tag.name == "style":
+                for selector, declarations in parse_stylesheet(tag.get_text()).items():
+                    self.rules.setdefault(selector, {}).update(declarations)
+            if tag.has_attr("style"):
+                self.inline[id(tag)] = parse_declarations(tag["style"])
+
+    @classmethod
+    def of(cls, node) -> "StyleIndex":
+        """The index of the document ``node`` belongs to, built on first use."""
+        document = document_of(node)
+        registry = metrics.active()
+        if registry is not None:
+            registry.cache_lookup("style_index", "style" in document.caches)
+        if "style" not in document.caches:
+            document.caches["style"] = cls(document)
+        return document.caches["style"]
+
+    def rule(self, selector: str) -> Optional[Dict[str, str]]:
+        selectors = normalize_selector(selector)
+        return self.rules.get(selectors[0]) if len(selectors) == 1 else None
+
+    def element(self, tag) -> Dict[str, str]:
+        return self.inline.get(id(tag), {})
@@ -0,0 +1,184 @@
+"""
+Tolerant text comparison for ``has_equal_text(max_distance=..., min_ratio=...)``.
+
+Texts are compared by their Levenshtein distance, the number of inserted, deleted or substituted characters, with
+a threshold ``k``: the comparison only needs to know whether the distance is within it, so it stops as soon as it
+can't be.
+
+- Texts whose lengths differ by more than ``k`` are rejected at once, and their common prefix and suffix are
+  skipped, so a typo in a long paragraph only costs the part around it.
+- First, the diagonal band of width ``2k + 1`` of the distance matrix is explored the way of Landau and Vishkin:
+  for every number of edits, every diagonal is extended along the longest run of equal characters, which strings
+  compare in C. Finding a distance ``d`` takes ``O(d²)`` steps, independent of the length of the texts.
+- When that gets more expensive than a full pass, e.g. for a large threshold from a similarity ratio on a long
+  paragraph, the bit-parallel algorithm of Myers (as formulated by Hyyrö) handles a whole column of the matrix
+  with a few operations on integers of one bit per character.
+
+A full pass still takes time proportional to the product of the lengths of the texts, several seconds for long
+unrelated paragraphs. :func:`within_tolerance` caps the work at :data:`MAX_WORK`: when a full pass would exceed it,
+only the diagonals are explored, up to ``isqrt(MAX_WORK)`` edits, and texts further apart are rejected.
+"""
+
+import re
+import unicodedata
+from math import isqrt
+from typing import Optional
+
+WHITESPACE = re.compile(r"\s+")
+# steps of the diagonal algorithm within_tolerance may take, about a fifth of a second
+MAX_WORK = 100_000
+
+
+def normalize_text(text: str, unicode: bool = False, whitespace: bool = False) -> str:
+    """
+    Normalize ``text`` for comparison.
+
+    :param unicode: Apply the NFKC normal form, so composed and decomposed accents, ligatures or full-width
+        characters compare equal.
+    :param whitespace: Collapse every run of whitespace into a single space.
+    """
+    if unicode:
+        text = unicodedata.normalize("NFKC", text)
+    if whitespace:
+        text = WHITESPACE.sub(" ", text).strip()
+    return text
+
+
+def match_length(a: str, i: int, b: str, j: int) -> int:
+    """Length of the longest common prefix of ``a[i:]`` and ``b[j:]``, in time proportional to it."""
+    limit = min(len(a) - i, len(b) - j)
+    # double the compared length until the texts differ, then halve it back to the first difference
+    size = 1
+    while size <= limit and b.startswith(a[i:i + size], j):
+        size *= 2
+    low, high = size // 2, min(size, limit + 1) - 1
+    while low < high:
+        middle = (low + high + 1) // 2
+        if b.startswith(a[i + low:i + middle], j + low):
+            low = middle
+        else:
+            high = middle - 1
+    return low
+
+
+def common_suffix_length(a: str, b: str, limit: int) -> int:
+    low, high = 0, limit
+    while low < high:
+        middle = (low + high + 1) // 2
+        if a.endswith(b[len(b) - middle:len(b) - low], 0, len(a) - low):
+            low = middle
+        else:
+            high = middle - 1
+    return low
+
+
+def diagonal_distance(a: str, b: str, max_distance: int) -> Optional[int]:
+    """Landau-Vishkin: the furthest row of ``a`` reached on every diagonal of the matrix with ``edits`` edits."""
+    m, n = len(a), len(b)
+    target = n - m
+    # diagonal d holds the cells (i, i + d), the ones not reached yet are below every row
+    unreached = -max_distance - 2
+    rows = {0: match_length(a, 0, b, 0)}
+    if target == 0 and rows[0] >= m:
+        return 0
+    for edits in range(1, max_distance + 1):
+        previous, rows = rows, {}
+        for d in range(max(-edits, -m), min(edits, n) + 1):
+            row = max(
+                previous.get(d, unreached) + 1,  # substitution
+                previous.get(d - 1, unreached),  # insertion of b[i + d - 1]
+                previous.get(d + 1, unreached) + 1,  # deletion of a[i]
+            )
+            row = min(row, m, n - d)
+            if row < max(0, -d):
+                continue
+            row += match_length(a, row, b, row + d)
+            rows[d] = row
+            if d == target and row >= m:
+                return edits
+    return None
+
+
+def bit_parallel_distance(a: str, b: str, max_distance: int) -> Optional[int]:
+    """Myers' algorithm, with ``a`` the shorter text as the pattern of the bit vectors."""
+    m, n = len(a), len(b)
+    mask = (1 << m) - 1
+    last = 1 << (m - 1)
+    peq = {}
+    for i, char in enumerate(a):
+        peq[char] = peq.get(char, 0) | (1 << i)
+
+    vp, vn, score = mask, 0, m
+    for j, char in enumerate(b):
+        eq = peq.get(char, 0)
+        xv = eq | vn
+        xh = ((((eq & vp) + vp) & mask) ^ vp) | eq
+        hp = (vn | ~(xh | vp)) & mask
+        hn = vp & xh
+        if hp & last:
+            score += 1
+        elif hn & last:
+            score -= 1
+        # every remaining column lowers the distance by one at most
+        if score - (n - j - 1) > max_distance:
+            return None
+        hp = ((hp << 1) | 1) & mask
+        hn = (hn << 1) & mask
+        vp = (hn | ~(xv | hp)) & mask
+        vn = hp & xv
+    return score if score <= max_distance else None
+
+
+def bounded_distance(a: str, b: str, max_distance: int, max_work: int = None) -> Optional[int]:
+    """
+    Levenshtein distance between ``a`` and ``b`` if it is at most ``max_distance``, else ``None``.
+
+    With ``max_work``, texts that would take more than that many steps of the diagonal algorithm to compare column by
+    column are only compared along the diagonals, up to ``isqrt(max_work)`` edits: ``None`` then means the distance
+    is more than that.
+
+    :example:
+        >>> bounded_distance("Hello world", "Helo wrld!", 3)
+        3
+        >>> bounded_distance("Hello world", "Goodbye", 3) is None
+        True
+    """
+    if abs(len(a) - len(b)) > max_distance:
+        return None
+    prefix = match_length(a, 0, b, 0)
+    suffix = common_suffix_length(a, b, min(len(a), len(b)) - prefix)
+    a, b = a[prefix:len(a) - suffix], b[prefix:len(b) - suffix]
+    if len(a) > len(b):
+        a, b = b, a
+    if not a:
+        return len(b)
+    # the diagonal algorithm takes about (d + 1)² steps to find a distance d, the bit-parallel one a step per
+    # character of b, which gets slower every 512 characters of a, and a diagonal step costs about 4 of those: near
+    # texts are found by the diagonals, the search only goes on bit-parallel when the distance is still larger
+    work = len(b) * (1 + len(a) // 512) // 4
+    if max_work is not None and work > max_work:
+        return diagonal_distance(a, b, min(max_distance, isqrt(max_work)))
+    diagonal_edits = min(max_distance, isqrt(work))
+    distance = diagonal_distance(a, b, diagonal_edits)
+    if distance is None and diagonal_edits < max_distance:
+        return bit_parallel_distance(a, b, max_distance)
+    return distance
+
+
+def within_tolerance(a: str, b: str, max_distance: int = 0, min_ratio: float = None) -> bool:
+    """
+    Whether ``b`` is at most ``max_distance`` edits away from ``a`` and, if ``min_ratio`` is given, at least that
+    similar to it. The similarity ratio is ``1 - distance / length`` of the longer text, ``1.0`` for equal texts.
+
+    The comparison takes at most about :data:`MAX_WORK` steps: long texts that differ in many places are rejected if
+    they are more than ``isqrt(MAX_WORK)`` edits apart, whatever the tolerance.
+    """
+    if a == b:
+        return True
+    threshold = max_distance
+    if min_ratio is not None:
+        by_ratio = int((1 - min_ratio) * max(len(a), len(b)) + 1e-9)
+        threshold = by_ratio if not max_distance else min(max_distance, by_ratio)
+    if abs(len(a) - len(b)) > threshold:
+        return False
+    return threshold > 0 and bounded_distance(a, b, threshold, MAX_WORK) is not None
@@ -0,0 +1,229 @@
+"""
+Replay grading calls recorded with :mod:`htmlwhat.recording`, to load-test a version of htmlwhat with real traffic.
+
+The calls are sent to one of the engines at a set concurrency, and at a set rate if given, then the report tells
+the throughput, the percentiles of the latencies and how many outcomes changed since they were recorded:
+
+- ``test_exercise``: every call runs :func:`htmlwhat.test_exercise`, parsing the solution and compiling the SCT.
+- ``exercise``: the calls of an exercise are graded by the same :class:`htmlwhat.Exercise.Exercise`, like the
+  grading service and the batch analytics do.
+- ``scheduler``: the calls are graded on worker processes by :class:`htmlwhat.scheduler.AffinityScheduler`.
+
+.. code-block:: bash
+
+    python -m htmlwhat.loadtest traffic.jsonl --engine exercise --concurrency 8 --rate 200
+
+With a rate, the calls are sent on a fixed schedule whatever the latencies, and every latency is counted from the
+time its call was due, so calls that wait for a free slot count as slow instead of slowing the test down.
+"""
+
+import argparse
+import json
+import math
+import threading
+import time
+from concurrent.futures import Future, ThreadPoolExecutor
+from typing import Dict, List, Optional, Tuple
+
+from htmlwhat.Exercise import Exercise
+from htmlwhat.scheduler import AffinityScheduler
+from htmlwhat.test_exercise import test_exercise
+
+ENGINES = ("test_exercise", "exercise", "scheduler")
+PERCENTILES = (50, 90, 95, 99)
+
+
+def load_recording(path) -> Tuple[Dict[str, Tuple[str, str]], List[dict]]:
+    """The SCT and solution code of every recorded exercise by id, and the recorded calls in order."""
+    exercises, calls = {}, []
+    with open(path, encoding="utf-8") as f:
+        for number, line in enumerate(f, 1):
+            if not line.strip():
+                continue
+            try:
+                entry = json.loads(line)
+            except ValueError as e:
+                raise ValueError(f"Line {number} of the recording isn't JSON: {e}")
+            if entry.get("type") == "exercise":
+                exercises[entry["id"]] = (entry["sct"], entry["solution"])
+            elif entry.get("type") == "call":
+                calls.append(entry)
+    missing = {call["exercise"] for call in calls} - set(exercises)
+    if missing:
+        raise ValueError(f"The recording has calls of {len(missing)} exercises it doesn't hold.")
+    return exercises, calls
+
+
+def percentile(ordered: List[float], q: float) -> Optional[float]:
+    """Nearest-rank percentile of the sorted values ``ordered``."""
+    if not ordered:
+        return None
+    return ordered[max(0, math.ceil(q / 100 * len(ordered)) - 1)]
+
+
+class ReplayReport:
+    """Outcome of :func:`replay`."""
+
+    def __init__(self, engine: str, concurrency: int, rate: Optional[float]):
+        self.engine = engine
+        self.concurrency = concurrency
+        self.rate = rate
+        self.latencies: List[float] = []
+        self.recorded: List[float] = []
+        self.errors = 0
+        # outcomes that differ from the recorded ones, redacted calls aren't compared
+        self.changed = 0
+        self.compared = 0
+        self.seconds = 0.0
+
+    @property
+    def calls(self) -> int:
+        return len(self.latencies)
+
+    @property
+    def throughput(self) -> float:
+        """Calls per second."""
+        return self.calls / self.seconds if self.seconds else 0.0
+
+    def to_dict(self) -> dict:
+        latencies, recorded = sorted(self.latencies), sorted(self.recorded)
+        return {
+            "engine": self.engine,
+            "concurrency": self.concurrency,
+            "rate": self.rate,
+            "calls": self.calls,
+            "errors": self.errors,
+            "changed": self.changed,
+            "compared": self.compared,
+            "seconds": round(self.seconds, 4),
+            "throughput": round(self.throughput, 2),
+            "latency": {
+                **{f"p{q}": percentile(latencies, q) for q in PERCENTILES},
+                "max": latencies[-1] if latencies else None,
+            },
+            "recorded_latency": {f"p{q}": percentile(recorded, q) for q in PERCENTILES},
+        }
+
+
+def replay(
+    path,
+    engine: str = "exercise",
+    concurrency: int = 1,
+    rate: float = None,
+    workers: int = None,
+    limit: int = None,
+) -> ReplayReport:
+    """
+    Replay the calls recorded at ``path``, see :mod:`htmlwhat.loadtest`.
+
+    :param engine: ``"test_exercise"``, ``"exercise"`` or ``"scheduler"``.
+    :type engine: str, optional
+
+    :param concurrency: Maximum number of calls in flight.
+    :type concurrency: int, optional
+
+    :param rate: Calls sent per second, as fast as the concurrency allows if ``None``.
+    :type rate: float, optional
+
+    :param workers: Worker processes of the ``scheduler`` engine, defaults to ``concurrency``.
+    :type workers: int, optional
+
+    :param limit: Replay only the first ``limit`` calls.
+    :type limit: int, optional
+
+    :rtype: ReplayReport
+    """
+    if engine not in ENGINES:
+        raise ValueError(f"Expected one of the engines {', '.join(ENGINES)}, got `{engine}`.")
+    if concurrency < 1 or (rate is not None and rate <= 0):
+        raise ValueError("Expected a concurrency of at least 1 and a positive rate.")
+
+    exercises, calls = load_recording(path)
+    calls = calls[:limit] if limit is not None else calls
+    report = ReplayReport(engine, concurrency, rate)
+    lock = threading.Lock()
+    slots = threading.BoundedSemaphore(concurrency)
+    finished = threading.Event()
+    pending = [len(calls)]
+
+    prepared = {}
+    prepare_lock = threading.Lock()
+
+    def exercise_of(key: str) -> Exercise:
+        with prepare_lock:
+            if key not in prepared:
+                prepared[key] = Exercise(*exercises[key])
+            return prepared[key]
+
+    def done(call: dict, sent: float, future: Future):
+        latency = time.perf_counter() - sent
+        slots.release()
+        error = future.exception()
+        with lock:
+            report.latencies.append(latency)
+            report.recorded.append(call.get("seconds", 0.0))
+            if error is not None:
+                report.errors += 1
+            elif not call.get("redacted") and call.get("error") is None:
+                report.compared += 1
+                payload = future.result()
+                if (payload.get("correct"), payload.get("message")) != (call.get("correct"), call.get("message")):
+                    report.changed += 1
+            pending[0] -= 1
+            if not pending[0]:
+                finished.set()
+
+    scheduler = AffinityScheduler(workers or concurrency) if engine == "scheduler" else None
+    executor = None if scheduler else ThreadPoolExecutor(concurrency, thread_name_prefix="htmlwhat-replay")
+    try:
+        if engine == "exercise":
+            # preparing exercises isn't part of the load
+            for key in {call["exercise"] for call in calls}:
+                exercise_of(key)
+
+        start = time.perf_counter()
+        for index, call in enumerate(calls):
+            sct, solution_code = exercises[call["exercise"]]
+            collect_all = bool(call.get("collect_all"))
+            due = None
+            if rate is not None:
+                due = start + index / rate
+                time.sleep(max(0.0, due - time.perf_counter()))
+            slots.acquire()
+            sent = due if due is not None else time.perf_counter()
+
+            if scheduler is not None:
+                future = scheduler.submit(sct, solution_code, call["code"], call["exercise"], collect_all)
+            elif engine == "exercise":
+                future = executor.submit(exercise_of(call["exercise"]).grade, call["code"], collect_all)
+            else:
+                future = executor.submit(test_exercise, sct, call["code"], solution_code, collect_all)
+            future.add_done_callback(lambda future, call=call, sent=sent: done(call, sent, future))
+
+        if calls:
+            finished.wait()
+        report.seconds = time.perf_counter() - start
+    finally:
+        if scheduler is not None:
+            scheduler.shutdown()
+        if executor is not None:
+            executor.shutdown()
+    return report
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(prog="python -m htmlwhat.loadtest", description="Replay recorded grading calls.")
+    parser.add_argument("recording", help="file recorded with htmlwhat.recording or the --record of the server")
+    parser.add_argument("--engine", choices=ENGINES, default="exercise")
+    parser.add_argument("--concurrency", type=int, default=1, help="maximum number of calls in flight")
+    parser.add_argument("--rate", type=float, help="calls sent per second, as fast as possible by default")
+    parser.add_argument("--workers", type=int, help="worker processes of the scheduler engine")
+    parser.add_argument("--limit", type=int, help="replay only the first calls")
+    args = parser.parse_args(argv)
+
+    report = replay(args.recording, args.engine, args.concurrency, args.rate, args.workers, args.limit)
+    print(json.dumps(report.to_dict(), indent=2))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,86 @@
+from htmlwhat import metrics
+
+FEEDBACK_FIELDS = ("feedback_context", "creator")
+_MISSING = object()
+
+
+def freeze(value):
+    """Turn list, tuple and dict arguments into hashable tuples."""
+    if isinstance(value, (list, tuple)):
+        return tuple(freeze(item) for item in value)
+    if isinstance(value, dict):
+        return tuple(sorted((key, freeze(item)) for key, item in value.items()))
+    return value
+
+
+class CheckMemo:
+    """
+    Outcomes of passing checks, keyed by the student and solution nodes they inspected.
+
+    Failing checks are never stored, so they always run again and raise their usual ``TestFail``.
+    An entry only stays valid as long as the subtree of its student node is unchanged, the owner of
+    the memo is responsible to :meth:`forget` nodes that were edited or removed.
+    """
+
+    def __init__(self):
+        self.entries = {}
+        self.by_node = {}
+        self.hits = 0
+        self.misses = 0
+
+    def key(self, check, state, args, kwargs):
+        key = (check, id(state.student_ast), id(state.solution_ast), freeze(args), freeze(kwargs))
+        try:
+            hash(key)
+        except TypeError:
+            return None
+        return key
+
+    def call(self, check, state, args, kwargs):
+        key = self.key(check, state, args, kwargs)
+        if key is None:
+            return check(state, *args, **kwargs)
+
+        entry = self.entries.get(key)
+        hit = entry is not None and entry[0] is state.student_ast and entry[1] is state.solution_ast
+        registry = metrics.active()
+        if registry is not None:
+            registry.cache_lookup("check_memo", hit)
+        if hit:
+            self.hits += 1
+            if entry[3] is None:
+                return state
+            return state.to_child(append_message=entry[2], **entry[3])
+
+        self.misses += 1
+        child = check(state, *args, **kwargs)
+
+        if child.failed:
+            # failures collected instead of raised are never replayed
+            return child
+        if child is state:
+            self.store(key, state, None, None)
+        elif child.parent_state is state:
+            # only a direct child can be rebuilt with a single to_child()
+            parent_fields = vars(state)
+            overrides = {
+                k: v for k, v in vars(child).items()
+                if k not in FEEDBACK_FIELDS and parent_fields.get(k, _MISSING) is not v
+            }
+            if set(overrides) <= set(state.parameters):
+                self.store(key, state, child.feedback_context, overrides)
+
+        return child
+
+    def store(self, key, state, feedback_context, overrides):
+        self.entries[key] = (state.student_ast, state.solution_ast, feedback_context, overrides)
+        self.by_node.setdefault(id(state.student_ast), []).append(key)
+
+    def forget(self, node):
+        for key in self.by_node.pop(id(node), ()):
+            self.entries.pop(key, None)
+
+    def clear(self):
+        self.entries.clear()
+        self.by_node.clear()
+
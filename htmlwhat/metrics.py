@@ -0,0 +1,230 @@
+"""
+Opt-in metrics of grading, exported in the Prometheus text format.
+
+Nothing is measured until metrics are enabled, then every grading run of the process is counted and timed:
+
+.. code-block:: python
+
+    >>> from htmlwhat import metrics, test_exercise
+    >>> registry = metrics.enable()
+    >>> test_exercise("Ex().check_body().check_tag('h1')", "<body></body>", "<body><h1>Title</h1></body>")
+    >>> print(registry.to_prometheus())
+    # HELP htmlwhat_submissions_total Submissions graded.
+    # TYPE htmlwhat_submissions_total counter
+    htmlwhat_submissions_total 1
+    ...
+    htmlwhat_failures_total{check="check_tag"} 1
+    ...
+
+The grading service serves them on ``GET /metrics`` when started with ``--metrics``.
+"""
+
+import threading
+import time
+from bisect import bisect_left
+from contextlib import contextmanager
+from typing import Dict, Iterable, Optional, Tuple
+
+DEFAULT_BUCKETS = (0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+
+
+def escape_label(value: str) -> str:
+    return str(value).replace("\\", "\\\\").replace("\n", "\\n").replace('"', '\\"')
+
+
+def format_labels(names: Tuple[str, ...], values: Tuple[str, ...], extra: str = "") -> str:
+    labels = [f'{name}="{escape_label(value)}"' for name, value in zip(names, values)]
+    if extra:
+        labels.append(extra)
+    return "{" + ",".join(labels) + "}" if labels else ""
+
+
+def format_value(value) -> str:
+    if value == float("inf"):
+        return "+Inf"
+    return repr(value) if isinstance(value, float) else str(value)
+
+
+class Metric:
+    """A metric with a value per combination of its label values."""
+
+    kind = "untyped"
+
+    def __init__(self, name: str, documentation: str, labels: Iterable[str] = ()):
+        self.name = name
+        self.documentation = documentation
+        self.label_names = tuple(labels)
+        self.lock = threading.Lock()
+        self.values = {}
+
+    def samples(self):
+        """``(suffix, label string, value)`` of every sample."""
+        with self.lock:
+            values = dict(self.values)
+        for labels, value in sorted(values.items()):
+            yield "", format_labels(self.label_names, labels), value
+
+    def to_prometheus(self) -> str:
+        lines = [f"# HELP {self.name} {self.documentation}", f"# TYPE {self.name} {self.kind}"]
+        for suffix, labels, value in self.samples():
+            lines.append(f"{self.name}{suffix}{labels} {format_value(value)}")
+        return "\n".join(lines)
+
+
+class Counter(Metric):
+    kind = "counter"
+
+    def inc(self, *labels, amount=1):
+        with self.lock:
+            self.values[labels] = self.values.get(labels, 0) + amount
+
+    def get(self, *labels):
+        return self.values.get(labels, 0)
+
+    def samples(self):
+        if not self.label_names and () not in self.values:
+            # an unlabeled counter is exported from the start
+            yield "", "", 0
+        yield from super().samples()
+
+
+class Gauge(Metric):
+    """A gauge, either set or read from ``function`` when exported, which returns the values by label values."""
+
+    kind = "gauge"
+
+    def __init__(self, name: str, documentation: str, labels: Iterable[str] = (), function=None):
+        super().__init__(name, documentation, labels)
+        self.function = function
+
+    def set(self, value, *labels):
+        with self.lock:
+            self.values[labels] = value
+
+    def samples(self):
+        if self.function is not None:
+            with self.lock:
+                self.values = dict(self.function())
+        yield from super().samples()
+
+
+class Histogram(Metric):
+    kind = "histogram"
+
+    def __init__(self, name: str, documentation: str, buckets: Iterable[float] = DEFAULT_BUCKETS):
+        super().__init__(name, documentation)
+        self.buckets = tuple(sorted(buckets))
+        self.counts = [0] * (len(self.buckets) + 1)
+        self.sum = 0.0
+
+    def observe(self, value: float):
+        with self.lock:
+            # the last count is for the values above every bucket
+            self.counts[bisect_left(self.buckets, value)] += 1
+            self.sum += value
+
+    @contextmanager
+    def time(self):
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.observe(time.perf_counter() - start)
+
+    @property
+    def count(self) -> int:
+        return sum(self.counts)
+
+    def samples(self):
+        with self.lock:
+            counts, total = list(self.counts), self.sum
+        cumulative = 0
+        for bound, count in zip((*self.buckets, float("inf")), counts):
+            cumulative += count
+            yield "_bucket", format_labels((), (), f'le="{format_value(float(bound))}"'), cumulative
+        yield "_sum", "", total
+        yield "_count", "", cumulative
+
+
+def lru_cache_counts() -> Dict[Tuple[str, str], int]:
+    """Hits and misses of the caches of the process that live as long as it."""
+    from htmlwhat import css, safe_regex
+
+    caches = {
+        "regex": safe_regex.prepare_pattern,
+        "css_selector": css.compile_selector,
+        "css_selector_parts": css.split_selector,
+    }
+    return {
+        (name, result): getattr(function.cache_info(), result)
+        for name, function in caches.items()
+        for result in ("hits", "misses")
+    }
+
+
+class Registry:
+    """The metrics of grading, see :mod:`htmlwhat.metrics`."""
+
+    def __init__(self):
+        self.submissions = Counter("htmlwhat_submissions_total", "Submissions graded.")
+        self.passes = Counter("htmlwhat_passes_total", "Submissions that passed.")
+        self.failures = Counter("htmlwhat_failures_total", "Failures, by the check function that failed.", ["check"])
+        self.instructor_errors = Counter("htmlwhat_instructor_errors_total", "Grading runs stopped by an InstructorError.")
+        self.budget_exceeded = Counter(
+            "htmlwhat_budget_exceeded_total", "Grading runs stopped by a limit of their budget.", ["limit"]
+        )
+        self.parse_seconds = Histogram("htmlwhat_parse_seconds", "Time of parsing code, or streaming it.")
+        self.sct_seconds = Histogram("htmlwhat_sct_seconds", "Time of running the SCT against a submission.")
+        self.render_seconds = Histogram("htmlwhat_render_seconds", "Time of rendering the feedback payload.")
+        self.cache = Gauge(
+            "htmlwhat_cache_lookups", "Hits and misses of the caches since the start of the process.",
+            ["cache", "result"], self.cache_counts,
+        )
+        # hits and misses of the caches of documents and grading runs, counted as they happen
+        self.lookups = Counter("htmlwhat_cache_lookups", "", ["cache", "result"])
+
+    def cache_counts(self):
+        return {**lru_cache_counts(), **self.lookups.values}
+
+    def cache_lookup(self, cache: str, hit: bool):
+        self.lookups.inc(cache, "hits" if hit else "misses")
+
+    def metrics(self):
+        return [
+            self.submissions, self.passes, self.failures, self.instructor_errors, self.budget_exceeded,
+            self.parse_seconds, self.sct_seconds, self.render_seconds, self.cache,
+        ]
+
+    def to_prometheus(self) -> str:
+        """The metrics in the Prometheus text exposition format."""
+        return "\n".join(metric.to_prometheus() for metric in self.metrics()) + "\n"
+
+
+# the registry of the process, None while metrics are disabled
+registry: Optional[Registry] = None
+
+
+def enable(new_registry: Registry = None) -> Registry:
+    """Start measuring every grading run of the process, return the registry of the metrics."""
+    global registry
+    registry = new_registry or registry or Registry()
+    return registry
+
+
+def disable():
+    global registry
+    registry = None
+
+
+def active() -> Optional[Registry]:
+    return registry
+
+
+@contextmanager
+def timed(histogram: str):
+    """Observe the time of the block in the histogram named ``histogram`` of the registry, if metrics are enabled."""
+    if registry is None:
+        yield
+    else:
+        with getattr(registry, histogram).time():
+            yield
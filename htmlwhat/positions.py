@@ -0,0 +1,67 @@
+"""
+Line and column of the tags of a parsed document, for highlighting them in the feedback.
+
+Parsing records the ``start_offset`` and ``end_offset`` of every tag in the code. The offsets of the line starts
+are found once per document, the first time a position is needed, then every offset is turned into a line and a
+column by a binary search of them.
+
+The code is stripped before it is parsed, so positions count the lines and columns of the whitespace stripped from
+the start of the code the document was parsed from, its ``stripped_prefix`` recorded when the code was read, to
+match the code the student sees.
+"""
+
+import re
+from bisect import bisect_right
+from typing import Dict, List, Optional, Tuple
+
+from htmlwhat.utils import document_of
+
+NEWLINE = re.compile("\n")
+
+
+class LineTable:
+    """
+    Offsets of the starts of the lines of ``code``, lines are ended by ``\\n`` like ``sourceline`` counts them.
+    Offsets into ``code`` are counted after the ``prefix`` stripped from its start.
+    """
+
+    def __init__(self, code: str, prefix: str = ""):
+        self.base = len(prefix)
+        self.starts: List[int] = [
+            0,
+            *(match.end() for match in NEWLINE.finditer(prefix)),
+            *(self.base + match.end() for match in NEWLINE.finditer(code)),
+        ]
+
+    @classmethod
+    def of(cls, node) -> Optional["LineTable"]:
+        """The table of the document ``node`` belongs to, ``None`` if its code isn't known."""
+        document = document_of(node)
+        if "lines" not in document.caches:
+            code = getattr(document, "source", None)
+            prefix = getattr(document, "stripped_prefix", "")
+            document.caches["lines"] = None if code is None else cls(code, prefix)
+        return document.caches["lines"]
+
+    def line_column(self, offset: int) -> Tuple[int, int]:
+        """Line and column of ``offset``, both counted from ``1``."""
+        offset += self.base
+        line = bisect_right(self.starts, offset)
+        return line, offset - self.starts[line - 1] + 1
+
+
+def get_position(node) -> Optional[Dict[str, int]]:
+    """
+    Position of ``node`` in its code, from the first character of its start tag to the last of its end tag, with
+    lines and columns counted from ``1``. ``None`` for nodes without offsets, e.g. strings or streamed documents.
+    """
+    start, end = getattr(node, "start_offset", None), getattr(node, "end_offset", None)
+    if not isinstance(start, int) or not isinstance(end, int):
+        return None
+    table = LineTable.of(node)
+    if table is None:
+        return None
+
+    line_start, column_start = table.line_column(start)
+    line_end, column_end = table.line_column(max(start, end - 1))
+    return {"line_start": line_start, "column_start": column_start, "line_end": line_end, "column_end": column_end}
@@ -0,0 +1,276 @@
+"""
+Opt-in recording of grading calls, to replay real traffic against another version with :mod:`htmlwhat.loadtest`.
+
+Nothing is recorded until recording is started, then every call of :func:`htmlwhat.test_exercise` and
+:meth:`htmlwhat.Exercise.Exercise.grade` in the process is appended to a JSON lines file:
+
+.. code-block:: python
+
+    >>> from htmlwhat import recording
+    >>> recording.start("traffic.jsonl", redact=True)
+    >>> test_exercise(sct, student_code, solution_code)
+    >>> recording.stop()
+
+Every exercise is written once, as a ``{"type": "exercise", "id": ..., "sct": ..., "solution": ...}`` line, then
+every call as a ``{"type": "call", "exercise": ..., "code": ..., "collect_all": ..., "seconds": ..., ...}`` line
+with the outcome of the call. The grading service records with ``--record <file>``. The ``"solution"`` of an
+exercise with several accepted solutions is the list of them.
+"""
+
+import hashlib
+import json
+import random
+import re
+import threading
+import time
+from typing import Callable, List, Optional, Union
+
+from htmlwhat.solutions import read_solution_code
+from htmlwhat.source import read_code
+
+# a "<" only starts markup when followed by a letter, "/" or "!", like browsers parse it
+MARKUP_START = re.compile(r"<(?=[A-Za-z/!])")
+TAG_NAME = re.compile(r"</?[A-Za-z][^\s/>]*")
+SEPARATOR = re.compile(r"[\s/]*")
+ATTRIBUTE_NAME = re.compile(r"[^\s/>][^\s/>=]*")
+EQUALS = re.compile(r"\s*=\s*")
+ATTRIBUTE_VALUE = re.compile(r"\"[^\"]*\"?|'[^']*'?|[^\s>]*")
+DOCTYPE = re.compile(r"<!doctype[^>]*>?", re.IGNORECASE)
+BOGUS_COMMENT = re.compile(r"<(?:!--.*?(?:-->|$)|!|/)[^>]*>?", re.DOTALL)
+LETTER = re.compile(r"[^\W\d_]")
+DIGIT = re.compile(r"\d")
+
+# their content is text, whatever it looks like
+RAW_TEXT_ELEMENTS = {"script", "style", "textarea", "title", "xmp", "iframe", "noembed", "noframes", "plaintext"}
+# attribute names kept by the redaction, any other name may be text written in a tag by mistake, e.g. the "Doe" of
+# <img alt=Jane Doe>
+ATTRIBUTE_NAMES = set("""
+    accept accept-charset accesskey action align allow alt async autocapitalize autocomplete autofocus autoplay
+    background bgcolor border charset checked cite class color cols colspan content contenteditable controls coords
+    crossorigin data datetime decoding default defer dir dirname disabled download draggable enctype enterkeyhint for
+    form formaction formenctype formmethod formnovalidate formtarget headers height hidden high href hreflang
+    http-equiv id inert inputmode integrity is itemid itemprop itemref itemscope itemtype kind label lang list loading
+    loop low max maxlength media method min minlength multiple muted name nomodule nonce novalidate open optimum
+    pattern ping placeholder playsinline popover poster preload readonly referrerpolicy rel required reversed role
+    rows rowspan sandbox scope selected shape size sizes slot span spellcheck src srcdoc srclang srcset start step
+    style tabindex target title translate type usemap value width wrap xmlns
+""".split())
+ATTRIBUTE_PREFIXES = ("data-", "aria-", "on", "xml:", "xlink:")
+
+
+def mask(text: str) -> str:
+    return DIGIT.sub("0", LETTER.sub("x", text))
+
+
+def known_attribute(name: str) -> bool:
+    name = name.lower()
+    return name in ATTRIBUTE_NAMES or name.startswith(ATTRIBUTE_PREFIXES)
+
+
+def redact_tag(code: str, position: int, parts: list) -> int:
+    """Append the redacted tag starting at ``position``, return where it ends."""
+    name = TAG_NAME.match(code, position)
+    parts.append(name.group())
+    position = name.end()
+    while True:
+        separator = SEPARATOR.match(code, position)
+        parts.append(separator.group())
+        position = separator.end()
+        if position == len(code) or code[position] == ">":
+            parts.append(code[position:position + 1])
+            return position + 1
+        attribute = ATTRIBUTE_NAME.match(code, position)
+        parts.append(attribute.group() if known_attribute(attribute.group()) else mask(attribute.group()))
+        position = attribute.end()
+        equals = EQUALS.match(code, position)
+        if equals is not None:
+            value = ATTRIBUTE_VALUE.match(code, equals.end())
+            parts.append(equals.group() + mask(value.group()))
+            position = value.end()
+
+
+def redact_code(code: str) -> str:
+    """
+    Mask the letters and digits of the text, the comments, the attribute values and the unknown attribute names of
+    ``code``, keeping the tags, the known attribute names and the length of the code, so grading it takes about as
+    long. The content of ``<script>``, ``<style>`` and the other elements whose content is text is masked as text.
+
+    :example:
+        >>> redact_code('<p class="name">Jane Doe, 42</p><!-- jane@example.com -->')
+        '<p class="xxxx">xxxx xxx, 00</p><!-- xxxx@xxxxxxx.xxx -->'
+        >>> redact_code('<p>Jane <3 Doe, SSN 123 > ok</p>')
+        '<p>xxxx <0 xxx, xxx 000 > xx</p>'
+        >>> redact_code('<script>if(a<b && secret>1) go()</script>')
+        '<script>xx(x<x && xxxxxx>0) xx()</script>'
+        >>> redact_code('<!DOCTYPE html><img alt=Jane Doe src="me.png">')
+        '<!DOCTYPE html><img alt=xxxx xxx src="xx.xxx">'
+    """
+    parts = []
+    position = 0
+    while True:
+        match = MARKUP_START.search(code, position)
+        if match is None:
+            parts.append(mask(code[position:]))
+            return "".join(parts)
+        parts.append(mask(code[position:match.start()]))
+        position = match.start()
+
+        if DOCTYPE.match(code, position):
+            markup = DOCTYPE.match(code, position)
+            parts.append(markup.group())
+            position = markup.end()
+        elif TAG_NAME.match(code, position):
+            name = TAG_NAME.match(code, position).group()
+            position = redact_tag(code, position, parts)
+            if name[1:].lower() in RAW_TEXT_ELEMENTS:
+                end = re.compile(f"</{name[1:]}", re.IGNORECASE).search(code, position)
+                end = len(code) if end is None else end.start()
+                parts.append(mask(code[position:end]))
+                position = end
+        else:
+            # comments, and declarations or end tags browsers parse as comments
+            markup = BOGUS_COMMENT.match(code, position)
+            opening = "<!--" if markup.group().startswith("<!--") else markup.group()[:2]
+            closing = "-->" if markup.group().endswith("-->") and len(markup.group()) >= 7 else ">"
+            closing = closing if markup.group().endswith(closing) else ""
+            inside = markup.group()[len(opening):len(markup.group()) - len(closing)]
+            parts.append(opening + mask(inside) + closing)
+            position = markup.end()
+
+
+class Recorder:
+    """
+    Append grading calls to the JSON lines file at ``path``, see :mod:`htmlwhat.recording`.
+
+    :param path: The file, calls are appended to it.
+
+    :param redact: Whether to mask the student's code with :func:`redact_code`, or a function redacting it.
+    :type redact: bool | Callable[[str], str], optional
+
+    :param sample: Fraction of the calls to record, picked at random.
+    :type sample: float, optional
+    """
+
+    def __init__(self, path, redact: Union[bool, Callable[[str], str]] = False, sample: float = 1.0):
+        self.redact = redact_code if redact is True else redact or None
+        self.sample = sample
+        self.lock = threading.Lock()
+        self.file = open(path, "a", encoding="utf-8")
+        self.exercises = set()
+
+    def close(self):
+        with self.lock:
+            self.file.close()
+
+    def write(self, entry: dict):
+        self.file.write(json.dumps(entry, ensure_ascii=False, separators=(",", ":")) + "\n")
+
+    def record(
+        self, sct: str, solution_code: Union[str, List[str]], student_code, collect_all: bool, seconds: float,
+        payload: Optional[dict] = None, error: Optional[Exception] = None,
+    ):
+        """
+        Append a call and its outcome, and its exercise if it wasn't yet.
+
+        The feedback quotes the student's code, so a redacted call keeps no message: only whether it passed, the
+        check that failed first, when the failures were collected, a hash of the message, to tell whether it
+        changed, and the type of the error.
+
+        :example:
+            >>> import json, os, tempfile
+            >>> path = os.path.join(tempfile.mkdtemp(), "traffic.jsonl")
+            >>> recorder = Recorder(path, redact=True)
+            >>> message = "Expected <code>Hi</code>, found <code>Jane Doe, SSN 123</code>."
+            >>> recorder.record(
+            ...     "Ex().check_body().check_tag('p').has_equal_text()", "<p>Hi</p>", "<p>Jane Doe, SSN 123</p>", True,
+            ...     0.001, {"correct": False, "message": message, "failures": [{"check": "has_equal_text"}]},
+            ... )
+            >>> recorder.close()
+            >>> call = json.loads(open(path).readlines()[-1])
+            >>> call["code"], call["correct"], call["message"], call["check"]
+            ('<p>xxxx xxx, xxx 000</p>', False, None, 'has_equal_text')
+            >>> call["message_hash"]
+            '5070033c8fd121ba'
+            >>> "Jane" in open(path).read()
+            False
+        """
+        from htmlwhat.scheduler import exercise_key
+
+        code = read_code(student_code, "arg: student_code")
+        message = payload and payload.get("message")
+        failures = (payload or {}).get("failures")
+        error = None if error is None else f"{type(error).__name__}: {error}"
+        key = exercise_key(sct, solution_code)
+        call = {
+            "type": "call",
+            "exercise": key,
+            "code": code,
+            "collect_all": collect_all,
+            "seconds": round(seconds, 6),
+            "time": round(time.time(), 3),
+            "redacted": self.redact is not None,
+            "correct": payload and payload.get("correct"),
+            "message": message,
+            "check": failures[0].get("check") if failures else None,
+            "error": error,
+        }
+        if self.redact is not None:
+            call.update(
+                code=self.redact(code),
+                message=None,
+                message_hash=None if message is None else hashlib.sha1(message.encode("utf-8")).hexdigest()[:16],
+                error=None if error is None else error.split(":", 1)[0],
+            )
+        with self.lock:
+            if self.file.closed:
+                return
+            if key not in self.exercises:
+                self.exercises.add(key)
+                self.write({"type": "exercise", "id": key, "sct": sct, "solution": solution_code})
+            self.write(call)
+            self.file.flush()
+
+    def call(
+        self, sct: str, solution_code: Union[str, List[str]], student_code, collect_all: bool, grade: Callable[[], dict]
+    ) -> dict:
+        """Return ``grade()``, recording it unless it isn't part of the sample."""
+        if self.sample < 1 and random.random() >= self.sample:
+            return grade()
+        start = time.perf_counter()
+        try:
+            payload = grade()
+        except Exception as e:
+            self.record(sct, solution_code, student_code, collect_all, time.perf_counter() - start, error=e)
+            raise
+        self.record(sct, solution_code, student_code, collect_all, time.perf_counter() - start, payload)
+        return payload
+
+
+# the recorder of the process, None while nothing is recorded
+recorder: Optional[Recorder] = None
+
+
+def start(path, redact: Union[bool, Callable[[str], str]] = False, sample: float = 1.0) -> Recorder:
+    """Start recording every grading call of the process to ``path``, see :class:`Recorder`."""
+    global recorder
+    stop()
+    recorder = Recorder(path, redact, sample)
+    return recorder
+
+
+def stop():
+    global recorder
+    if recorder is not None:
+        recorder.close()
+    recorder = None
+
+
+def active() -> Optional[Recorder]:
+    return recorder
+
+
+def recorded(sct: str, solution_code, student_code, collect_all: bool, grade: Callable[[], dict]) -> dict:
+    """Return ``grade()``, recorded if recording is on."""
+    if recorder is None:
+        return grade()
+    return recorder.call(sct, read_solution_code(solution_code), student_code, collect_all, grade)
@@ -0,0 +1,390 @@
+"""
+Regex matching with a time budget, for the patterns of ``has_code(fixed=False)``.
+
+Instructor patterns run on arbitrary student code, and a backtracking-heavy pattern can take minutes on a large
+or adversarial submission. Patterns are analyzed once:
+
+- Leading and trailing ``.*`` are dropped, they don't change whether a search succeeds but make a failing search
+  quadratic.
+- Patterns with nested quantifiers, like ``(a+)+``, or with alternatives that can match the same text under a
+  quantifier, like ``(a|aa)+``, are hazards: their search can take exponential time. They are reported with a
+  :class:`RegexHazardWarning` when the SCT is loaded, and run with a linear-time matcher if ``google-re2`` is
+  installed.
+
+Every other search gets a time budget, whatever the pattern, since the analysis can't tell every slow pattern
+apart. In the main thread the search is interrupted by a timer. The regex engine of Python holds the GIL and can't
+be interrupted from another thread, so searches of other threads, e.g. the workers of
+:class:`htmlwhat.server.GradingService`, run with the ``regex`` module and its timeout if it is installed, else in
+a :class:`SearchWorker`, an interpreter of its own that is killed when the budget runs out. A search over its
+budget raises :class:`RegexTimeout`.
+"""
+
+import ast
+import atexit
+import os
+import queue
+import re
+import signal
+import subprocess
+import sys
+import threading
+import time
+import warnings
+from functools import lru_cache
+from typing import List, NamedTuple, Optional
+
+try:
+    from re import _parser as sre_parse, _constants as sre_constants
+except ImportError:  # Python < 3.11
+    import sre_parse, sre_constants
+
+from protowhat.failure import InstructorError
+
+DEFAULT_BUDGET = 1.0
+
+REPEATS = {sre_constants.MAX_REPEAT, sre_constants.MIN_REPEAT}
+POSSESSIVE_REPEAT = getattr(sre_constants, "POSSESSIVE_REPEAT", None)
+ATOMIC_GROUP = getattr(sre_constants, "ATOMIC_GROUP", None)
+# characters told apart when looking for overlapping alternatives, the others are all OTHER_CHARS
+OTHER_CHARS = 0x250
+SAMPLE = set(range(OTHER_CHARS + 1))
+CATEGORIES = {
+    getattr(sre_constants, name): {code for code in range(OTHER_CHARS) if re.match(escape, chr(code))} | {OTHER_CHARS}
+    for name, escape in (
+        ("CATEGORY_DIGIT", r"\d"), ("CATEGORY_NOT_DIGIT", r"\D"), ("CATEGORY_SPACE", r"\s"),
+        ("CATEGORY_NOT_SPACE", r"\S"), ("CATEGORY_WORD", r"\w"), ("CATEGORY_NOT_WORD", r"\W"),
+    )
+}
+LEADING_ANY = re.compile(r"^(?:\.\*\??)+")
+TRAILING_ANY = re.compile(r"(?<!\\)(?:\\\\)*(?:\.\*\??)+$")
+
+
+class RegexTimeout(TimeoutError):
+    """A search didn't finish within its time budget."""
+
+
+class RegexHazardWarning(UserWarning):
+    """A pattern of the SCT may take exponential time on some inputs."""
+
+
+class Pattern(NamedTuple):
+    source: str
+    search_source: str
+    compiled: "re.Pattern"
+    hazard: Optional[str]
+
+
+def _class_chars(members) -> Optional[set]:
+    """The characters of :data:`SAMPLE` a character class matches, ``None`` if they are not known."""
+    chars = set()
+    for member, value in members:
+        if member is sre_constants.LITERAL:
+            chars.add(value)
+        elif member is sre_constants.RANGE:
+            chars.update(range(value[0], min(value[1] + 1, OTHER_CHARS)))
+            if value[1] >= OTHER_CHARS:
+                chars.add(OTHER_CHARS)
+        elif member is sre_constants.CATEGORY and value in CATEGORIES:
+            chars |= CATEGORIES[value]
+        elif member is not sre_constants.NEGATE:
+            return None
+    return SAMPLE - chars if members and members[0][0] is sre_constants.NEGATE else chars
+
+
+def _first_chars(items):
+    """
+    The characters a sequence of items can start with, ``None`` if they are not known, and whether the sequence can
+    match the empty string.
+    """
+    chars = set()
+    for op, av in items:
+        if op is sre_constants.LITERAL:
+            first, empty = {av}, False
+        elif op is sre_constants.NOT_LITERAL:
+            first, empty = SAMPLE - {av}, False
+        elif op is sre_constants.ANY:
+            first, empty = SAMPLE - {ord("\n")}, False
+        elif op is sre_constants.IN:
+            first, empty = _class_chars(av), False
+        elif op in REPEATS or op is POSSESSIVE_REPEAT:
+            first, empty = _first_chars(av[2])
+            empty = empty or av[0] == 0
+        elif op is sre_constants.SUBPATTERN:
+            first, empty = _first_chars(av[-1])
+        elif op is ATOMIC_GROUP:
+            first, empty = _first_chars(av)
+        elif op is sre_constants.BRANCH:
+            first, empty = _branch_first_chars(av[1])[0], False
+            if first is not None:
+                first, empty = set().union(*first), any(_first_chars(branch)[1] for branch in av[1])
+        elif op in (sre_constants.AT, sre_constants.ASSERT, sre_constants.ASSERT_NOT):
+            first, empty = set(), True
+        else:
+            return None, False
+        if first is None:
+            return None, False
+        chars |= first
+        if not empty:
+            return chars, False
+    return chars, True
+
+
+def _branch_first_chars(branches):
+    """The first characters of every branch, ``None`` if one is not known, and whether two branches overlap."""
+    firsts = []
+    for branch in branches:
+        first, empty = _first_chars(branch)
+        if first is None:
+            return None, True
+        # an empty branch leaves the next iteration to match what the other branches would
+        if empty or any(first & other for other in firsts):
+            return firsts + [first], True
+        firsts.append(first)
+    return firsts, False
+
+
+def _find_hazard(items, repeated: bool) -> Optional[str]:
+    for op, av in items:
+        if op in REPEATS:
+            low, high, sub = av
+            if repeated and low != high:
+                return "nested quantifiers"
+            hazard = _find_hazard(sub, repeated or high == sre_constants.MAXREPEAT)
+        elif op is POSSESSIVE_REPEAT or op is ATOMIC_GROUP:
+            # never backtracks into its content
+            hazard = None
+        elif op is sre_constants.SUBPATTERN:
+            hazard = _find_hazard(av[-1], repeated)
+        elif op is sre_constants.BRANCH:
+            if repeated and _branch_first_chars(av[1])[1]:
+                # e.g. ``(a|aa)+``, a text can be split between the branches in exponentially many ways
+                return "overlapping alternatives"
+            hazard = next(filter(None, (_find_hazard(branch, repeated) for branch in av[1])), None)
+        elif op in (sre_constants.ASSERT, sre_constants.ASSERT_NOT):
+            hazard = _find_hazard(av[1], repeated)
+        elif op is sre_constants.GROUPREF_EXISTS:
+            hazard = _find_hazard(av[1], repeated) or (av[2] and _find_hazard(av[2], repeated))
+        else:
+            hazard = None
+        if hazard:
+            return hazard
+    return None
+
+
+def _has_top_level_branch(parsed) -> bool:
+    return any(op is sre_constants.BRANCH for op, _ in parsed)
+
+
+@lru_cache(maxsize=1024)
+def prepare_pattern(pattern: str) -> Pattern:
+    """
+    Compile and analyze a pattern, once.
+
+    :raises InstructorError: If the pattern is not a valid regular expression.
+    """
+    try:
+        parsed = sre_parse.parse(pattern)
+        compiled = re.compile(pattern)
+    except re.error as e:
+        raise InstructorError.from_message(f"`has_code()` got an invalid pattern `{pattern}`: {e}")
+
+    search_source = pattern
+    if not _has_top_level_branch(parsed):
+        search_source = TRAILING_ANY.sub(lambda m: m.group()[:m.group().find(".*")], LEADING_ANY.sub("", pattern))
+    if search_source != pattern:
+        try:
+            compiled = re.compile(search_source)
+        except re.error:
+            # e.g. a possessive ``.*+``
+            search_source = pattern
+
+    return Pattern(pattern, search_source, compiled, _find_hazard(parsed, False))
+
+
+def _linear_matcher(pattern: Pattern):
+    try:
+        import re2
+    except ImportError:
+        return None
+    try:
+        return re2.compile(pattern.search_source)
+    except Exception:
+        # a feature re2 doesn't support, e.g. backreferences
+        return None
+
+
+def _search_with_timer(pattern: Pattern, text: str, budget: float) -> bool:
+    outer_delay, outer_interval = signal.getitimer(signal.ITIMER_REAL)
+    if outer_delay and outer_delay <= budget:
+        # an outer timer expires first and interrupts the search itself
+        return pattern.compiled.search(text) is not None
+
+    def expire(signum, frame):
+        raise RegexTimeout(f"Searching `{pattern.source}` took more than {budget} seconds.")
+
+    previous_handler = signal.signal(signal.SIGALRM, expire)
+    started = time.monotonic()
+    signal.setitimer(signal.ITIMER_REAL, budget)
+    try:
+        return pattern.compiled.search(text) is not None
+    finally:
+        signal.setitimer(signal.ITIMER_REAL, 0)
+        signal.signal(signal.SIGALRM, signal.SIG_DFL if previous_handler is None else previous_handler)
+        if outer_delay:
+            # resume the outer timer
+            remaining = max(outer_delay - (time.monotonic() - started), 1e-6)
+            signal.setitimer(signal.ITIMER_REAL, remaining, outer_interval)
+
+
+# run by a bare interpreter, so nothing of the grading process is imported again; reads the lengths in bytes of a
+# pattern and a text on a line, then both, and answers 1 if the pattern is found in the text, else 0
+WORKER_SEARCH = (
+    "import re, sys\n"
+    "read, write = sys.stdin.buffer, sys.stdout.buffer\n"
+    "for line in iter(read.readline, b''):\n"
+    "    size, length = map(int, line.split())\n"
+    "    pattern, text = (read.read(size).decode('utf-8', 'surrogatepass') for size in (size, length))\n"
+    "    write.write(b'1\\n' if re.search(pattern, text) else b'0\\n')\n"
+    "    write.flush()\n"
+)
+
+
+class SearchWorker:
+    """
+    An interpreter that stays up to search patterns for the threads a timer can't interrupt. A search over its budget
+    kills the interpreter, the next search starts a new one. Searches are run one at a time, the budget of a search
+    starts once the worker is free.
+    """
+
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.process = None
+        self.answers = None
+
+    def start(self):
+        self.process = subprocess.Popen(
+            [sys.executable, "-I", "-S", "-c", WORKER_SEARCH], stdin=subprocess.PIPE, stdout=subprocess.PIPE
+        )
+        self.answers = queue.SimpleQueue()
+        threading.Thread(target=self.read, args=(self.process.stdout, self.answers), daemon=True).start()
+
+    @staticmethod
+    def read(stdout, answers):
+        for line in iter(stdout.readline, b""):
+            answers.put(line.strip() == b"1")
+        answers.put(None)
+
+    def stop(self):
+        if self.process is not None:
+            self.process.kill()
+            self.process.wait()
+            self.process = None
+
+    def search(self, pattern: Pattern, text: str, budget: float) -> bool:
+        source = pattern.search_source.encode("utf-8", "surrogatepass")
+        data = text.encode("utf-8", "surrogatepass")
+        with self.lock:
+            if self.process is None or self.process.poll() is not None:
+                self.start()
+            try:
+                self.process.stdin.write(b"%d %d\n%s%s" % (len(source), len(data), source, data))
+                self.process.stdin.flush()
+                answer = self.answers.get(timeout=budget)
+            except queue.Empty:
+                self.stop()
+                raise RegexTimeout(f"Searching `{pattern.source}` took more than {budget} seconds.")
+            except OSError:
+                answer = None
+            if answer is None:
+                self.stop()
+                raise RuntimeError(f"The regex worker exited while searching `{pattern.source}`.")
+            return answer
+
+    def after_fork(self):
+        # the process belongs to the parent, the child starts its own
+        self.lock = threading.Lock()
+        self.process = None
+
+
+search_worker = SearchWorker()
+atexit.register(search_worker.stop)
+if hasattr(os, "register_at_fork"):
+    os.register_at_fork(after_in_child=search_worker.after_fork)
+
+
+def _search_in_thread(pattern: Pattern, text: str, budget: float) -> bool:
+    try:
+        import regex
+    except ImportError:
+        return search_worker.search(pattern, text, budget)
+    try:
+        return regex.search(pattern.search_source, text, timeout=budget, concurrent=True) is not None
+    except TimeoutError:
+        raise RegexTimeout(f"Searching `{pattern.source}` took more than {budget} seconds.")
+
+
+def safe_search(pattern: str, text: str, budget: float = DEFAULT_BUDGET) -> bool:
+    """
+    Whether ``pattern`` matches somewhere in ``text``, like ``re.search``, within ``budget`` seconds.
+
+    :raises RegexTimeout: If the search takes longer than ``budget``.
+    :raises InstructorError: If the pattern is not a valid regular expression.
+    """
+    prepared = prepare_pattern(pattern)
+
+    if prepared.hazard:
+        matcher = _linear_matcher(prepared)
+        if matcher is not None:
+            return matcher.search(text) is not None
+
+    if threading.current_thread() is threading.main_thread() and hasattr(signal, "setitimer"):
+        return _search_with_timer(prepared, text, budget)
+    return _search_in_thread(prepared, text, budget)
+
+
+def sct_patterns(sct: str) -> List[str]:
+    """The literal patterns of the ``has_code(..., fixed=False)`` calls of ``sct``."""
+    try:
+        tree = ast.parse(sct)
+    except SyntaxError:
+        return []
+
+    patterns = []
+    for node in ast.walk(tree):
+        if not isinstance(node, ast.Call):
+            continue
+        func = node.func
+        if (func.attr if isinstance(func, ast.Attribute) else getattr(func, "id", None)) != "has_code":
+            continue
+        keywords = {keyword.arg: keyword.value for keyword in node.keywords}
+        args = node.args
+        # has_code(state, ...) when called on a state, has_code(...) when chained or nested as a lazy chain, e.g. in
+        # check_or(), where the first argument is the pattern
+        if isinstance(func, ast.Name) and args and not isinstance(args[0], ast.Constant):
+            if len(args) > 1 or "text" in keywords:
+                args = args[1:]
+        text = keywords.get("text", args[0] if args else None)
+        fixed = keywords.get("fixed", args[2] if len(args) > 2 else None)
+        try:
+            if fixed is not None and not ast.literal_eval(fixed) and text is not None:
+                patterns.append(ast.literal_eval(text))
+        except ValueError:
+            continue
+    return [pattern for pattern in patterns if isinstance(pattern, str)]
+
+
+def check_sct_patterns(sct: str):
+    """
+    Analyze the regex patterns of ``sct`` when it is loaded.
+
+    :raises InstructorError: If a pattern is not a valid regular expression.
+    """
+    for pattern in sct_patterns(sct):
+        prepared = prepare_pattern(pattern)
+        if prepared.hazard:
+            warnings.warn(
+                f"The pattern `{pattern}` of `has_code()` has {prepared.hazard}, searching it can take exponential "
+                "time. It is searched with a time budget.",
+                RegexHazardWarning,
+                stacklevel=3,
+            )
@@ -0,0 +1,240 @@
+"""
+Grade submissions of many exercises on worker processes, sending the submissions of an exercise to the same worker.
+
+Every worker keeps the exercises it prepared warm, so spreading the submissions of an exercise over all the workers
+would have each of them parse its solution and compile its SCT. Exercises are assigned to workers by consistent
+hashing, which moves few exercises when the number of workers changes, with bounded loads: a worker that already
+runs more than its share of the submissions in flight passes the next ones to the following worker on the ring, so
+a popular exercise spills over to other workers instead of queueing behind a single one.
+
+The workers are started with the ``forkserver`` method where it is available, else ``spawn``, never forked from a
+process that may run threads, like the grading service. They import the main module, so a script creating a
+scheduler does it under ``if __name__ == "__main__":``. A worker that dies, e.g. killed for its memory, is replaced
+by a new one, only the submissions it was grading fail.
+
+.. code-block:: python
+
+    >>> from htmlwhat.scheduler import AffinityScheduler
+    >>> with AffinityScheduler(workers=8) as scheduler:
+    ...     futures = [scheduler.submit(sct, solution_code, student_code) for sct, solution_code, student_code in jobs]
+    ...     results = [future.result() for future in futures]
+    ...     scheduler.stats()["workers"][0]
+    {'submitted': 1250, 'spilled': 31, 'hits': 1238, 'misses': 12, 'restarts': 0, 'load': 0, 'hit_ratio': 0.9904}
+"""
+
+import hashlib
+import math
+import multiprocessing
+import threading
+from bisect import bisect
+from collections import OrderedDict
+from concurrent.futures import Future, ProcessPoolExecutor
+from concurrent.futures.process import BrokenProcessPool
+from typing import List, Union
+
+from htmlwhat import recording
+from htmlwhat.Exercise import Exercise
+from htmlwhat.budget import Budget
+from htmlwhat.failure import InstructorError
+from htmlwhat.solutions import SOLUTION_LISTS
+
+
+def exercise_key(sct: str, solution_code: Union[str, List[str]]) -> str:
+    """Identify an exercise by its content, ``solution_code`` is a list if it has several accepted solutions."""
+    if isinstance(solution_code, SOLUTION_LISTS):
+        solution_code = "\0".join(solution_code)
+    return hashlib.sha1((sct + "\0" + solution_code).encode("utf-8")).hexdigest()
+
+
+def ring_position(key: str) -> int:
+    # stable across processes, unlike hash()
+    return int.from_bytes(hashlib.md5(key.encode("utf-8")).digest()[:8], "big")
+
+
+_worker_exercises = OrderedDict()
+_worker_max_exercises = 0
+_worker_budget = None
+_worker_teardown = False
+
+
+def _init_worker(max_exercises: int, budget: Budget, teardown: bool):
+    global _worker_max_exercises, _worker_budget, _worker_teardown
+    _worker_max_exercises, _worker_budget, _worker_teardown = max_exercises, budget, teardown
+    # the parent records the calls itself
+    recording.recorder = None
+
+
+def process_context():
+    """Start method of the workers, ``forkserver`` where it is available, else ``spawn``."""
+    methods = multiprocessing.get_all_start_methods()
+    return multiprocessing.get_context("forkserver" if "forkserver" in methods else "spawn")
+
+
+def _grade(exercise_id: str, sct: str, solution_code: str, student_code: str, collect_all: bool):
+    """
+    Grade in a worker, return the payload, whether the exercise was already prepared by that worker and the
+    message of an ``InstructorError``, which can't be sent back as is.
+    """
+    exercise = _worker_exercises.get(exercise_id)
+    hit = exercise is not None
+    if hit:
+        _worker_exercises.move_to_end(exercise_id)
+    else:
+        exercise = _worker_exercises[exercise_id] = Exercise(
+            sct, solution_code, budget=_worker_budget, teardown=_worker_teardown
+        )
+        while len(_worker_exercises) > _worker_max_exercises:
+            _worker_exercises.popitem(last=False)
+    try:
+        return exercise.grade(student_code, collect_all=collect_all), hit, None
+    except InstructorError as e:
+        return None, hit, str(e)
+
+
+class AffinityScheduler:
+    """
+    Route the submissions of every exercise to the same worker process, see :mod:`htmlwhat.scheduler`.
+
+    :param workers: Number of worker processes.
+    :type workers: int
+
+    :param load_factor: How many times its share of the submissions in flight a worker takes before the next
+        submissions of its exercises spill over to the following worker, at least ``1``.
+    :type load_factor: float, optional
+
+    :param replicas: Number of points of every worker on the hash ring, more points spread exercises more evenly.
+    :type replicas: int, optional
+
+    :param max_exercises: Maximum number of exercises kept warm by every worker, the least recently used ones are
+        dropped first.
+    :type max_exercises: int, optional
+
+    :param budget: Limits of grading every submission.
+    :type budget: htmlwhat.budget.Budget, optional
+
+    :param teardown: Whether the workers break down every student tree once graded, see :mod:`htmlwhat.memory`.
+    :type teardown: bool, optional
+    """
+
+    def __init__(
+        self, workers: int, load_factor: float = 1.25, replicas: int = 64, max_exercises: int = 256,
+        budget: Budget = None, teardown: bool = False,
+    ):
+        if workers < 1 or load_factor < 1:
+            raise ValueError("Expected at least one worker and a load factor of at least 1.")
+        self.load_factor = load_factor
+        self.initargs = (max_exercises, budget, teardown)
+        self.context = process_context()
+        self.executors = [self.start_worker() for _ in range(workers)]
+        self.ring = sorted(
+            (ring_position(f"worker-{worker}-{replica}"), worker)
+            for worker in range(workers)
+            for replica in range(replicas)
+        )
+        self.positions = [position for position, _ in self.ring]
+        self.lock = threading.Lock()
+        self.load = [0] * workers
+        self.counters = [{"submitted": 0, "spilled": 0, "hits": 0, "misses": 0, "restarts": 0} for _ in range(workers)]
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc_info):
+        self.shutdown()
+
+    def start_worker(self) -> ProcessPoolExecutor:
+        return ProcessPoolExecutor(1, mp_context=self.context, initializer=_init_worker, initargs=self.initargs)
+
+    def restart_worker(self, worker: int, broken: ProcessPoolExecutor):
+        """Replace the ``broken`` executor of ``worker``, unless it already was."""
+        with self.lock:
+            if self.executors[worker] is not broken:
+                return
+            self.executors[worker] = self.start_worker()
+            self.counters[worker]["restarts"] += 1
+        broken.shutdown(wait=False)
+
+    def route(self, exercise_id: str) -> int:
+        """
+        The worker of the next submission of ``exercise_id``: the first worker clockwise from the exercise on the
+        ring that isn't over its bounded load. Called with the lock held.
+        """
+        capacity = math.ceil(self.load_factor * (sum(self.load) + 1) / len(self.executors))
+        start = bisect(self.positions, ring_position(exercise_id))
+        preferred = None
+        for offset in range(len(self.ring)):
+            worker = self.ring[(start + offset) % len(self.ring)][1]
+            if preferred is None:
+                preferred = worker
+            if self.load[worker] < capacity:
+                if worker != preferred:
+                    self.counters[worker]["spilled"] += 1
+                return worker
+        # unreachable, the total load is below the total capacity
+        return preferred
+
+    def submit(
+        self, sct: str, solution_code: str, student_code: str, exercise_id: str = None, collect_all: bool = False
+    ) -> Future:
+        """
+        Schedule the grading of ``student_code``, the future gives the payload of
+        :meth:`htmlwhat.Exercise.Exercise.grade`.
+
+        :param exercise_id: Identifies the exercise, defaults to a hash of the SCT and the solution code.
+        :type exercise_id: str, optional
+        """
+        exercise_id = exercise_id or exercise_key(sct, solution_code)
+        with self.lock:
+            worker = self.route(exercise_id)
+            self.load[worker] += 1
+            self.counters[worker]["submitted"] += 1
+            executor = self.executors[worker]
+
+        future = Future()
+        try:
+            graded = executor.submit(_grade, exercise_id, sct, solution_code, student_code, collect_all)
+        except BrokenProcessPool:
+            # the worker died since its last submission finished
+            self.restart_worker(worker, executor)
+            with self.lock:
+                executor = self.executors[worker]
+            graded = executor.submit(_grade, exercise_id, sct, solution_code, student_code, collect_all)
+
+        def done(graded):
+            error = graded.exception()
+            if isinstance(error, BrokenProcessPool):
+                self.restart_worker(worker, executor)
+            if error is None:
+                payload, hit, message = graded.result()
+                if message is not None:
+                    error = InstructorError.from_message(message)
+            with self.lock:
+                self.load[worker] -= 1
+                if graded.exception() is None:
+                    self.counters[worker]["hits" if hit else "misses"] += 1
+            if error is None:
+                future.set_result(payload)
+            else:
+                future.set_exception(error)
+
+        graded.add_done_callback(done)
+        return future
+
+    def stats(self) -> dict:
+        """Counters of every worker, with the ratio of its submissions whose exercise was already prepared."""
+        with self.lock:
+            workers = []
+            for counters, load in zip(self.counters, self.load):
+                graded = counters["hits"] + counters["misses"]
+                workers.append({
+                    **counters,
+                    "load": load,
+                    "hit_ratio": round(counters["hits"] / graded, 4) if graded else None,
+                })
+        hits = sum(worker["hits"] for worker in workers)
+        graded = hits + sum(worker["misses"] for worker in workers)
+        return {"workers": workers, "hit_ratio": round(hits / graded, 4) if graded else None}
+
+    def shutdown(self):
+        for executor in self.executors:
+            executor.shutdown(wait=True)
@@ -0,0 +1,315 @@
+"""
+Artifacts of prepared exercises, to build them once at deploy time and load them in every grader process.
+
+An artifact is a JSON document holding the SCT, the solution code, the parsed solution tree and data derived
+from it, like its :class:`htmlwhat.css.StyleIndex`. The tree is stored as a flat list of its nodes in document
+order, loading it links the nodes back together without parsing the solution again. Loading only decodes JSON
+and validates it, it never runs code: the SCT is compiled, and only run when a submission is graded.
+
+.. code-block:: bash
+
+    python -m htmlwhat.serialize exercise.py solution.html exercise.json
+
+.. code-block:: python
+
+    >>> from htmlwhat import serialize
+    >>> exercise = serialize.load("exercise.json")
+    >>> exercise.grade("<body><h1>Hello</h1></body>")
+    {'correct': True, 'message': 'Great work!'}
+"""
+
+import argparse
+import json
+import os
+from bs4.element import (
+    Tag, NavigableString, Comment, CData, ProcessingInstruction, Declaration, Doctype,
+    Stylesheet, Script, TemplateString, RubyTextString, RubyParenthesisString,
+)
+
+from htmlwhat.State import BeautifulSoupNode, HtmlTreeBuilder
+from htmlwhat.Exercise import Exercise
+from htmlwhat.budget import Budget
+from htmlwhat.css import StyleIndex
+
+TREE_FORMAT = "htmlwhat-tree"
+EXERCISE_FORMAT = "htmlwhat-exercise"
+VERSION = 1
+
+# strings are stored as plain JSON strings, or as [kind, text] for the other kinds
+STRING_KINDS = (
+    NavigableString, Comment, CData, ProcessingInstruction, Declaration, Doctype,
+    Stylesheet, Script, TemplateString, RubyTextString, RubyParenthesisString,
+)
+KIND_CODES = {kind: code for code, kind in enumerate(STRING_KINDS)}
+
+# a tag is stored as [name, attrs, number of children, start_offset, end_offset, sourceline, sourcepos]
+TAG_FIELDS = 7
+# attributes of a Tag that differ between two tags with the same name
+OWN_ATTRIBUTES = {
+    "attrs", "contents", "parent", "previous_element", "next_element", "previous_sibling", "next_sibling",
+    "_namespaces", "start_offset", "end_offset", "sourceline", "sourcepos",
+}
+
+
+class SerializationError(ValueError):
+    """An artifact can't be loaded: it isn't one, it has another version or it is malformed."""
+
+
+def _check_header(data, expected: str):
+    if not isinstance(data, dict) or data.get("format") != expected:
+        raise SerializationError(f"Expected a `{expected}` artifact.")
+    if data.get("version") != VERSION:
+        raise SerializationError(
+            f"Expected a `{expected}` artifact of version {VERSION}, got version {data.get('version')!r}."
+        )
+
+
+def _is_int(value, optional=False):
+    return (value is None and optional) or (type(value) is int and value >= 0)
+
+
+def _valid_attrs(attrs) -> bool:
+    return isinstance(attrs, dict) and all(
+        isinstance(value, str) or (isinstance(value, list) and all(isinstance(item, str) for item in value))
+        for value in attrs.values()
+    )
+
+
+def dump_tree(document: BeautifulSoupNode) -> dict:
+    """The data of a parsed document, see :func:`load_tree`."""
+    nodes = []
+    for element in document.descendants:
+        if isinstance(element, Tag):
+            own = vars(element)
+            nodes.append([
+                element.name,
+                {name: list(value) if isinstance(value, list) else str(value) for name, value in element.attrs.items()},
+                len(element.contents),
+                own.get("start_offset"),
+                own.get("end_offset"),
+                own.get("sourceline"),
+                own.get("sourcepos"),
+            ])
+        elif type(element) is NavigableString:
+            nodes.append(str(element))
+        elif type(element) in KIND_CODES:
+            nodes.append([KIND_CODES[type(element)], str(element)])
+        else:
+            raise SerializationError(f"Can't store strings of type `{type(element).__name__}`.")
+
+    return {
+        "format": TREE_FORMAT,
+        "version": VERSION,
+        "children": len(document.contents),
+        "end_offset": getattr(document, "end_offset", None),
+        "balanced": getattr(document, "balanced", True),
+        "nodes": nodes,
+    }
+
+
+def load_tree(data: dict) -> BeautifulSoupNode:
+    """
+    Rebuild a document from the data of :func:`dump_tree`, the same as parsing its code again.
+
+    :raises SerializationError: If ``data`` isn't valid tree data of this version.
+    """
+    _check_header(data, TREE_FORMAT)
+    nodes = data.get("nodes")
+    if not isinstance(nodes, list) or not _is_int(data.get("children")) or not _is_int(data.get("end_offset"), True):
+        raise SerializationError("Malformed tree: expected `nodes`, `children` and `end_offset`.")
+
+    document = BeautifulSoupNode("", builder=HtmlTreeBuilder)
+    document.end_offset = data["end_offset"]
+    document.balanced = bool(data.get("balanced", True))
+    builder = document.builder
+
+    # the shared attributes of the first tag of every name, copied into the next ones
+    templates = {}
+    # open tags with the number of children they still expect
+    stack = [[document, data["children"]]] if data["children"] else []
+    previous = None
+    for index, entry in enumerate(nodes):
+        if not stack:
+            raise SerializationError(f"Malformed tree: node {index} is outside of the document.")
+        parent = stack[-1][0]
+
+        # strings are linked below, str.__new__ skips the setup of NavigableString
+        if isinstance(entry, str):
+            element = str.__new__(NavigableString, entry)
+            children = 0
+        elif isinstance(entry, list) and len(entry) == 2:
+            kind, text = entry
+            if type(kind) is not int or not 0 <= kind < len(STRING_KINDS) or not isinstance(text, str):
+                raise SerializationError(f"Malformed tree: node {index} is not a valid string.")
+            element = str.__new__(STRING_KINDS[kind], text)
+            children = 0
+        elif isinstance(entry, list) and len(entry) == TAG_FIELDS:
+            name, attrs, children, start_offset, end_offset, sourceline, sourcepos = entry
+            if (
+                not isinstance(name, str) or not _valid_attrs(attrs) or not _is_int(children)
+                or not (_is_int(start_offset, True) and _is_int(end_offset, True))
+                or not (_is_int(sourceline, True) and _is_int(sourcepos, True))
+            ):
+                raise SerializationError(f"Malformed tree: node {index} is not a valid tag.")
+
+            template = templates.get(name)
+            if template is None or name == "meta":
+                # meta tags get their own charset substitutions
+                element = Tag(parser=document, builder=builder, name=name, attrs=attrs)
+                templates[name] = {key: value for key, value in vars(element).items() if key not in OWN_ATTRIBUTES}
+            else:
+                element = Tag.__new__(Tag)
+                element.__dict__.update(template)
+                element.attrs = attrs
+                element.contents = []
+                element._namespaces = {}
+            element.start_offset, element.end_offset = start_offset, end_offset
+            element.sourceline, element.sourcepos = sourceline, sourcepos
+        else:
+            raise SerializationError(f"Malformed tree: node {index} is neither a tag nor a string.")
+
+        siblings = parent.contents
+        element.parent = parent
+        element.previous_element = previous
+        element.next_element = None
+        element.previous_sibling = siblings[-1] if siblings else None
+        element.next_sibling = None
+        if previous is not None:
+            previous.next_element = element
+        if siblings:
+            siblings[-1].next_sibling = element
+        siblings.append(element)
+        previous = element
+
+        stack[-1][1] -= 1
+        if children:
+            stack.append([element, children])
+        while stack and not stack[-1][1]:
+            stack.pop()
+
+    if stack:
+        raise SerializationError("Malformed tree: the nodes end before the document does.")
+    return document
+
+
+def _dump_solution(solution_code: str, solution_ast: BeautifulSoupNode) -> dict:
+    tree = dump_tree(solution_ast)
+    styles = StyleIndex.of(solution_ast)
+    # inline styles are keyed by the index of their tag in the stored nodes
+    indices = {id(element): index for index, element in enumerate(solution_ast.descendants)}
+    return {
+        "solution": solution_code,
+        "tree": tree,
+        "styles": {
+            "rules": styles.rules,
+            "inline": [[indices[key], declarations] for key, declarations in styles.inline.items()],
+        },
+    }
+
+
+def dump_exercise(exercise: Exercise) -> dict:
+    """
+    The data of a prepared exercise, see :func:`load_exercise`. The solutions accepted besides the first one are
+    stored under ``alternatives``, each with its tree and styles.
+    """
+    solutions = [*zip(exercise.solution_codes, exercise.solution_asts)]
+    data = {"format": EXERCISE_FORMAT, "version": VERSION, "sct": exercise.sct_source, **_dump_solution(*solutions[0])}
+    if len(solutions) > 1:
+        data["alternatives"] = [_dump_solution(*solution) for solution in solutions[1:]]
+    return data
+
+
+def _load_styles(data, document: BeautifulSoupNode) -> StyleIndex:
+    def declarations(value):
+        return isinstance(value, dict) and all(isinstance(item, str) for item in (*value, *value.values()))
+
+    rules, inline = data.get("rules"), data.get("inline")
+    if (
+        not isinstance(rules, dict) or not all(declarations(value) for value in rules.values())
+        or not isinstance(inline, list)
+        or not all(isinstance(item, list) and len(item) == 2 and _is_int(item[0]) and declarations(item[1]) for item in inline)
+    ):
+        raise SerializationError("Malformed styles: expected `rules` and `inline` declarations.")
+
+    elements = list(document.descendants)
+    if any(item[0] >= len(elements) or not isinstance(elements[item[0]], Tag) for item in inline):
+        raise SerializationError("Malformed styles: inline styles of nodes that aren't tags.")
+
+    # the index is restored as is, not built from the document
+    index = StyleIndex.__new__(StyleIndex)
+    index.rules = rules
+    index.inline = {id(elements[position]): value for position, value in inline}
+    return index
+
+
+def load_exercise(data: dict, budget: Budget = None) -> Exercise:
+    """
+    Prepare an exercise from the data of :func:`dump_exercise`, without parsing its solution code.
+
+    :param data: The exercise data.
+    :type data: dict
+
+    :param budget: Default limits of grading a submission, see :class:`htmlwhat.budget.Budget`.
+    :type budget: htmlwhat.budget.Budget, optional
+
+    :rtype: htmlwhat.Exercise.Exercise
+
+    :raises SerializationError: If ``data`` isn't valid exercise data of this version.
+    """
+    _check_header(data, EXERCISE_FORMAT)
+    alternatives = data.get("alternatives", [])
+    if (
+        not isinstance(data.get("sct"), str) or not isinstance(alternatives, list)
+        or not all(isinstance(item, dict) and isinstance(item.get("solution"), str) for item in (data, *alternatives))
+    ):
+        raise SerializationError("Malformed exercise: expected the `sct` and `solution` codes.")
+
+    solution_codes, solution_asts = [], []
+    for solution in (data, *alternatives):
+        solution_ast = load_tree(solution.get("tree"))
+        solution_ast.source = solution["solution"]
+        if "styles" in solution:
+            solution_ast.caches["style"] = _load_styles(solution["styles"], solution_ast)
+        solution_codes.append(solution["solution"])
+        solution_asts.append(solution_ast)
+    return Exercise(data["sct"], solution_codes, budget=budget, solution_ast=solution_asts)
+
+
+def save(exercise: Exercise, path):
+    """Write the artifact of ``exercise`` to ``path``."""
+    with open(path, "w", encoding="utf-8") as f:
+        json.dump(dump_exercise(exercise), f, ensure_ascii=False, separators=(",", ":"))
+
+
+def load(path, budget: Budget = None) -> Exercise:
+    """
+    Load the exercise of the artifact at ``path``.
+
+    :raises SerializationError: If the file isn't a valid exercise artifact of this version.
+    """
+    with open(path, "rb") as f:
+        try:
+            data = json.load(f)
+        except ValueError as e:
+            raise SerializationError(f"`{os.fspath(path)}` is not a JSON artifact: {e}")
+    return load_exercise(data, budget=budget)
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(prog="python -m htmlwhat.serialize", description="Build an exercise artifact.")
+    parser.add_argument("sct", help="file with the SCT")
+    parser.add_argument("solution", nargs="+", help="file with the solution code, or files of accepted solutions")
+    parser.add_argument("output", help="path of the artifact")
+    args = parser.parse_args(argv)
+
+    with open(args.sct, encoding="utf-8") as f:
+        sct = f.read()
+    solution_codes = []
+    for path in args.solution:
+        with open(path, encoding="utf-8") as f:
+            solution_codes.append(f.read())
+    save(Exercise(sct, solution_codes), args.output)
+
+
+if __name__ == "__main__":
+    main()
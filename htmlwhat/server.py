@@ -0,0 +1,477 @@
+"""
+A local grading service that keeps prepared exercises warm in memory.
+
+Run it with ``python -m htmlwhat.server --port 8000`` or ``python -m htmlwhat.server --unix-socket /tmp/htmlwhat.sock``.
+With ``--exercises <directory>`` the exercise artifacts of the directory, built with :mod:`htmlwhat.serialize`, are
+loaded at startup. With ``--processes <n>`` submissions are graded on that many worker processes, by an
+:class:`htmlwhat.scheduler.AffinityScheduler`, instead of the worker threads. With ``--record <file>`` the graded
+submissions are recorded, to replay them with :mod:`htmlwhat.loadtest`. ``--teardown``, ``--gc-threshold <n>`` and
+``--gc-freeze`` tune the memory management of grading, see :mod:`htmlwhat.memory`.
+
+Endpoints:
+
+- ``GET /health``: liveness of the service.
+- ``GET /stats``: counters of the service and of every exercise.
+- ``GET /metrics``: the metrics of :mod:`htmlwhat.metrics` in the Prometheus text format, if they are enabled.
+- ``PUT /exercises/<id>`` with ``{"sct": ..., "solution": ...}``: prepare an exercise.
+- ``DELETE /exercises/<id>``: drop a prepared exercise.
+- ``POST /exercises/<id>/grade`` with ``{"code": ...}``: grade a submission of a prepared exercise.
+- ``POST /grade`` with ``{"sct": ..., "solution": ..., "code": ...}``: grade a submission, the exercise
+  is prepared on first use and kept warm afterwards.
+
+The ``"solution"`` of an exercise with several accepted solutions is the list of them, see :mod:`htmlwhat.solutions`.
+
+Errors are answered with ``{"error": ..., "message": ...}``: 400 for an invalid request, 404 for an unknown endpoint or
+exercise, 422 for an error of the SCT and 500 for any other error raised while grading.
+"""
+
+import argparse
+import gc
+import json
+import os
+import socketserver
+import threading
+import time
+from collections import OrderedDict, deque
+from concurrent.futures import Future, ThreadPoolExecutor
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+from htmlwhat import memory, metrics, recording, serialize
+from htmlwhat.Exercise import Exercise
+from htmlwhat.budget import Budget
+from htmlwhat.failure import InstructorError
+from htmlwhat.memory import GCTuning
+from htmlwhat.scheduler import AffinityScheduler, exercise_key
+
+
+class ExerciseNotFound(KeyError):
+    """No exercise was prepared under the id."""
+
+
+class GradingService:
+    """
+    Grade submissions of prepared exercises on a pool of worker threads.
+
+    Identical submissions of the same exercise that are graded at the same time are coalesced into a single
+    grading run, and no exercise runs more than ``max_concurrency`` submissions at once, the others wait in a
+    queue of their exercise without holding a worker.
+
+    Grading holds the GIL, so the worker threads grade one submission at a time. With ``processes``, submissions are
+    graded on that many worker processes instead, the submissions of an exercise on the same process, which keeps it
+    prepared, see :class:`htmlwhat.scheduler.AffinityScheduler`. The threads then only wait for the processes.
+
+    :param workers: Number of worker threads.
+    :type workers: int, optional
+
+    :param max_concurrency: Maximum number of submissions of one exercise graded at the same time.
+    :type max_concurrency: int, optional
+
+    :param max_exercises: Maximum number of exercises kept warm, the least recently used ones are dropped first.
+    :type max_exercises: int, optional
+
+    :param budget: Limits of grading every submission.
+    :type budget: htmlwhat.budget.Budget, optional
+
+    :param teardown: Whether to break down every student tree once graded, see :mod:`htmlwhat.memory`.
+    :type teardown: bool, optional
+
+    :param processes: Number of worker processes grading the submissions, none to grade them on the worker threads.
+    :type processes: int, optional
+    """
+
+    def __init__(
+        self, workers: int = None, max_concurrency: int = 4, max_exercises: int = 1024, budget: Budget = None,
+        teardown: bool = False, processes: int = None,
+    ):
+        self.workers = workers or processes or os.cpu_count() or 1
+        self.max_concurrency = max_concurrency
+        self.max_exercises = max_exercises
+        self.budget = budget
+        self.teardown = teardown
+        self.executor = ThreadPoolExecutor(max_workers=self.workers, thread_name_prefix="htmlwhat")
+        self.scheduler = None
+        if processes:
+            self.scheduler = AffinityScheduler(processes, max_exercises=max_exercises, budget=budget, teardown=teardown)
+        self.lock = threading.Lock()
+        self.exercises = OrderedDict()
+        self.in_flight = {}
+        self.running = {}
+        self.waiting = {}
+        self.started = time.time()
+        self.counters = {"requests": 0, "graded": 0, "coalesced": 0, "errors": 0, "prepared": 0, "evicted": 0}
+        self.exercise_counters = {}
+
+    def prepare(self, exercise_id: str, sct: str, solution_code: str) -> Exercise:
+        """Prepare an exercise and keep it warm under ``exercise_id``."""
+        return self.add(exercise_id, Exercise(sct, solution_code, budget=self.budget, teardown=self.teardown))
+
+    def load(self, directory) -> list:
+        """
+        Load the exercise artifacts of :mod:`htmlwhat.serialize` in ``directory``, every ``<id>.json`` file is
+        kept warm under its ``<id>``. Return the loaded ids.
+        """
+        loaded = []
+        for entry in sorted(os.scandir(directory), key=lambda entry: entry.name):
+            exercise_id, extension = os.path.splitext(entry.name)
+            if extension == ".json" and entry.is_file():
+                exercise = serialize.load(entry.path, budget=self.budget)
+                exercise.teardown = self.teardown
+                self.add(exercise_id, exercise)
+                loaded.append(exercise_id)
+        return loaded
+
+    def add(self, exercise_id: str, exercise: Exercise) -> Exercise:
+        """Keep a prepared exercise warm under ``exercise_id``."""
+        with self.lock:
+            self.exercises[exercise_id] = exercise
+            self.exercises.move_to_end(exercise_id)
+            self.exercise_counters.setdefault(exercise_id, {"graded": 0, "coalesced": 0, "errors": 0})
+            self.counters["prepared"] += 1
+            while len(self.exercises) > self.max_exercises:
+                evicted, _ = self.exercises.popitem(last=False)
+                self.exercise_counters.pop(evicted, None)
+                self.counters["evicted"] += 1
+        return exercise
+
+    def prepare_anonymous(self, sct: str, solution_code: str) -> str:
+        """Prepare an exercise identified by its content, return its id."""
+        exercise_id = exercise_key(sct, solution_code)
+        with self.lock:
+            exercise = self.exercises.get(exercise_id)
+            if exercise is not None:
+                self.exercises.move_to_end(exercise_id)
+        registry = metrics.active()
+        if registry is not None:
+            registry.cache_lookup("exercise", exercise is not None)
+        if exercise is None:
+            self.prepare(exercise_id, sct, solution_code)
+        return exercise_id
+
+    def drop(self, exercise_id: str) -> bool:
+        with self.lock:
+            self.exercise_counters.pop(exercise_id, None)
+            return self.exercises.pop(exercise_id, None) is not None
+
+    def submit(self, exercise_id: str, student_code: str) -> Future:
+        """
+        Schedule the grading of ``student_code``.
+
+        :raises ExerciseNotFound: If no exercise was prepared under ``exercise_id``.
+        """
+        with self.lock:
+            exercise = self.exercises.get(exercise_id)
+            if exercise is None:
+                raise ExerciseNotFound(exercise_id)
+            self.exercises.move_to_end(exercise_id)
+            # an exercise prepared again under the same id is another one, its submissions are not coalesced with
+            # the ones of the previous version still running
+            key = (exercise_id, exercise, student_code)
+            self.counters["requests"] += 1
+
+            future = self.in_flight.get(key)
+            if future is not None:
+                self.counters["coalesced"] += 1
+                self.exercise_counters[exercise_id]["coalesced"] += 1
+                return future
+
+            future = self.in_flight[key] = Future()
+            job = (key, future)
+            if self.running.get(exercise_id, 0) < self.max_concurrency:
+                self.running[exercise_id] = self.running.get(exercise_id, 0) + 1
+                self.executor.submit(self.run, job)
+            else:
+                self.waiting.setdefault(exercise_id, deque()).append(job)
+        return future
+
+    def grade(self, exercise_id: str, student_code: str, timeout: float = None) -> dict:
+        """Grade ``student_code`` and wait for the result."""
+        return self.submit(exercise_id, student_code).result(timeout)
+
+    def run(self, job):
+        (exercise_id, exercise, student_code), future = job
+        try:
+            result = self.grade_job(exercise, student_code)
+        except BaseException as e:
+            outcome, error = None, e
+        else:
+            outcome, error = result, None
+
+        with self.lock:
+            self.in_flight.pop(job[0], None)
+            counters = self.exercise_counters.get(exercise_id, {"graded": 0, "errors": 0})
+            if error is None:
+                self.counters["graded"] += 1
+                counters["graded"] += 1
+            else:
+                self.counters["errors"] += 1
+                counters["errors"] += 1
+
+            queue = self.waiting.get(exercise_id)
+            if queue:
+                self.executor.submit(self.run, queue.popleft())
+            else:
+                self.waiting.pop(exercise_id, None)
+                self.running[exercise_id] -= 1
+                if not self.running[exercise_id]:
+                    del self.running[exercise_id]
+
+        if error is None:
+            future.set_result(outcome)
+        else:
+            future.set_exception(error)
+
+    def grade_job(self, exercise: Exercise, student_code: str) -> dict:
+        if self.scheduler is None:
+            return exercise.grade(student_code)
+
+        def grade():
+            # identified by its content on the processes, an exercise prepared again under the same id is another one
+            return self.scheduler.submit(exercise.sct_source, exercise.solution, student_code).result()
+
+        return recording.recorded(exercise.sct_source, exercise.solution, student_code, False, grade)
+
+    def health(self) -> dict:
+        return {"status": "ok", "uptime": round(time.time() - self.started, 3)}
+
+    def stats(self) -> dict:
+        scheduler = {} if self.scheduler is None else {"processes": self.scheduler.stats()}
+        with self.lock:
+            return {
+                **self.counters,
+                "workers": self.workers,
+                "max_concurrency": self.max_concurrency,
+                "in_flight": len(self.in_flight),
+                "queued": sum(len(queue) for queue in self.waiting.values()),
+                "exercises": {
+                    exercise_id: {
+                        **self.exercise_counters.get(exercise_id, {}),
+                        "running": self.running.get(exercise_id, 0),
+                        "queued": len(self.waiting.get(exercise_id, ())),
+                    }
+                    for exercise_id in self.exercises
+                },
+                **scheduler,
+            }
+
+    def shutdown(self):
+        self.executor.shutdown(wait=True)
+        if self.scheduler is not None:
+            self.scheduler.shutdown()
+
+
+def valid_field(name: str, value) -> bool:
+    # the solution of an exercise with several accepted solutions is the list of them
+    if name == "solution" and isinstance(value, list):
+        return bool(value) and all(isinstance(code, str) for code in value)
+    return isinstance(value, str)
+
+
+def required(body: dict, *names):
+    missing = [name for name in names if not valid_field(name, body.get(name))]
+    if missing:
+        raise ValueError("Expected string fields: {}.".format(", ".join(f"`{name}`" for name in missing)))
+    return [body[name] for name in names]
+
+
+class GradingRequestHandler(BaseHTTPRequestHandler):
+    """HTTP front end of the :class:`GradingService` of its server."""
+
+    server_version = "htmlwhat"
+
+    @property
+    def service(self) -> GradingService:
+        return self.server.service
+
+    def address_string(self):
+        # unix sockets have no client address
+        return self.client_address[0] if self.client_address else "unix"
+
+    def log_message(self, format, *args):
+        if not self.server.quiet:
+            super().log_message(format, *args)
+
+    def send_json(self, status: int, body: dict):
+        data = json.dumps(body).encode("utf-8")
+        self.send_response(status)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(data)))
+        self.end_headers()
+        self.wfile.write(data)
+
+    def read_json(self) -> dict:
+        length = int(self.headers.get("Content-Length") or 0)
+        body = json.loads(self.rfile.read(length) or b"{}")
+        if not isinstance(body, dict):
+            raise ValueError("Expected a JSON object.")
+        return body
+
+    def parts(self):
+        return [part for part in self.path.split("?", 1)[0].split("/") if part]
+
+    def do_GET(self):
+        parts = self.parts()
+        if parts == ["health"]:
+            self.send_json(200, self.service.health())
+        elif parts == ["stats"]:
+            self.send_json(200, self.service.stats())
+        elif parts == ["metrics"] and metrics.active() is not None:
+            data = metrics.active().to_prometheus().encode("utf-8")
+            self.send_response(200)
+            self.send_header("Content-Type", "text/plain; version=0.0.4; charset=utf-8")
+            self.send_header("Content-Length", str(len(data)))
+            self.end_headers()
+            self.wfile.write(data)
+        else:
+            self.send_json(404, {"error": "NotFound", "message": f"No endpoint `{self.path}`."})
+
+    def do_PUT(self):
+        parts = self.parts()
+        if len(parts) != 2 or parts[0] != "exercises":
+            return self.send_json(404, {"error": "NotFound", "message": f"No endpoint `{self.path}`."})
+        self.handle_errors(lambda body: self.prepare(parts[1], body))
+
+    def do_DELETE(self):
+        parts = self.parts()
+        if len(parts) != 2 or parts[0] != "exercises":
+            return self.send_json(404, {"error": "NotFound", "message": f"No endpoint `{self.path}`."})
+        if self.service.drop(parts[1]):
+            self.send_json(200, {"exercise": parts[1]})
+        else:
+            self.send_json(404, {"error": "NotFound", "message": f"No exercise `{parts[1]}`."})
+
+    def do_POST(self):
+        parts = self.parts()
+        if parts == ["grade"]:
+            self.handle_errors(self.grade_anonymous)
+        elif len(parts) == 3 and parts[0] == "exercises" and parts[2] == "grade":
+            self.handle_errors(lambda body: self.service.grade(parts[1], *required(body, "code")))
+        else:
+            self.send_json(404, {"error": "NotFound", "message": f"No endpoint `{self.path}`."})
+
+    def prepare(self, exercise_id, body):
+        self.service.prepare(exercise_id, *required(body, "sct", "solution"))
+        return {"exercise": exercise_id}
+
+    def grade_anonymous(self, body):
+        sct, solution_code, student_code = required(body, "sct", "solution", "code")
+        return self.service.grade(self.service.prepare_anonymous(sct, solution_code), student_code)
+
+    def handle_errors(self, respond):
+        try:
+            body = self.read_json()
+            result = respond(body)
+        except InstructorError as e:
+            self.send_json(422, {"error": "InstructorError", "message": str(e)})
+        except ExerciseNotFound as e:
+            self.send_json(404, {"error": "NotFound", "message": f"No exercise `{e.args[0]}`."})
+        except (ValueError, TypeError, SyntaxError) as e:
+            self.send_json(400, {"error": type(e).__name__, "message": str(e)})
+        except Exception as e:
+            self.log_error("Error grading %s: %r", self.path, e)
+            self.send_json(500, {"error": type(e).__name__, "message": str(e)})
+        else:
+            self.send_json(200, result)
+
+
+class GradingServer(ThreadingHTTPServer):
+    """HTTP server bound to a :class:`GradingService`."""
+
+    daemon_threads = True
+
+    def __init__(self, address, service: GradingService, quiet: bool = False):
+        self.service = service
+        self.quiet = quiet
+        super().__init__(address, GradingRequestHandler)
+
+
+class UnixGradingServer(socketserver.ThreadingMixIn, socketserver.UnixStreamServer):
+    """Same as :class:`GradingServer`, listening on a Unix socket."""
+
+    daemon_threads = True
+
+    def __init__(self, path: str, service: GradingService, quiet: bool = False):
+        self.service = service
+        self.quiet = quiet
+        if os.path.exists(path):
+            os.unlink(path)
+        super().__init__(path, GradingRequestHandler)
+
+    def get_request(self):
+        request, _ = super().get_request()
+        return request, ("unix", 0)
+
+
+def serve(
+    host="127.0.0.1", port=8000, unix_socket=None, workers=None, max_concurrency=4, quiet=False, budget=None,
+    exercises=None, teardown=False, gc_tuning=None, processes=None,
+):
+    """
+    Serve a new :class:`GradingService` until interrupted, with the exercise artifacts in ``exercises`` loaded. The
+    ``gc_tuning`` of :mod:`htmlwhat.memory` is applied once they are.
+    """
+    service = GradingService(
+        workers=workers, max_concurrency=max_concurrency, budget=budget, teardown=teardown, processes=processes
+    )
+    if exercises:
+        service.load(exercises)
+    memory.apply(gc_tuning)
+    if unix_socket:
+        server = UnixGradingServer(unix_socket, service, quiet=quiet)
+    else:
+        server = GradingServer((host, port), service, quiet=quiet)
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        pass
+    finally:
+        server.server_close()
+        service.shutdown()
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(prog="python -m htmlwhat.server", description="Local htmlwhat grading service.")
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=8000)
+    parser.add_argument("--unix-socket", help="listen on this Unix socket instead of TCP")
+    parser.add_argument("--workers", type=int, help="number of worker threads, defaults to the number of CPUs")
+    parser.add_argument("--processes", type=int, help="grade on this many worker processes instead of the threads")
+    parser.add_argument("--max-concurrency", type=int, default=4, help="maximum running submissions per exercise")
+    parser.add_argument("--quiet", action="store_true", help="don't log requests")
+    parser.add_argument("--exercises", help="directory of exercise artifacts to load, see htmlwhat.serialize")
+    parser.add_argument("--metrics", action="store_true", help="measure grading and serve the metrics on /metrics")
+    parser.add_argument("--record", help="append the graded submissions to this file, see htmlwhat.loadtest")
+    parser.add_argument("--redact", action="store_true", help="mask the text of the recorded submissions")
+    parser.add_argument("--wall-time", type=float, help="maximum seconds of grading a submission")
+    parser.add_argument("--cpu-time", type=float, help="maximum CPU seconds of grading a submission")
+    parser.add_argument("--max-input-size", type=int, help="maximum number of characters of a submission")
+    parser.add_argument("--max-nodes", type=int, help="maximum number of tags of a submission")
+    parser.add_argument("--max-depth", type=int, help="maximum nesting depth of the tags of a submission")
+    parser.add_argument("--teardown", action="store_true", help="break down every student tree once graded")
+    parser.add_argument("--gc-threshold", type=int, help="collection threshold of the youngest generation")
+    parser.add_argument("--gc-freeze", action="store_true", help="freeze the objects alive once exercises are loaded")
+    args = parser.parse_args(argv)
+
+    limits = ("wall_time", "cpu_time", "max_input_size", "max_nodes", "max_depth")
+    budget = None
+    if any(getattr(args, limit) is not None for limit in limits):
+        budget = Budget(**{limit: getattr(args, limit) for limit in limits})
+
+    gc_tuning = None
+    if args.gc_threshold is not None or args.gc_freeze:
+        threshold = gc.get_threshold()
+        if args.gc_threshold is not None:
+            threshold = (args.gc_threshold, *threshold[1:])
+        gc_tuning = GCTuning(threshold, args.gc_freeze)
+
+    if args.metrics:
+        metrics.enable()
+    if args.record:
+        recording.start(args.record, redact=args.redact)
+    serve(
+        args.host, args.port, args.unix_socket, args.workers, args.max_concurrency, args.quiet, budget, args.exercises,
+        args.teardown, gc_tuning, args.processes,
+    )
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,77 @@
+"""
+Exercises with several accepted solutions.
+
+Wherever a solution code is expected, a list of them can be given: the student passes if the SCT passes against
+any of them. The student's code is parsed once and every solution is tried against the same tree.
+:func:`htmlwhat.test_exercise` keeps nothing between calls: every call parses the solutions it tries and tries them
+in the order of the list. Only an :class:`htmlwhat.Exercise.Exercise` parses its solutions once and tries the most
+often matched solution first, so grade through one when the same exercise is graded many times.
+If no solution matches, the feedback is the one against the first solution of the list, whatever the order they were
+tried in, so the same submission always gets the same feedback.
+
+.. code-block:: python
+
+    >>> from htmlwhat import test_exercise
+    >>> sct = "Ex().check_body().check_tag('ul').check_tag('li').has_equal_text()"
+    >>> solutions = ["<body><ul><li>Tea</li></ul></body>", "<body><ul><li>Coffee</li></ul></body>"]
+    >>> test_exercise(sct, "<body><ul><li>Coffee</li></ul></body>", solutions)
+    {'correct': True, 'message': 'Great work!'}
+"""
+
+import threading
+from typing import Callable, List, Tuple, Union
+
+from htmlwhat.source import read_code
+
+SOLUTION_LISTS = (list, tuple)
+
+
+def read_solution_code(solution_code) -> Union[str, List[str]]:
+    """
+    Read ``solution_code`` with :func:`htmlwhat.source.read_code`, or every code of it if it is a list.
+
+    :raises TypeError: If ``solution_code`` is an empty list.
+    """
+    if isinstance(solution_code, SOLUTION_LISTS):
+        if not solution_code:
+            raise TypeError("solution_code should hold at least one solution.")
+        return [read_code(code, "arg: solution_code") for code in solution_code]
+    return read_code(solution_code, "arg: solution_code")
+
+
+def solution_list(solution_code) -> List[str]:
+    """The solution codes of ``solution_code``, a single one or a list of them."""
+    codes = read_solution_code(solution_code)
+    return codes if isinstance(codes, list) else [codes]
+
+
+class MatchOrder:
+    """
+    How often each of ``count`` solutions was the one a submission matched. Solutions are tried the most often
+    matched first, ties in the order of the list.
+    """
+
+    def __init__(self, count: int):
+        self.matches = [0] * count
+        self.lock = threading.Lock()
+
+    def order(self) -> List[int]:
+        matches = self.matches
+        return sorted(range(len(matches)), key=lambda index: -matches[index])
+
+    def matched(self, index: int):
+        with self.lock:
+            self.matches[index] += 1
+
+
+def first_match(order: List[int], attempt: Callable[[int], tuple]) -> Tuple[int, tuple]:
+    """
+    Call ``attempt(index)`` for the solutions in ``order`` until the payload of one, the first item of its result,
+    is correct. Return the index of that solution and its result, else the ones of the first solution.
+    """
+    results = {}
+    for index in order:
+        results[index] = result = attempt(index)
+        if result[0]["correct"]:
+            return index, result
+    return 0, results[0]
@@ -0,0 +1,161 @@
+"""
+Read the code to grade from a string, from bytes or from a file.
+
+Bytes are decoded the way browsers pick the encoding of a page: a byte order mark wins, else the ``<meta charset>``
+declared in the first 1024 bytes, else UTF-8. Invalid sequences are replaced by ``U+FFFD``, as browsers do. The
+surrounding whitespace is stripped from the bytes before they are decoded, so only the code itself is copied into
+the string, and large files are decoded straight from a memory map of the file.
+
+Strings are code, never paths: files are given as :class:`os.PathLike` objects, e.g. a :class:`pathlib.Path`.
+"""
+
+import codecs
+import mmap
+import os
+import re
+from typing import Tuple, Union
+
+CODE_TYPES = (str, bytes, bytearray, memoryview, os.PathLike)
+Code = Union[str, bytes, bytearray, memoryview, os.PathLike]
+
+BOMS = ((codecs.BOM_UTF8, "utf-8"), (codecs.BOM_UTF16_BE, "utf-16-be"), (codecs.BOM_UTF16_LE, "utf-16-le"))
+PRESCAN_SIZE = 1024
+META_CHARSET = re.compile(rb"<meta\s[^>]*?charset\s*=\s*[\"']?\s*([-\w.:]+)", re.IGNORECASE)
+# labels browsers decode otherwise, see https://encoding.spec.whatwg.org/
+BROWSER_ENCODINGS = {
+    "latin-1": "cp1252", "iso8859-1": "cp1252", "ascii": "cp1252",
+    "utf-16": "utf-8", "utf-16-le": "utf-8", "utf-16-be": "utf-8",
+}
+DEFAULT_ENCODING = "utf-8"
+# files larger than this are memory mapped instead of read
+MMAP_SIZE = 1 << 16
+WHITESPACE = b" \t\n\r\x0b\x0c"
+LEADING_WHITESPACE = re.compile(r"\s*")
+
+
+def detect_encoding(data) -> Tuple[str, int]:
+    """
+    Encoding of the HTML ``data`` and length of its byte order mark, if any.
+
+    :example:
+        >>> detect_encoding(b'<meta charset="ISO-8859-15"><p>caf\\xe9</p>')
+        ('iso8859-15', 0)
+    """
+    head = bytes(data[:PRESCAN_SIZE])
+    for bom, encoding in BOMS:
+        if head.startswith(bom):
+            return encoding, len(bom)
+
+    match = META_CHARSET.search(head)
+    if match:
+        try:
+            encoding = codecs.lookup(match.group(1).decode("ascii")).name
+        except LookupError:
+            pass
+        else:
+            return BROWSER_ENCODINGS.get(encoding, encoding), 0
+    return DEFAULT_ENCODING, 0
+
+
+def decode_parts(data, strip: bool = True) -> Tuple[str, str]:
+    """
+    Decode the bytes-like ``data``, only copying the part of it between the surrounding whitespace. Return the
+    whitespace stripped from its start and the code.
+    """
+    # every view is released before returning, a memory mapped file can't be closed while views of it exist
+    with memoryview(data) as raw, raw.cast("B") as view:
+        encoding, start = detect_encoding(view)
+        prefix, end = "", len(view)
+        if strip and encoding not in ("utf-16-be", "utf-16-le"):
+            # every other encoding is ASCII compatible
+            stripped = start
+            while start < end and view[start] in WHITESPACE:
+                start += 1
+            while end > start and view[end - 1] in WHITESPACE:
+                end -= 1
+            with view[stripped:start] as whitespace:
+                prefix = str(whitespace, "ascii")
+        with view[start:end] as part:
+            code = str(part, encoding, "replace")
+    if not strip:
+        return prefix, code
+    # str.strip() returns the string itself when there is nothing left to strip, e.g. a non-breaking space
+    return prefix + stripped_prefix(code), code.strip()
+
+
+def decode_code(data, strip: bool = True) -> str:
+    """Decode the bytes-like ``data``, only copying the part of it between the surrounding whitespace."""
+    return decode_parts(data, strip)[1]
+
+
+def read_file_parts(path, strip: bool = True) -> Tuple[str, str]:
+    with open(path, "rb") as f:
+        size = os.fstat(f.fileno()).st_size
+        if size < MMAP_SIZE:
+            return decode_parts(f.read(), strip)
+        with mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ) as mapped:
+            return decode_parts(mapped, strip)
+
+
+def read_file(path, strip: bool = True) -> str:
+    return read_file_parts(path, strip)[1]
+
+
+def read_code(code: Code, _for: str = "", strip: bool = True) -> str:
+    """
+    The code of ``code`` as a string, stripped unless ``strip`` is ``False``.
+
+    :param code: The code, as a string, bytes, a memoryview or the path of a file.
+    :type code: str | bytes | bytearray | memoryview | os.PathLike
+
+    :raises TypeError: If ``code`` is none of those.
+    """
+    if isinstance(code, str):
+        return code.strip() if strip else code
+    if isinstance(code, (bytes, bytearray, memoryview)):
+        return decode_code(code, strip)
+    if isinstance(code, os.PathLike):
+        return read_file(code, strip)
+    raise TypeError("Expected string, bytes or a path, but got {}. {}".format(str(type(code)), _for))
+
+
+def read_code_parts(code: Code, _for: str = "") -> Tuple[str, str]:
+    """
+    The whitespace :func:`read_code` strips from the start of ``code`` and the stripped code, reading ``code`` once.
+    The whitespace tells where the stripped code starts, see :mod:`htmlwhat.positions`.
+
+    :example:
+        >>> read_code_parts(b"\\n\\n  <p>Hi</p>\\n")
+        ('\\n\\n  ', '<p>Hi</p>')
+    """
+    if isinstance(code, str):
+        return stripped_prefix(code), code.strip()
+    if isinstance(code, (bytes, bytearray, memoryview)):
+        return decode_parts(code)
+    if isinstance(code, os.PathLike):
+        return read_file_parts(code)
+    raise TypeError("Expected string, bytes or a path, but got {}. {}".format(str(type(code)), _for))
+
+
+def stripped_prefix(code: str) -> str:
+    """
+    The whitespace stripped from the start of the string ``code``.
+
+    :example:
+        >>> stripped_prefix("\\n\\n  <p>Hi</p>\\n")
+        '\\n\\n  '
+    """
+    return LEADING_WHITESPACE.match(code).group()
+
+
+def code_size(code: Code) -> int:
+    """Size of ``code`` before it is read: characters of a string, bytes of bytes or of a file."""
+    if isinstance(code, str):
+        return len(code)
+    if isinstance(code, memoryview):
+        return code.nbytes
+    if isinstance(code, (bytes, bytearray)):
+        return len(code)
+    if isinstance(code, os.PathLike):
+        return os.path.getsize(code)
+    raise TypeError("Expected string, bytes or a path, but got {}.".format(str(type(code))))
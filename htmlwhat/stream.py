@@ -0,0 +1,137 @@
+"""
+Tree-less evaluation of the counting and presence checks, :func:`htmlwhat.checks.has_tag` and
+:func:`htmlwhat.checks.has_tag_count`.
+
+When an SCT only consists of such checks on ``Ex()``, the student code is not parsed into a tree: the tags the
+checks ask for are counted in a single pass of ``html.parser`` events, which only keeps the names of the open tags.
+The counts are the same as the ones on the tree, the open tags are tracked the way Beautiful Soup builds its tree.
+"""
+
+import ast
+import inspect
+from html.parser import HTMLParser
+from typing import Dict, Iterable, Optional, Tuple
+
+from bs4.builder import HTMLParserTreeBuilder, ParserRejectedMarkup
+from htmlwhat.budget import current_budget
+from htmlwhat import metrics
+
+# (tag name, required attribute or None, required ancestor or None)
+Spec = Tuple[str, Optional[str], Optional[str]]
+
+STREAM_CHECKS = ("has_tag", "has_tag_count")
+EMPTY_ELEMENT_TAGS = HTMLParserTreeBuilder.empty_element_tags
+
+
+class TagCounter(HTMLParser):
+    """Count the tags matching ``specs`` in one pass, without building any node."""
+
+    def __init__(self, specs: Iterable[Spec]):
+        super().__init__(convert_charrefs=False)
+        self.counts: Dict[Spec, int] = dict.fromkeys(specs, 0)
+        self.by_name = {}
+        for spec in self.counts:
+            self.by_name.setdefault(spec[0], []).append(spec)
+        self.stack = []
+        self.open = {}
+        # a multiset, Beautiful Soup's list is slow once many empty elements were seen
+        self.already_closed_empty_element = {}
+
+    def handle_starttag(self, name, attrs, handle_empty_element=True):
+        budget = current_budget.get()
+        if budget is not None:
+            budget.check_node(len(self.stack) + 1)
+        for spec in self.by_name.get(name, ()):
+            _, attr, within = spec
+            if (attr is None or any(key == attr for key, _ in attrs)) and (within is None or self.open.get(within)):
+                self.counts[spec] += 1
+
+        self.stack.append(name)
+        self.open[name] = self.open.get(name, 0) + 1
+        if handle_empty_element and name in EMPTY_ELEMENT_TAGS:
+            self.handle_endtag(name, check_already_closed=False)
+            self.already_closed_empty_element[name] = self.already_closed_empty_element.get(name, 0) + 1
+
+    def handle_startendtag(self, name, attrs):
+        self.handle_starttag(name, attrs, handle_empty_element=False)
+        self.handle_endtag(name)
+
+    def handle_endtag(self, name, check_already_closed=True):
+        if check_already_closed and self.already_closed_empty_element.get(name):
+            self.already_closed_empty_element[name] -= 1
+        elif self.open.get(name):
+            # close every tag up to the most recent one with that name
+            while True:
+                popped = self.stack.pop()
+                self.open[popped] -= 1
+                if popped == name:
+                    break
+
+
+class StreamSummary:
+    """Stands in for the tree of a document evaluated by :class:`TagCounter`, it only holds the counts."""
+
+    name = "[document]"
+
+    def __init__(self, counts: Dict[Spec, int]):
+        self.counts = counts
+
+    @classmethod
+    def of(cls, code: str, specs: Iterable[Spec]) -> "StreamSummary":
+        counter = TagCounter(specs)
+        try:
+            with metrics.timed("parse_seconds"):
+                counter.feed(code)
+                counter.close()
+        except AssertionError as e:
+            raise ParserRejectedMarkup(e)
+        return cls(counter.counts)
+
+    def get_position(self):
+        return None
+
+
+def stream_spec(check: str, args, kwargs) -> Spec:
+    """The spec counted by a call of ``check`` with ``args`` and ``kwargs``."""
+    from htmlwhat.checks import has_func
+
+    bound = inspect.signature(getattr(has_func, check)).bind(None, *args, **kwargs)
+    bound.apply_defaults()
+    name, attr, within = (bound.arguments[param] for param in ("name", "attr", "within"))
+    if not isinstance(name, str) or not isinstance(attr, (str, type(None))) or not isinstance(within, (str, type(None))):
+        raise TypeError("name, attr and within should be strings.")
+    return name.lower(), attr and attr.lower(), within and within.lower()
+
+
+def stream_specs(sct: str) -> Optional[Tuple[Spec, ...]]:
+    """
+    The specs counted by ``sct`` if it only consists of chains of streaming checks on ``Ex()`` with literal
+    arguments, like ``Ex().has_tag("img", attr="alt").has_tag_count("li", 3)``, else ``None``.
+    """
+    try:
+        statements = ast.parse(sct).body
+    except SyntaxError:
+        return None
+
+    specs = {}
+    for statement in statements:
+        if not isinstance(statement, ast.Expr):
+            return None
+        node = statement.value
+        while isinstance(node, ast.Call) and isinstance(node.func, ast.Attribute):
+            if node.func.attr not in STREAM_CHECKS:
+                return None
+            if any(keyword.arg is None for keyword in node.keywords):
+                return None
+            try:
+                args = [ast.literal_eval(arg) for arg in node.args]
+                kwargs = {keyword.arg: ast.literal_eval(keyword.value) for keyword in node.keywords}
+                specs[stream_spec(node.func.attr, args, kwargs)] = None
+            except (ValueError, TypeError, SyntaxError):
+                return None
+            node = node.func.value
+        is_ex = isinstance(node, ast.Call) and isinstance(node.func, ast.Name) and node.func.id == "Ex"
+        if not is_ex or node.args or node.keywords:
+            return None
+
+    return tuple(specs) or None
@@ -0,0 +1,180 @@
+from hashlib import blake2b
+from typing import Dict, List, Optional, Tuple
+from bs4.element import Tag
+from htmlwhat.utils import document_of
+from htmlwhat import metrics
+
+
+def normalize_attrs(tag: Tag) -> Tuple[Tuple[str, str], ...]:
+    """Attributes of ``tag`` in a canonical order, token lists like ``class`` compare as sets."""
+    return tuple(sorted(
+        (name, " ".join(sorted(set(value))) if isinstance(value, list) else value)
+        for name, value in tag.attrs.items()
+    ))
+
+
+def child_tags(tag: Tag) -> List[Tag]:
+    return [child for child in tag.children if isinstance(child, Tag)]
+
+
+class StructureHashes:
+    """
+    Merkle hashes of every subtree of a document: the hash of a tag is a BLAKE2 digest of its name, its normalized
+    attributes (unless ``attrs`` is ``False``) and the hashes of its child tags. Equal hashes mean equal structures
+    unless two 128-bit digests collide, which no document made by a student will run into.
+
+    The hashes are built bottom-up in one pass over the document, the first time they are needed.
+    """
+
+    def __init__(self, document, attrs: bool = True):
+        self.attrs = attrs
+        self.hashes: Dict[int, bytes] = {}
+
+        # in reverse document order every child comes before its parent
+        for tag in reversed([document, *document.find_all(True)]):
+            label = repr(self.label(tag)).encode("utf-8")
+            # the length of the label keeps it apart from the digests of the children, which have a fixed size
+            digest = blake2b(len(label).to_bytes(8, "big"), digest_size=16)
+            digest.update(label)
+            for child in tag.children:
+                if isinstance(child, Tag):
+                    digest.update(self.hashes[id(child)])
+            self.hashes[id(tag)] = digest.digest()
+
+    @classmethod
+    def of(cls, node, attrs: bool = True) -> "StructureHashes":
+        """The hashes of the document ``node`` belongs to, built on first use."""
+        document = document_of(node)
+        key = ("structure", attrs)
+        registry = metrics.active()
+        if registry is not None:
+            registry.cache_lookup("structure_hashes", key in document.caches)
+        if key not in document.caches:
+            document.caches[key] = cls(document, attrs)
+        return document.caches[key]
+
+    def label(self, tag: Tag):
+        return (tag.name, normalize_attrs(tag)) if self.attrs else tag.name
+
+    def __getitem__(self, tag: Tag) -> bytes:
+        return self.hashes[id(tag)]
+
+
+class AttributeTables:
+    """
+    Normalized attributes of every tag of a document, built in one pass the first time they are needed: values of
+    token lists like ``class`` become sets, so ``class="a b"`` equals ``class="b a"``. For the pairing of the tags of
+    two documents, the child tags of every tag are grouped by name, and every tag knows its index in its group.
+
+    Only subtrees holding at least one attribute are ``attributed``, the others can't differ in their attributes.
+    """
+
+    def __init__(self, document):
+        self.attrs: Dict[int, Dict[str, object]] = {}
+        self.children: Dict[int, Dict[str, List[Tag]]] = {id(document): {}}
+        self.position: Dict[int, int] = {}
+        self.attributed = set()
+
+        tags = document.find_all(True)
+        for tag in tags:
+            self.attrs[id(tag)] = {
+                name: frozenset(value) if isinstance(value, list) else value for name, value in tag.attrs.items()
+            }
+            self.children[id(tag)] = {}
+            group = self.children[id(tag.parent)].setdefault(tag.name, [])
+            self.position[id(tag)] = len(group)
+            group.append(tag)
+
+        # in reverse document order every child comes before its parent
+        for tag in reversed(tags):
+            if id(tag) in self.attributed or tag.attrs:
+                self.attributed.add(id(tag))
+                self.attributed.add(id(tag.parent))
+
+    @classmethod
+    def of(cls, node) -> "AttributeTables":
+        """The tables of the document ``node`` belongs to, built on first use."""
+        document = document_of(node)
+        registry = metrics.active()
+        if registry is not None:
+            registry.cache_lookup("attribute_tables", "attrs" in document.caches)
+        if "attrs" not in document.caches:
+            document.caches["attrs"] = cls(document)
+        return document.caches["attrs"]
+
+    def siblings(self, tag: Tag) -> List[Tag]:
+        """The tags with the same name as ``tag`` among the children of its parent."""
+        return self.children[id(tag.parent)][tag.name]
+
+
+def first_attribute_difference(
+    student: Tag, solution: Tag, student_tables: AttributeTables, solution_tables: AttributeTables,
+    check_values: bool = True,
+) -> Optional[Tuple[List[Tuple[Tag, Tag]], Optional[Tag], Tag, Optional[str]]]:
+    """
+    Find the first tag in the subtree of ``solution``, in document order, whose attributes its student tag doesn't
+    have, or has with other values. Tags are paired by their index among the child tags with the same name, like
+    :func:`htmlwhat.checks.check_tag` pairs them, and only subtrees of the solution with attributes are visited.
+
+    :return: ``None`` if the student has every attribute, else the pairs of tags descended into, the differing
+             student and solution tags and the attribute. The student tag is ``None`` if it is missing, and then so
+             is the attribute.
+    """
+    stu_attrs, sol_attrs = student_tables.attrs, solution_tables.attrs
+    stu_children, position, attributed = student_tables.children, solution_tables.position, solution_tables.attributed
+
+    # pairs still to compare with the pairs descended into to reach them, the next one in document order last
+    stack = [(student, solution, ())]
+    while stack:
+        stu, sol, path = stack.pop()
+        if stu is None:
+            return list(path), None, sol, None
+
+        stu_values = stu_attrs.get(id(stu), {})
+        for name, value in sol_attrs.get(id(sol), {}).items():
+            stu_value = stu_values.get(name)
+            if stu_value is None or (check_values and stu_value != value):
+                return list(path), stu, sol, name
+
+        groups = stu_children[id(stu)]
+        pairs = []
+        for sol_child in sol.children:
+            if id(sol_child) in attributed:
+                group = groups.get(sol_child.name, ())
+                index = position[id(sol_child)]
+                stu_child = group[index] if index < len(group) else None
+                pairs.append((stu_child, sol_child, (*path, (stu_child, sol_child)) if stu_child else path))
+        stack.extend(reversed(pairs))
+    return None
+
+
+def first_difference(
+    student: Tag, solution: Tag, student_hashes: StructureHashes, solution_hashes: StructureHashes
+) -> Optional[Tuple[List[Tuple[Tag, Tag]], Optional[Tag], Optional[Tag]]]:
+    """
+    Find the first node where the structures of ``student`` and ``solution`` differ, descending only into
+    child tags whose hashes don't match.
+
+    :return: ``None`` if the structures are equal, else the pairs of tags descended into and the differing
+             student and solution tags. One of those is ``None`` for a missing or an unexpected tag.
+    """
+    path = []
+    while student_hashes[student] != solution_hashes[solution]:
+        if student_hashes.label(student) != solution_hashes.label(solution):
+            return path, student, solution
+
+        student_children, solution_children = child_tags(student), child_tags(solution)
+        for stu_child, sol_child in zip(student_children, solution_children):
+            if student_hashes[stu_child] != solution_hashes[sol_child]:
+                path.append((stu_child, sol_child))
+                student, solution = stu_child, sol_child
+                break
+        else:
+            common = min(len(student_children), len(solution_children))
+            if len(solution_children) > common:
+                return path, None, solution_children[common]
+            if len(student_children) > common:
+                return path, student_children[common], None
+            # unreachable, equal labels and child digests give equal digests
+            return None
+    return None
@@ -1,12 +1,26 @@
-from htmlwhat.State import State
+from typing import List, Tuple, Union
+from protowhat.sct_syntax import ExGen, LazyChainStart
+from htmlwhat.State import State, HtmlDispatcher
+from htmlwhat.budget import Budget, BudgetExceeded
+from htmlwhat.source import CODE_TYPES, read_code
+from htmlwhat.Reporter import Reporter
+from htmlwhat.memo import CheckMemo
+from htmlwhat.memory import teardown_tree
 from htmlwhat.sct_syntax import SCT_CTX
-from htmlwhat.failure import TestFail
+from htmlwhat.failure import TestFail, InstructorError
+from htmlwhat import metrics, recording
+from htmlwhat.safe_regex import check_sct_patterns
+from htmlwhat.solutions import first_match, solution_list
+from htmlwhat.stream import StreamSummary, stream_specs
 
 
 def test_exercise(
         sct: str,
         student_code: str,
-        solution_code: str,
+        solution_code: Union[str, List[str]],
+        collect_all: bool = False,
+        budget: Budget = None,
+        teardown: bool = False,
 )-> dict:
     """
     Test an exercise with a student's code and a solution code directly.
@@ -14,11 +28,27 @@ def test_exercise(
     :param sct: The SCT (Submission Correctness Test) code to evaluate the student's code against.
     :type sct: str
 
-    :param student_code: The code written by the student.
-    :type student_code: str
+    :param student_code: The code written by the student. Bytes and files are decoded with the encoding of their
+        byte order mark or ``<meta charset>``, see :func:`htmlwhat.source.read_code`.
+    :type student_code: str | bytes | os.PathLike
     
-    :param solution_code: The correct solution code.
-    :type solution_code: str
+    :param solution_code: The correct solution code, same as ``student_code``, or a list of accepted solutions: the
+        student's code passes if the SCT passes against any of them, see :mod:`htmlwhat.solutions`. Nothing is kept
+        between calls: the solutions are parsed again and tried in the order of the list every time, only an
+        :class:`htmlwhat.Exercise.Exercise` parses them once and tries the most often matched one first.
+    :type solution_code: str | bytes | os.PathLike | List[str | bytes | os.PathLike]
+
+    :param collect_all: Whether to keep running the SCT after a failing check. If ``True``, the result also has
+        a ``'failures'`` key listing the ``'message'`` and ``'path'`` of every failure, ``'message'`` is the first one.
+    :type collect_all: bool, optional
+
+    :param budget: Limits of time, size and depth of grading the student's code. If one is exceeded, the result has
+        a ``'budget_exceeded'`` key telling which one.
+    :type budget: htmlwhat.budget.Budget, optional
+
+    :param teardown: Whether to break down the parsed trees when grading finishes, so they are freed without the
+        cyclic garbage collector, see :mod:`htmlwhat.memory`.
+    :type teardown: bool, optional
     
     :return: Test result, a dictionary with the keys ``'correct'`` and ``'message'``.
     :rtype: dict
@@ -65,12 +95,150 @@ def test_exercise(
         This function automatically convert feedback into html.
     """
 
-    state = State(student_code, solution_code)
+    check_sct_patterns(sct)
+    reporter = Reporter(collect=collect_all)
+    specs = stream_specs(sct)
+
+    solution_codes = solution_list(solution_code)
+    solution_asts = [None] * len(solution_codes)
+    if specs is not None:
+        # counting checks don't depend on the solution
+        solution_codes, solution_asts = solution_codes[:1], [StreamSummary({})]
+    elif budget is not None:
+        # the budget only applies to the student's code
+        dispatcher = HtmlDispatcher()
+        solution_asts = [dispatcher.parse(code) for code in solution_codes]
+
+    def grade():
+        code, student_ast = student_code, None
+        if specs is not None:
+            # only counting checks, no tree is needed
+            code = read_code(student_code, "arg: student_code")
+            student_ast = StreamSummary.of(code, specs)
+        states = []
+
+        def attempt(index: int):
+            nonlocal code, student_ast
+            # checks repeated during the run, e.g. in the branches of check_or(), reuse their outcome
+            state = State(
+                code,
+                solution_codes[index],
+                reporter=Reporter(collect=collect_all),
+                student_ast=student_ast,
+                solution_ast=solution_asts[index],
+                check_memo=CheckMemo(),
+            )
+            # the next solutions are tried against the same student's tree
+            code, student_ast = state.student_code, state.student_ast
+            states.append(state)
+            return evaluate_sct(sct, state)
+
+        try:
+            _, (payload, failures) = first_match(list(range(len(solution_codes))), attempt)
+            count_outcome(payload, failures)
+            return payload
+        finally:
+            # also when a failure, an exceeded limit or an instructor error escapes
+            if teardown:
+                teardown_tree(student_ast)
+                for state in states:
+                    teardown_tree(state.solution_ast)
+
+    def grade_within_budget():
+        if budget is None:
+            return grade()
+        return run_with_budget(budget, reporter, student_code, grade)
+
+    return recording.recorded(sct, solution_code, student_code, collect_all, grade_within_budget)
+
+
+def run_with_budget(budget: Budget, reporter: Reporter, student_code: str, grade) -> dict:
+    """
+    Call ``grade()`` within ``budget``, return its payload or the payload of the exceeded limit.
+
+    :param budget: The limits of the grading.
+    :type budget: htmlwhat.budget.Budget
+
+    :param reporter: The reporter of the grading, it builds the payload of an exceeded limit.
+    :type reporter: Reporter
 
-    SCT_CTX["Ex"].root_state = state
+    :param student_code: The student's code, its size is checked before grading.
+    :type student_code: str | bytes | os.PathLike
+
+    :param grade: Function doing the grading, it returns the payload.
+    :type grade: Callable[[], dict]
+    """
     try:
-        exec(sct, SCT_CTX)
+        with budget.active() as run:
+            if isinstance(student_code, CODE_TYPES):
+                run.check_input(student_code)
+            return grade()
+    except BudgetExceeded as e:
+        registry = metrics.active()
+        if registry is not None:
+            registry.submissions.inc()
+            registry.budget_exceeded.inc(e.limit)
+        return reporter.build_budget_payload(e)
+
+
+def run_sct(sct, state: State) -> dict:
+    """
+    Run an SCT against an already built ``State`` and return the payload of its reporter.
+
+    :param sct: The SCT code, either as a string or as a code object compiled from it.
+    :type sct: str | CodeType
+
+    :param state: The root state of the exercise.
+    :type state: State
+
+    :return: Test result, a dictionary with the keys ``'correct'`` and ``'message'``.
+    :rtype: dict
+    """
+    payload, failures = evaluate_sct(sct, state)
+    count_outcome(payload, failures)
+    return payload
+
+
+def evaluate_sct(sct, state: State) -> Tuple[dict, list]:
+    """
+    Run an SCT like :func:`run_sct`, without counting the outcome in the metrics, e.g. because it is one of several
+    attempts against the accepted solutions. Return the payload and the feedback of the failures.
+    """
+    # a fresh context per run, so concurrent runs don't share the root state or the chains they create
+    chainable_functions = SCT_CTX["Ex"].chainable_functions
+    sct_ctx = {
+        **SCT_CTX,
+        "Ex": ExGen(chainable_functions, state),
+        "F": LazyChainStart(chainable_functions),
+    }
+    registry = metrics.active()
+    try:
+        with metrics.timed("sct_seconds"):
+            exec(sct, sct_ctx)
     except TestFail as e:
-        return state.reporter.build_failed_payload(e.feedback)
+        failures = [e.feedback]
+        with metrics.timed("render_seconds"):
+            payload = state.reporter.build_failed_payload(e.feedback)
+    except InstructorError:
+        if registry is not None:
+            registry.instructor_errors.inc()
+        raise
+    else:
+        failures = state.reporter.collected[0] if state.collecting else []
+        with metrics.timed("render_seconds"):
+            if state.collecting:
+                payload = state.reporter.build_collected_payload()
+            else:
+                payload = state.reporter.build_final_payload()
+    return payload, failures
+
 
-    return state.reporter.build_final_payload()
+def count_outcome(payload: dict, failures: list):
+    """Count the outcome of a graded submission, see :func:`evaluate_sct`, in the metrics."""
+    registry = metrics.active()
+    if registry is not None:
+        registry.submissions.inc()
+        if payload["correct"]:
+            registry.passes.inc()
+        for feedback in failures:
+            registry.failures.inc(getattr(feedback, "check", None) or "")
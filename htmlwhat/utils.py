@@ -1,3 +1,13 @@
+from contextvars import ContextVar
+from functools import wraps
+from protowhat.failure import TestFail
+from htmlwhat.budget import current_budget
+
+
+# name of the check running, to tell which check a collected failure comes from
+current_check = ContextVar("current_check", default=None)
+
+
 def check_str(x, _for=""):
     if not isinstance(x, str):
         raise TypeError("Expected string, but got {}. {}".format(str(type(x)), _for))
@@ -11,3 +21,47 @@ def number_to_position(num: int):
             num if (num < 20) else (num % 10), "{}th"
         )
     ).format(num)
+
+
+def document_of(node):
+    """The parsed document ``node`` belongs to, its ``caches`` hold data derived from the whole tree."""
+    document = node
+    for document in node.parents:
+        pass
+    return document
+
+
+def state_check(check=None, *, memoize=True):
+    """
+    Decorator of the check functions.
+
+    A check called with a state that already failed (only possible when failures are collected) returns that state
+    untouched, and a state carrying a :class:`htmlwhat.memo.CheckMemo` reuses the earlier outcome of the check.
+    Checks that look outside the subtree of their nodes are decorated with ``memoize=False``.
+    """
+    if check is None:
+        return lambda check: state_check(check, memoize=memoize)
+
+    @wraps(check)
+    def wrapper(state, *args, **kwargs):
+        if getattr(state, "failed", False):
+            return state
+        budget = current_budget.get()
+        if budget is not None:
+            budget.check_time()
+        memo = getattr(state, "check_memo", None) if memoize else None
+        token = current_check.set(check.__name__) if getattr(state, "collecting", False) else None
+        try:
+            if memo is None:
+                return check(state, *args, **kwargs)
+            return memo.call(check, state, args, kwargs)
+        except TestFail as e:
+            # the innermost check is the one that failed
+            if getattr(e.feedback, "check", None) is None:
+                e.feedback.check = check.__name__
+            raise
+        finally:
+            if token is not None:
+                current_check.reset(token)
+
+    return wrapper